@@ -1,14 +1,29 @@
 from flask import Flask, jsonify, send_from_directory, request, render_template
 from flask_cors import CORS
-import psycopg2
-import psycopg2.extras
-from helpers.config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, GOOGLE_MAPS_API_KEY
+from helpers.config import (
+    GOOGLE_MAPS_API_KEY, NEAREST_MAX_RESULTS, AUTOCOMPLETE_MAX_RESULTS,
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_COORD_PRECISION,
+    RESPONSE_COMPRESSION_MIN_BYTES, RESPONSE_GZIP_LEVEL, RESPONSE_BROTLI_QUALITY,
+    CHANGE_FEED_PAGE_SIZE, CHANGE_FEED_MAX_PAGE_SIZE
+)
+import gzip
+import json
 import os
-from hospital_data_service import hospital_data_service
-from websocket_events import init_socketio
+from hospital_data_service import hospital_data_service, parse_bbox, compact_page
+from hospital_changes import start_hospital_change_listener
+from response_cache import ResponseCache, CircleRegion, BoxRegion, quantize, quantize_radius, quantize_bbox
+from db import db_pool
+from websocket_events import init_socketio, emit_wait_time_updates, viewport_subscriptions
 # Set up logging
 from logger_setup import logger
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_FORMATS = ('full', 'compact')
+
 # Set up Flask app
 app = Flask(__name__, 
             static_folder=os.path.abspath('../frontend'),
@@ -16,10 +31,89 @@ app = Flask(__name__,
 CORS(app, resources={r"/*": {"origins": "*"}})
 socketio = init_socketio(app)
 
+# Viewport responses are cached until a hospital they list (or one inside
+# their circle) changes; writes from the scraper and the CMS worker arrive
+# through the hospital_changes NOTIFY channel.
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL)
+hospital_data_service.add_change_listener(response_cache.invalidate)
+
+def relay_wait_time_updates(hospital_ids, locations, kind):
+    # One socket event per scraper batch, built from the freshly reloaded index rows
+    if kind != 'wait_time' or not hospital_ids:
+        return
+    updates = []
+    for hospital_id in hospital_ids:
+        record = hospital_data_service.spatial_index.get(hospital_id)
+        if record is not None:
+            updates.append({
+                'hospital_id': hospital_id,
+                'new_wait_time': record['wait_time'],
+                'wait_status': record['wait_status'],
+                'is_live': record['has_live_wait_time'],
+                # Routes the update to the clients watching this hospital's geohash cell
+                'latitude': record['latitude'],
+                'longitude': record['longitude']
+            })
+    emit_wait_time_updates(updates)
+
+hospital_data_service.add_change_listener(relay_wait_time_updates)
+start_hospital_change_listener(hospital_data_service.apply_hospital_changes)
+
 def get_db_connection():
-    return psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-    )
+    return db_pool.connection()
+
+def cached_json_response(entry):
+    # Compressed responses carry a weak ETag, so revalidation compares weakly
+    if request.if_none_match.contains_weak(entry.etag):
+        response = app.response_class(status=304)
+        # Echo the validator the client holds, which is weak if the 200 was compressed
+        response.set_etag(entry.etag, weak=request.if_none_match.is_weak(entry.etag))
+    else:
+        response = app.response_class(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def region_json_response(entry, region, response_format):
+    """Respond with a shared page narrowed to the hospitals inside the caller's exact ``region``."""
+    if region is None:
+        return cached_json_response(entry)
+    result = json.loads(entry.body)
+    result['hospitals'] = [
+        hospital for hospital in result['hospitals']
+        if hospital['latitude'] is not None and hospital['longitude'] is not None
+        and region.contains(hospital['latitude'], hospital['longitude'])
+    ]
+    # The page's cursor still applies: every hospital in the region was on the padded page or a later one
+    if response_format == 'compact':
+        result = compact_page(result)
+    body = jsonify(result).get_data()
+    return cached_json_response(entry._replace(body=body, etag=ResponseCache.make_etag(body)))
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < RESPONSE_COMPRESSION_MIN_BYTES:
+        return response
+
+    accept_encodings = request.accept_encodings
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        response.set_data(brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif accept_encodings.quality('gzip') > 0:
+        response.set_data(gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    etag, is_weak = response.get_etag()
+    if etag and not is_weak:
+        response.set_etag(etag, weak=True)
+    return response
 
 @app.route('/styles.css')
 def serve_css():
@@ -31,32 +125,162 @@ def get_hospitals():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
         search_term = request.args.get('search', None)
+        cursor = request.args.get('cursor') or None
+        count = request.args.get('count', None)
+        max_wait = request.args.get('max_wait', None, type=int)
+        sort = request.args.get('sort', 'name')
+        response_format = request.args.get('format', 'full')
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f"Invalid format: {response_format}")
         lat = float(request.args.get('lat', 0))
         lon = float(request.args.get('lon', 0))
         radius = float(request.args.get('radius', 0))
+        bbox = request.args.get('bbox')
+        bbox = parse_bbox(bbox) if bbox else None
+
+        # Geo pages are shared by nearby requests: fetched and cached for the box snapped outward
+        # (or the quantized centre with the radius padded for its rounding), then narrowed to the
+        # caller's exact region. Counts have to describe the exact region, so counted pages are
+        # fetched for it directly.
+        exact_region = None
+        if (count or ('exact' if cursor is None else 'none')) == 'none':
+            if bbox is not None:
+                exact_region = BoxRegion(*bbox)
+                bbox = quantize_bbox(bbox, RESPONSE_CACHE_COORD_PRECISION)
+            elif lat and lon and radius:
+                exact_region = CircleRegion(lat, lon, radius)
+                lat = quantize(lat, RESPONSE_CACHE_COORD_PRECISION)
+                lon = quantize(lon, RESPONSE_CACHE_COORD_PRECISION)
+                radius = quantize_radius(radius, RESPONSE_CACHE_COORD_PRECISION)
+        # Shared pages are cached in full and formatted after narrowing
+        cached_format = 'full' if exact_region is not None else response_format
+
+        cache_key = (lat, lon, radius, bbox, search_term, page, per_page, cursor, count, max_wait, sort, cached_format)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return region_json_response(cached, exact_region, response_format)
         
-        logger.debug(f"Fetching hospitals: page={page}, per_page={per_page}, search_term={search_term}, lat={lat}, lon={lon}, radius={radius}")
-        
-        result, debug_info = hospital_data_service.get_hospitals_paginated(page, per_page, search_term, lat, lon, radius)
+        logger.debug(f"Fetching hospitals: page={page}, per_page={per_page}, cursor={cursor}, count={count}, max_wait={max_wait}, sort={sort}, search_term={search_term}, lat={lat}, lon={lon}, radius={radius}, bbox={bbox}")
         
-        # Process the data to match our new schema
-        for hospital in result['hospitals']:
-            if not hospital['has_wait_time_data']:
-                hospital['wait_time'] = None
-            elif hospital['wait_time'] is None or hospital['wait_time'] == '':
-                hospital['wait_time'] = 'N/A'
-            else:
-                hospital['wait_time'] = int(hospital['wait_time'])
+        result, debug_info = hospital_data_service.get_hospitals_paginated(
+            page, per_page, search_term, lat, lon, radius, cursor, count, max_wait, sort, bbox
+        )
         
         logger.debug(f"SQL Query: {debug_info['query']}")
         logger.debug(f"SQL Parameters: {debug_info['params']}")
         logger.debug(f"Fetched {len(result['hospitals'])} hospitals")
-        
-        return jsonify(result)
+
+        hospital_ids = [hospital['id'] for hospital in result['hospitals']]
+        if cached_format == 'compact':
+            result = compact_page(result)
+
+        if bbox is not None:
+            region = BoxRegion(*bbox)
+        elif lat and lon and radius:
+            region = CircleRegion(lat, lon, radius)
+        else:
+            region = None
+        entry = response_cache.set(
+            cache_key, jsonify(result).get_data(), hospital_ids, region,
+            wait_sensitive=max_wait is not None or sort == 'wait'
+        )
+        return region_json_response(entry, exact_region, response_format)
     except (TypeError, ValueError) as e:
         logger.error(f"Invalid parameters: {str(e)}")
         return jsonify({"error": "Invalid parameters"}), 400
 
+@app.route('/api/hospitals/nearest', methods=['GET'])
+def get_nearest_hospitals():
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        k = min(int(request.args.get('k', 10)), NEAREST_MAX_RESULTS)
+        if k < 1:
+            raise ValueError("k must be positive")
+        rank = request.args.get('rank', 'distance')
+
+        logger.debug(f"Fetching nearest hospitals: lat={lat}, lon={lon}, k={k}, rank={rank}")
+
+        result = hospital_data_service.get_nearest_hospitals(lat, lon, k, rank)
+        return jsonify(result)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Invalid parameters: {str(e)}")
+        return jsonify({"error": "Invalid parameters"}), 400
+
+
+@app.route('/api/hospitals/autocomplete', methods=['GET'])
+def autocomplete_hospitals():
+    try:
+        query = request.args.get('q', '')
+        limit = min(int(request.args.get('limit', 10)), AUTOCOMPLETE_MAX_RESULTS)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+    except ValueError as e:
+        logger.error(f"Invalid parameters: {str(e)}")
+        return jsonify({"error": "Invalid parameters"}), 400
+
+    return jsonify(hospital_data_service.autocomplete_hospitals(query, limit))
+
+
+@app.route('/api/hospitals/changes', methods=['GET'])
+def get_hospital_changes():
+    try:
+        since = request.args.get('since', type=int)
+        if 'since' in request.args and since is None:
+            raise ValueError(f"since must be an integer, got {request.args['since']!r}")
+        limit = min(int(request.args.get('limit', CHANGE_FEED_PAGE_SIZE)), CHANGE_FEED_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+    except ValueError as e:
+        logger.error(f"Invalid parameters: {str(e)}")
+        return jsonify({"error": "Invalid parameters"}), 400
+
+    return jsonify(hospital_data_service.get_hospital_changes(since, limit))
+
+
+@app.route('/api/hospitals/clusters', methods=['GET'])
+def get_hospital_clusters():
+    try:
+        bbox = parse_bbox(request.args['bbox'])
+        zoom = int(request.args['zoom'])
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Invalid parameters: {str(e)}")
+        return jsonify({"error": "Invalid parameters"}), 400
+
+    return jsonify(hospital_data_service.get_clusters(bbox, zoom))
+
+
+@app.route('/api/hospitals/<int:hospital_id>/wait-profile', methods=['GET'])
+def get_wait_time_profile(hospital_id):
+    try:
+        utc_offset = int(request.args.get('utc_offset', 0))
+    except ValueError as e:
+        logger.error(f"Invalid parameters: {str(e)}")
+        return jsonify({"error": "Invalid parameters"}), 400
+
+    return jsonify(hospital_data_service.get_wait_time_profile(hospital_id, utc_offset))
+
+
+@app.route('/api/hospitals/<int:hospital_id>/forecast', methods=['GET'])
+def get_wait_time_forecast(hospital_id):
+    return jsonify(hospital_data_service.get_wait_time_forecast(hospital_id))
+
+
+@app.route('/api/metrics/db-pool', methods=['GET'])
+def get_db_pool_metrics():
+    return jsonify(db_pool.stats())
+
+@app.route('/api/metrics/response-cache', methods=['GET'])
+def get_response_cache_metrics():
+    return jsonify(response_cache.stats())
+
+@app.route('/api/metrics/socket-subscriptions', methods=['GET'])
+def get_socket_subscription_metrics():
+    return jsonify(viewport_subscriptions.stats())
+
+@app.route('/api/metrics/extraction-cache', methods=['GET'])
+def get_extraction_cache_metrics():
+    return jsonify(hospital_data_service.get_extraction_cache_stats())
 
 @app.route('/api/price-comparison', methods=['POST'])
 def price_comparison():
@@ -0,0 +1,78 @@
+"""
+Compare the CMS cleaning stage of sync_cms_data before and after the move
+from a multiprocessing.Pool to the in-process iter_clean_hospitals generator.
+
+    python bench_cleaning.py [--csv data/Hospital_General_Information.csv] [--repeat 5]
+"""
+import argparse
+import logging
+import multiprocessing
+import time
+from dateutil import parser
+from hospital_data_service import hospital_data_service, clean_hospital_data, iter_clean_hospitals, parse_date
+from logger_setup import logger
+
+
+def legacy_parse_date(date_string):
+    try:
+        return parser.parse(date_string).date()
+    except ValueError:
+        return None
+
+
+def legacy_clean_chunk(chunk):
+    # The Pool-era cleaning: uncached dateutil parsing, one record at a time in a worker
+    processed_hospitals = []
+    for hospital in chunk:
+        cleaned = clean_hospital_data({**hospital, 'Last Updated Date': ''})
+        cleaned['last_updated'] = legacy_parse_date(hospital.get('Last Updated Date', ''))
+        processed_hospitals.append(cleaned)
+    return processed_hospitals
+
+
+def run_pool(hospitals):
+    cleaned = []
+    with multiprocessing.Pool() as pool:
+        chunk_size = 100
+        chunks = [hospitals[i:i+chunk_size] for i in range(0, len(hospitals), chunk_size)]
+        for chunk_result in pool.imap_unordered(legacy_clean_chunk, chunks):
+            cleaned.extend(chunk_result)
+    return cleaned
+
+
+def run_generator(hospitals):
+    parse_date.cache_clear()
+    return list(iter_clean_hospitals(hospitals))
+
+
+def best_of(func, hospitals, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(hospitals)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(result)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--csv', default=hospital_data_service.csv_path)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    hospital_data_service.csv_path = args.csv
+    hospitals = hospital_data_service.get_all_hospitals()
+    # Per-record log lines would dominate both timings
+    logger.setLevel(logging.WARNING)
+
+    pool_time, pool_count = best_of(run_pool, hospitals, args.repeat)
+    generator_time, generator_count = best_of(run_generator, hospitals, args.repeat)
+
+    print(f"Hospitals:         {len(hospitals)}")
+    print(f"multiprocessing:   {pool_time * 1000:8.1f} ms ({pool_count} records)")
+    print(f"generator:         {generator_time * 1000:8.1f} ms ({generator_count} records)")
+    print(f"speedup:           {pool_time / generator_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import math
+import time
+import numpy as np
+from helpers.config import CLUSTER_MIN_ZOOM, CLUSTER_MAX_ZOOM, CLUSTER_RADIUS_PX
+from logger_setup import logger
+
+TILE_SIZE = 256
+# Web Mercator stops here; the poles are infinitely far away
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_xy(lat, lon):
+    """Project degrees to Web Mercator world coordinates in ``[0, 1)``."""
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return np.clip(x, 0, np.nextafter(1, 0)), np.clip(y, 0, np.nextafter(1, 0))
+
+
+class ClusterHierarchy:
+    """
+    Grid clusters of hospitals for every zoom level, built in one pass.
+
+    At zoom ``z`` the world is cut into cells of ``radius_px`` screen pixels,
+    ``2**z * TILE_SIZE / radius_px`` per axis, so the cell of a cluster at
+    zoom ``z`` is its cell at ``z + 1`` halved. The finest level is grouped
+    from the hospitals and each coarser level from the one below it, so a
+    rebuild is a handful of vectorized group-bys rather than one per zoom.
+    Each cluster keeps its count, centroid and min/average known wait.
+    """
+
+    def __init__(self, min_zoom=CLUSTER_MIN_ZOOM, max_zoom=CLUSTER_MAX_ZOOM, radius_px=CLUSTER_RADIUS_PX):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.radius_px = radius_px
+        self.version = None
+        self._levels = {}
+
+    @staticmethod
+    def _group(cell_x, cell_y, count, lat_sum, lon_sum, wait_min, wait_sum, wait_count, hospital_id):
+        # cell_y stays below 2**32 up to zoom 24 at any sensible radius, so the pair packs into one int64
+        keys = cell_x.astype(np.int64) << 32 | cell_y.astype(np.int64)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        n = len(unique_keys)
+        grouped_count = np.bincount(inverse, weights=count, minlength=n)
+        grouped_min = np.full(n, np.inf)
+        np.minimum.at(grouped_min, inverse, wait_min)
+        return {
+            'cell_x': unique_keys >> 32,
+            'cell_y': unique_keys & 0xFFFFFFFF,
+            'count': grouped_count,
+            'lat_sum': np.bincount(inverse, weights=lat_sum, minlength=n),
+            'lon_sum': np.bincount(inverse, weights=lon_sum, minlength=n),
+            'wait_min': grouped_min,
+            'wait_sum': np.bincount(inverse, weights=wait_sum, minlength=n),
+            'wait_count': np.bincount(inverse, weights=wait_count, minlength=n),
+            # Only meaningful for single-hospital clusters
+            'hospital_id': np.where(grouped_count == 1, np.bincount(inverse, weights=hospital_id, minlength=n), -1)
+        }
+
+    def build(self, records, version=None):
+        start_time = time.time()
+        points = [
+            (record['id'], float(record['latitude']), float(record['longitude']),
+             np.nan if record['wait_time'] is None else float(record['wait_time']))
+            for record in records
+            if record.get('latitude') is not None and record.get('longitude') is not None
+        ]
+        levels = {}
+        if points:
+            ids, lats, lons, waits = (np.array(column) for column in zip(*points))
+            x, y = mercator_xy(lats, lons)
+            cells = 2 ** self.max_zoom * TILE_SIZE / self.radius_px
+            known = ~np.isnan(waits)
+            level = self._group(
+                np.floor(x * cells), np.floor(y * cells), np.ones(len(ids)), lats, lons,
+                np.where(known, waits, np.inf), np.where(known, waits, 0.0), known.astype(float), ids.astype(float)
+            )
+            for zoom in range(self.max_zoom, self.min_zoom - 1, -1):
+                levels[zoom] = self._finish(level)
+                if zoom > self.min_zoom:
+                    level = self._group(level['cell_x'] >> 1, level['cell_y'] >> 1, level['count'], level['lat_sum'],
+                                        level['lon_sum'], level['wait_min'], level['wait_sum'], level['wait_count'],
+                                        level['hospital_id'])
+
+        # Swapped in one assignment so readers see either the old or the new hierarchy
+        self._levels, self.version = levels, version
+        logger.info(
+            f"Built cluster hierarchy over {len(points)} hospitals for zooms {self.min_zoom}-{self.max_zoom} "
+            f"in {time.time() - start_time:.3f} seconds"
+        )
+
+    @staticmethod
+    def _finish(level):
+        count = level['count']
+        wait_count = level['wait_count']
+        return dict(
+            level,
+            lat=level['lat_sum'] / count,
+            lon=level['lon_sum'] / count,
+            min_wait=np.where(np.isinf(level['wait_min']), np.nan, level['wait_min']),
+            avg_wait=np.where(wait_count > 0, level['wait_sum'] / np.maximum(wait_count, 1), np.nan)
+        )
+
+    def query(self, bbox, zoom):
+        """Clusters at ``zoom`` whose centroid lies in ``(south, west, north, east)``."""
+        level = self._levels.get(min(self.max_zoom, max(self.min_zoom, int(zoom))))
+        if level is None:
+            return []
+        south, west, north, east = bbox
+        lat, lon = level['lat'], level['lon']
+        in_lon = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        selected = np.flatnonzero((lat >= south) & (lat <= north) & in_lon)
+
+        clusters = []
+        for i in selected.tolist():
+            count = int(level['count'][i])
+            min_wait, avg_wait = level['min_wait'][i], level['avg_wait'][i]
+            clusters.append({
+                'lat': round(float(lat[i]), 5),
+                'lon': round(float(lon[i]), 5),
+                'count': count,
+                'min_wait': None if np.isnan(min_wait) else int(min_wait),
+                'avg_wait': None if np.isnan(avg_wait) else round(float(avg_wait), 1),
+                'hospital_id': int(level['hospital_id'][i]) if count == 1 else None
+            })
+        return clusters
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+from helpers.config import (
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_STATEMENT_TIMEOUT_MS, DB_POOL_HEALTH_CHECK_INTERVAL
+)
+from logger_setup import logger
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Shared psycopg2 connection pool for all synchronous database access.
+
+    Checkouts block (up to ``timeout`` seconds) instead of failing when all
+    ``maxconn`` connections are busy. Connections that sat idle longer than
+    ``health_check_interval`` are pinged before being handed out, and every
+    session gets a default ``statement_timeout``. The underlying pool is
+    created lazily and recreated after a fork, so RQ work horses never share
+    sockets with their parent.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, statement_timeout_ms, health_check_interval):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.statement_timeout_ms = statement_timeout_ms
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._slots = None
+        self._last_used = {}
+        self._metrics = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+        }
+        self._in_use = 0
+        self._idle = 0
+
+    def _get_pool(self):
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # After a fork the parent's connections are dropped, not closed: closing would end the parent's sessions
+                self._pool = ThreadedConnectionPool(
+                    self.minconn, self.maxconn,
+                    dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+                    options=f"-c statement_timeout={self.statement_timeout_ms}"
+                )
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.maxconn)
+                self._last_used = {}
+                self._in_use = 0
+                # ThreadedConnectionPool opens minconn connections up front
+                self._idle = self.minconn
+                logger.info(f"Created database connection pool (min={self.minconn}, max={self.maxconn})")
+        return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0)
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        pool = self._get_pool()
+        slots = self._slots
+        start_time = time.monotonic()
+        if not slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._metrics['timeouts'] += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout} seconds")
+
+        try:
+            conn = self._take(pool)
+            # Idle connections tend to go stale together (e.g. after a server restart), so replacements
+            # are checked too. The pool keeps at most minconn idle, so the last attempt gets a new one.
+            failures = 0
+            while not self._is_healthy(conn):
+                failures += 1
+                with self._lock:
+                    self._metrics['health_check_failures'] += 1
+                logger.warning("Discarding unhealthy pooled database connection")
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                if failures > self.minconn:
+                    raise psycopg2.OperationalError("No healthy database connection after discarding stale ones")
+                conn = self._take(pool)
+        except Exception:
+            slots.release()
+            raise
+
+        waited = time.monotonic() - start_time
+        with self._lock:
+            self._in_use += 1
+            self._metrics['checkouts'] += 1
+            self._metrics['total_wait_seconds'] += waited
+            self._metrics['max_wait_seconds'] = max(self._metrics['max_wait_seconds'], waited)
+        return conn
+
+    def _take(self, pool):
+        conn = pool.getconn()
+        with self._lock:
+            # The pool hands out an idle connection when it has one and opens a new one otherwise
+            self._idle = max(0, self._idle - 1)
+        return conn
+
+    def putconn(self, conn, close=False):
+        if self._pid != os.getpid():
+            return
+        try:
+            if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            close = True
+        self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn, close=close or conn.closed)
+        with self._lock:
+            self._in_use -= 1
+            # The pool closes connections beyond minconn instead of keeping them idle
+            if not conn.closed:
+                self._idle += 1
+        self._slots.release()
+
+    @contextmanager
+    def connection(self, statement_timeout_ms=None):
+        """Check out a connection; commit on success, roll back on error, always return it."""
+        conn = self.getconn()
+        try:
+            if statement_timeout_ms is not None:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET LOCAL statement_timeout = %s", (statement_timeout_ms,))
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    @contextmanager
+    def cursor(self, statement_timeout_ms=None):
+        with self.connection(statement_timeout_ms) as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+            stats.update({
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'in_use': self._in_use,
+                'idle': self._idle,
+                'avg_wait_seconds': stats['total_wait_seconds'] / stats['checkouts'] if stats['checkouts'] else 0.0,
+            })
+        return stats
+
+
+db_pool = ConnectionPool(
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_STATEMENT_TIMEOUT_MS, DB_POOL_HEALTH_CHECK_INTERVAL
+)
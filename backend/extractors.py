@@ -0,0 +1,123 @@
+import json
+import aiohttp
+from helpers.config import EXTRACTORS_PATH, EXTRACTOR_REQUEST_TIMEOUT
+from logger_setup import logger
+
+# Collects hospitals from the live DOM in one round trip. arguments: [kind, container, fields]
+DOM_EXTRACT_SCRIPT = """
+    const [kind, container, fields] = arguments;
+    const select = (root, query) => {
+        if (kind === 'xpath') {
+            const result = document.evaluate(query, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            return Array.from({length: result.snapshotLength}, (_, i) => result.snapshotItem(i));
+        }
+        return Array.from(root.querySelectorAll(query));
+    };
+    const text = (root, query) => {
+        if (!query) return '';
+        const node = select(root, query)[0];
+        return node ? (node.innerText || node.textContent || '').trim() : '';
+    };
+    return select(document, container).map(node => {
+        const hospital = {};
+        for (const [field, query] of Object.entries(fields)) {
+            hospital[field] = text(node, query);
+        }
+        return hospital;
+    });
+"""
+
+HOSPITAL_FIELDS = ('hospital_name', 'address', 'wait_time')
+
+
+class ExtractionError(Exception):
+    """A structured extractor ran but didn't produce usable hospitals."""
+
+
+def load_extractors(path=EXTRACTORS_PATH):
+    """
+    Read the per-network extractor registry.
+
+    The file maps a hospital_pages ``hospital_name`` to a spec; networks
+    without one are extracted from screenshots. Specs look like::
+
+        {"type": "css", "container": ".er-location",
+         "fields": {"hospital_name": "h3", "address": ".address", "wait_time": ".wait"}}
+
+        {"type": "xpath", "container": "//div[@class='er-location']",
+         "fields": {"hospital_name": ".//h3", "address": ".//p[1]", "wait_time": ".//span[@class='wait']"}}
+
+        {"type": "json", "url": "https://example.org/api/er-waits", "items": "data.locations",
+         "fields": {"hospital_name": "name", "address": "address.street", "wait_time": "waitMinutes"}}
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            extractors = json.load(f)
+    except FileNotFoundError:
+        logger.info(f"No extractor registry at {path}; every network uses screenshot extraction")
+        return {}
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid extractor registry {path}: {e}")
+        return {}
+    logger.info(f"Loaded structured extractors for {len(extractors)} networks")
+    return extractors
+
+
+def needs_browser(spec):
+    """JSON endpoints are fetched directly; everything else reads the rendered page."""
+    return spec.get('type') != 'json'
+
+
+def _lookup(data, path):
+    # Dotted path into nested dicts and lists, e.g. "data.locations" or "address.0.street"
+    for key in path.split('.') if path else ():
+        if isinstance(data, list):
+            data = data[int(key)] if key.isdigit() and int(key) < len(data) else None
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+    return data
+
+
+def _validated(hospitals, spec, hospital_num):
+    """Shape extracted rows like the vision model's output, or raise if they look wrong."""
+    rows = []
+    for hospital in hospitals:
+        row = {field: '' if hospital.get(field) is None else str(hospital[field]).strip() for field in HOSPITAL_FIELDS}
+        if row['hospital_name'] and row['wait_time']:
+            row['address'] = row['address'] or 'Hospital address not found'
+            rows.append(row)
+    if not rows:
+        raise ExtractionError(f"{spec.get('type')} extractor found no hospitals with wait times")
+    # A layout change usually shows up as missing rows rather than an error
+    if hospital_num and len(rows) < hospital_num:
+        raise ExtractionError(f"{spec.get('type')} extractor found {len(rows)} of {hospital_num} hospitals")
+    return {'hospitals': rows}
+
+
+def extract_from_dom(driver, spec, hospital_num=None):
+    """Run a css or xpath spec against a loaded page (blocking; call via asyncio.to_thread)."""
+    if spec.get('type') not in ('css', 'xpath'):
+        raise ExtractionError(f"Unsupported DOM extractor type: {spec.get('type')}")
+    hospitals = driver.execute_script(DOM_EXTRACT_SCRIPT, spec['type'], spec['container'], spec['fields'])
+    return _validated(hospitals or [], spec, hospital_num)
+
+
+async def extract_from_endpoint(spec, hospital_num=None):
+    """Fetch a json spec's endpoint and map its items to hospitals."""
+    timeout = aiohttp.ClientTimeout(total=EXTRACTOR_REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(spec['url'], headers=spec.get('headers', {})) as response:
+            if response.status != 200:
+                raise ExtractionError(f"Extractor endpoint returned HTTP {response.status}")
+            data = await response.json(content_type=None)
+
+    items = _lookup(data, spec.get('items', ''))
+    if not isinstance(items, list):
+        raise ExtractionError(f"Extractor endpoint has no list at '{spec.get('items', '')}'")
+    hospitals = [
+        {field: _lookup(item, path) for field, path in spec['fields'].items()}
+        for item in items
+    ]
+    return _validated(hospitals, spec, hospital_num)
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+import aiohttp
+from helpers.config import GOOGLE_MAPS_API_KEY, GEOCODER_PROVIDER, GEOCODER_RATE_LIMIT, GEOCODER_CONCURRENCY, GEOCODE_CACHE_PATH, GEOCODE_NEGATIVE_TTL
+from logger_setup import logger
+
+GeocodeResult = namedtuple('GeocodeResult', ['latitude', 'longitude', 'formatted_address'])
+
+# Read once to seed a new SQLite cache
+LEGACY_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'geocode_cache.json')
+
+# Cached "provider has no match" marker, distinct from "not cached"
+NOT_FOUND = object()
+
+
+class GeocodingError(Exception):
+    """Transient provider failure (quota, timeout, 5xx) that is worth retrying."""
+
+
+def normalize_query(query):
+    return re.sub(r'\s+', ' ', query.strip().lower())
+
+
+def address_cache_key(address, state, zip_code):
+    """Cache key for a street address, e.g. ``1701veteransdrive,al,35630``."""
+    return f"{re.sub(r'[^a-z0-9]', '', (address or '').lower())},{(state or '').lower()},{(zip_code or '').strip()}"
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every event loop and thread in the process."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class GeocodingProvider:
+    name = 'base'
+    default_rate_limit = 1.0
+
+    async def geocode(self, session, query):
+        """Return a GeocodeResult, None when the provider has no match, or raise GeocodingError."""
+        raise NotImplementedError
+
+
+class GoogleGeocodingProvider(GeocodingProvider):
+    name = 'google'
+    default_rate_limit = 40.0
+    url = "https://maps.googleapis.com/maps/api/geocode/json"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    async def geocode(self, session, query):
+        async with session.get(self.url, params={"address": query, "key": self.api_key}) as response:
+            if response.status >= 500:
+                raise GeocodingError(f"Google geocoding returned HTTP {response.status}")
+            data = await response.json()
+
+        if data["status"] == "OK":
+            result = data["results"][0]
+            location = result["geometry"]["location"]
+            return GeocodeResult(location["lat"], location["lng"], result.get("formatted_address"))
+        if data["status"] == "ZERO_RESULTS":
+            return None
+        if data["status"] in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR"):
+            raise GeocodingError(f"Google geocoding status {data['status']}")
+        logger.warning(f"Google geocoding failed for {query}: {data['status']}")
+        return None
+
+
+class NominatimProvider(GeocodingProvider):
+    name = 'nominatim'
+    default_rate_limit = 1.0
+    url = "https://nominatim.openstreetmap.org/search"
+
+    def __init__(self, user_agent="hospital_matcher"):
+        self.user_agent = user_agent
+
+    async def geocode(self, session, query):
+        params = {"q": query, "format": "json", "limit": 1}
+        async with session.get(self.url, params=params, headers={"User-Agent": self.user_agent}) as response:
+            if response.status == 429 or response.status >= 500:
+                raise GeocodingError(f"Nominatim returned HTTP {response.status}")
+            data = await response.json()
+
+        if not data:
+            return None
+        return GeocodeResult(float(data[0]["lat"]), float(data[0]["lon"]), data[0].get("display_name"))
+
+
+class StubGeocodingProvider(GeocodingProvider):
+    """Offline provider answering from a fixed ``{query: (lat, lon[, address])}`` mapping."""
+    name = 'stub'
+    default_rate_limit = 1000.0
+
+    def __init__(self, results=None):
+        self.results = {normalize_query(query): value for query, value in (results or {}).items()}
+        self.calls = []
+
+    async def geocode(self, session, query):
+        self.calls.append(query)
+        value = self.results.get(normalize_query(query))
+        if value is None:
+            return None
+        latitude, longitude, *rest = value
+        return GeocodeResult(latitude, longitude, rest[0] if rest else query)
+
+
+class GeocodeCache:
+    """
+    Persistent geocode cache backed by SQLite.
+
+    Every result is written as soon as it is known, so an interrupted sync
+    resumes from where it stopped, and WAL mode lets several RQ workers share
+    the file. Misses are cached too and expire after ``negative_ttl`` seconds.
+    Positive hits are memoized in memory for O(1) repeat lookups.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, negative_ttl=GEOCODE_NEGATIVE_TTL, legacy_json_path=LEGACY_CACHE_PATH):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        self._memo = {}
+        self._init_schema(legacy_json_path)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self, legacy_json_path):
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                key TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                formatted_address TEXT,
+                found INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        is_empty = conn.execute("SELECT 1 FROM geocodes LIMIT 1").fetchone() is None
+        if is_empty and legacy_json_path and os.path.exists(legacy_json_path):
+            with open(legacy_json_path, 'r') as f:
+                legacy_entries = json.load(f)
+            now = time.time()
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO geocodes (key, latitude, longitude, formatted_address, found, updated_at) VALUES (?, ?, ?, NULL, 1, ?)",
+                [(key, value[0], value[1], now) for key, value in legacy_entries.items() if value]
+            )
+            conn.execute("COMMIT")
+            logger.info(f"Imported {len(legacy_entries)} geocodes from {legacy_json_path}")
+
+    def get(self, key):
+        """Return a GeocodeResult, NOT_FOUND for a cached miss, or None when unknown."""
+        result = self._memo.get(key)
+        if result is not None:
+            return result
+
+        row = self._connection().execute(
+            "SELECT latitude, longitude, formatted_address, found, updated_at FROM geocodes WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        latitude, longitude, formatted_address, found, updated_at = row
+        if not found:
+            return NOT_FOUND if time.time() - updated_at < self.negative_ttl else None
+        result = GeocodeResult(latitude, longitude, formatted_address)
+        self._memo[key] = result
+        return result
+
+    def set(self, key, result):
+        """Store a result, or a miss when ``result`` is None."""
+        if result is None:
+            values = (key, None, None, None, 0, time.time())
+        else:
+            values = (key, result.latitude, result.longitude, result.formatted_address, 1, time.time())
+            self._memo[key] = result
+        self._connection().execute(
+            "INSERT OR REPLACE INTO geocodes (key, latitude, longitude, formatted_address, found, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            values
+        )
+
+
+class Geocoder:
+    """
+    Asynchronous geocoding front end shared by the CMS sync and the scraper.
+
+    Lookups go through the cache first; misses are rate limited per provider
+    with a token bucket, and concurrent lookups of the same query share one
+    provider request.
+    """
+
+    def __init__(self, provider, cache=None, rate_limit=None, concurrency=10, max_retries=3):
+        self.provider = provider
+        self._cache = cache
+        self.rate_limiter = TokenBucket(rate_limit or provider.default_rate_limit)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._in_flight = {}
+        self._sessions = {}
+
+    @property
+    def cache(self):
+        # Opened on first use so importing this module doesn't touch the filesystem
+        if self._cache is None:
+            self._cache = GeocodeCache()
+        return self._cache
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    async def _fetch(self, query):
+        session = await self._get_session()
+        for attempt in range(1, self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                return await self.provider.geocode(session, query)
+            except (GeocodingError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Geocoding error for {query} (attempt {attempt}/{self.max_retries}): {e}")
+                if attempt == self.max_retries:
+                    raise GeocodingError(f"Giving up on {query}") from e
+                await asyncio.sleep(2 ** attempt)
+
+    async def geocode(self, query, cache_key=None):
+        """Geocode one query, returning a GeocodeResult or None."""
+        result, _ = await self._resolve(query, cache_key)
+        return result
+
+    async def _resolve(self, query, cache_key=None):
+        # (result, definitive): definitive is False when the provider errored rather than found no match
+        key = cache_key or normalize_query(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return None if cached is NOT_FOUND else cached, True
+
+        loop = asyncio.get_running_loop()
+        in_flight = self._in_flight.get((loop, key))
+        if in_flight is not None:
+            return await in_flight
+
+        future = loop.create_future()
+        self._in_flight[(loop, key)] = future
+        try:
+            try:
+                result = await self._fetch(query)
+                # Definitive answers (including "no match") are cached; provider errors are not
+                self.cache.set(key, result)
+                outcome = (result, True)
+            except GeocodingError as e:
+                logger.error(str(e))
+                outcome = (None, False)
+            future.set_result(outcome)
+            return outcome
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._in_flight[(loop, key)]
+
+    async def geocode_first(self, queries, cache_key=None):
+        """Try increasingly vague queries in order and return the first hit."""
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return None if cached is NOT_FOUND else cached
+        result = None
+        definitive = True
+        for query in queries:
+            if not query:
+                continue
+            result, query_definitive = await self._resolve(query)
+            definitive = definitive and query_definitive
+            if result is not None:
+                break
+        # After an error a more precise query might still match, so neither a miss nor a vaguer hit is final
+        if cache_key and definitive:
+            self.cache.set(cache_key, result)
+        return result
+
+    async def geocode_many(self, requests):
+        """
+        Geocode ``(queries, cache_key)`` requests concurrently.
+
+        Returns results in request order; concurrency is bounded so a large
+        batch queues on the rate limiter instead of opening thousands of requests.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(queries, cache_key):
+            async with semaphore:
+                return await self.geocode_first(queries, cache_key)
+
+        return await asyncio.gather(*(run(queries, cache_key) for queries, cache_key in requests))
+
+    def run_sync(self, coro):
+        """Run a geocoding coroutine from synchronous code (RQ jobs, worker threads)."""
+        async def run_and_close():
+            try:
+                return await coro
+            finally:
+                await self.close()
+
+        return asyncio.run(run_and_close())
+
+    def geocode_sync(self, query):
+        return self.run_sync(self.geocode(query))
+
+
+def create_provider(name=GEOCODER_PROVIDER):
+    if name == 'google':
+        return GoogleGeocodingProvider(GOOGLE_MAPS_API_KEY)
+    if name == 'nominatim':
+        return NominatimProvider()
+    if name == 'stub':
+        return StubGeocodingProvider()
+    raise ValueError(f"Unknown geocoding provider: {name}")
+
+
+geocoder = Geocoder(create_provider(), rate_limit=GEOCODER_RATE_LIMIT, concurrency=GEOCODER_CONCURRENCY)
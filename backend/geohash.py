@@ -0,0 +1,81 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(lat, lon, precision):
+    """Standard geohash of a point; the hash at a lower precision is a prefix of this one."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    value = 0
+    bit_count = 0
+    use_lon = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if use_lon else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            interval[0] = mid
+        else:
+            value = value * 2
+            interval[1] = mid
+        use_lon = not use_lon
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[value])
+            value = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """``(lat_degrees, lon_degrees)`` covered by one cell; longitude gets the odd bit."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _index_range(low, high, origin, step, cells):
+    return max(0, math.floor((low + origin) / step)), min(cells - 1, math.floor((high + origin) / step))
+
+
+def _cover_ranges(south, west, north, east, precision):
+    # Row range and column ranges (two when crossing the antimeridian) of the covering cells
+    lat_step, lon_step = cell_size(precision)
+    rows = _index_range(south, north, 90.0, lat_step, round(180.0 / lat_step))
+    lon_cells = round(360.0 / lon_step)
+    if west <= east:
+        cols = [_index_range(west, east, 180.0, lon_step, lon_cells)]
+    else:
+        cols = [_index_range(west, 180.0, 180.0, lon_step, lon_cells), _index_range(-180.0, east, 180.0, lon_step, lon_cells)]
+    return rows, cols
+
+
+def cover_count(south, west, north, east, precision):
+    rows, cols = _cover_ranges(south, west, north, east, precision)
+    return (rows[1] - rows[0] + 1) * sum(col_max - col_min + 1 for col_min, col_max in cols)
+
+
+def cover(south, west, north, east, precision):
+    """Cells of ``precision`` covering the box; ``west > east`` crosses the antimeridian."""
+    lat_step, lon_step = cell_size(precision)
+    rows, cols = _cover_ranges(south, west, north, east, precision)
+    cells = set()
+    for row in range(rows[0], rows[1] + 1):
+        for col_min, col_max in cols:
+            for col in range(col_min, col_max + 1):
+                # Encoding the cell centre avoids edge rounding
+                cells.add(encode((row + 0.5) * lat_step - 90.0, (col + 0.5) * lon_step - 180.0, precision))
+    return cells
+
+
+def viewport_cells(south, west, north, east, min_precision, max_precision, max_cells):
+    """
+    The finest cover of a viewport using at most ``max_cells`` cells, or
+    None when even ``min_precision`` needs more.
+    """
+    for precision in range(max_precision, min_precision - 1, -1):
+        if cover_count(south, west, north, east, precision) <= max_cells:
+            return cover(south, west, north, east, precision)
+    return None
@@ -10,3 +10,93 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
+
+# In-memory spatial index used for geo queries on /api/hospitals
+SPATIAL_INDEX_CELL_SIZE = float(os.getenv('SPATIAL_INDEX_CELL_SIZE', '0.25'))
+SPATIAL_INDEX_TTL = int(os.getenv('SPATIAL_INDEX_TTL', '300'))
+
+# Ranking used by /api/hospitals/nearest when rank=combined
+NEAREST_AVERAGE_SPEED_MPH = float(os.getenv('NEAREST_AVERAGE_SPEED_MPH', '30'))
+NEAREST_UNKNOWN_WAIT_MINUTES = int(os.getenv('NEAREST_UNKNOWN_WAIT_MINUTES', '60'))
+NEAREST_MAX_RESULTS = int(os.getenv('NEAREST_MAX_RESULTS', '100'))
+
+# Geocoding: provider is 'google', 'nominatim' or 'stub' (offline)
+GEOCODER_PROVIDER = os.getenv('GEOCODER_PROVIDER', 'google' if GOOGLE_MAPS_API_KEY else 'nominatim')
+GEOCODER_RATE_LIMIT = float(os.getenv('GEOCODER_RATE_LIMIT', '0')) or None
+GEOCODER_CONCURRENCY = int(os.getenv('GEOCODER_CONCURRENCY', '10'))
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'geocode_cache.sqlite3'))
+GEOCODE_NEGATIVE_TTL = int(os.getenv('GEOCODE_NEGATIVE_TTL', str(7 * 24 * 3600)))
+
+# Number of changed CMS hospitals geocoded and written per COPY batch
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', '1000'))
+
+# Shared psycopg2 connection pool (see db.py)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+
+# Read-through cache for /api/hospitals responses (see response_cache.py)
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '60'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2048'))
+RESPONSE_CACHE_COORD_PRECISION = int(os.getenv('RESPONSE_CACHE_COORD_PRECISION', '2'))
+
+# Wait time forecasts (see wait_time_forecast.py)
+FORECAST_HORIZON_HOURS = int(os.getenv('FORECAST_HORIZON_HOURS', '6'))
+FORECAST_HISTORY_DAYS = int(os.getenv('FORECAST_HISTORY_DAYS', '14'))
+FORECAST_HALF_LIFE_HOURS = float(os.getenv('FORECAST_HALF_LIFE_HOURS', '3'))
+FORECAST_DAMPING = float(os.getenv('FORECAST_DAMPING', '0.8'))
+FORECAST_PROFILE_PRIOR = float(os.getenv('FORECAST_PROFILE_PRIOR', '3'))
+# Minimum seconds between forecast refits queued by the scraper
+FORECAST_REFRESH_INTERVAL = int(os.getenv('FORECAST_REFRESH_INTERVAL', '900'))
+
+# Scraper browser pool (see scraper_pool.py)
+SCRAPER_BROWSERS = int(os.getenv('SCRAPER_BROWSERS', '4'))
+SCRAPER_PER_HOST_LIMIT = int(os.getenv('SCRAPER_PER_HOST_LIMIT', '2'))
+SCRAPER_PAGE_TIMEOUT = float(os.getenv('SCRAPER_PAGE_TIMEOUT', '20'))
+SCRAPER_SETTLE_TIMEOUT = float(os.getenv('SCRAPER_SETTLE_TIMEOUT', '10'))
+
+# Adaptive per-network scrape scheduling (see scrape_scheduler.py); all in seconds
+SCRAPE_MIN_INTERVAL = int(os.getenv('SCRAPE_MIN_INTERVAL', '300'))
+SCRAPE_MAX_INTERVAL = int(os.getenv('SCRAPE_MAX_INTERVAL', str(6 * 3600)))
+SCRAPE_MAX_BACKOFF = int(os.getenv('SCRAPE_MAX_BACKOFF', str(6 * 3600)))
+SCRAPE_JITTER = float(os.getenv('SCRAPE_JITTER', '0.1'))
+SCRAPE_CHANGE_RATE_ALPHA = float(os.getenv('SCRAPE_CHANGE_RATE_ALPHA', '0.3'))
+SCRAPE_LEASE_SECONDS = int(os.getenv('SCRAPE_LEASE_SECONDS', '900'))
+SCRAPE_BATCH_SIZE = int(os.getenv('SCRAPE_BATCH_SIZE', str(2 * SCRAPER_BROWSERS)))
+SCRAPE_IDLE_SLEEP = float(os.getenv('SCRAPE_IDLE_SLEEP', '60'))
+CMS_SYNC_INTERVAL = int(os.getenv('CMS_SYNC_INTERVAL', str(24 * 3600)))
+HOSPITALS_RELOAD_INTERVAL = int(os.getenv('HOSPITALS_RELOAD_INTERVAL', '3600'))
+
+# Reuse vision-model extractions for unchanged pages (see page_fingerprint.py)
+EXTRACTION_CACHE_MAX_DISTANCE = int(os.getenv('EXTRACTION_CACHE_MAX_DISTANCE', '4'))
+EXTRACTION_CACHE_MAX_AGE = int(os.getenv('EXTRACTION_CACHE_MAX_AGE', str(6 * 3600)))
+
+# Per-network structured extractors tried before the screenshot path (see extractors.py)
+EXTRACTORS_PATH = os.getenv('EXTRACTORS_PATH', os.path.join(os.path.dirname(__file__), 'extractors.json'))
+EXTRACTOR_REQUEST_TIMEOUT = float(os.getenv('EXTRACTOR_REQUEST_TIMEOUT', '10'))
+
+# gzip/brotli for JSON responses (brotli only if the package is installed)
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))
+
+# Map clusters per zoom level (see clustering.py)
+CLUSTER_MIN_ZOOM = int(os.getenv('CLUSTER_MIN_ZOOM', '0'))
+CLUSTER_MAX_ZOOM = int(os.getenv('CLUSTER_MAX_ZOOM', '16'))
+CLUSTER_RADIUS_PX = float(os.getenv('CLUSTER_RADIUS_PX', '60'))
+
+# Hospital autocomplete (see search_index.py); scores are the matched share of query trigrams plus prefix bonuses
+SEARCH_MIN_SCORE = float(os.getenv('SEARCH_MIN_SCORE', '0.5'))
+AUTOCOMPLETE_MAX_RESULTS = int(os.getenv('AUTOCOMPLETE_MAX_RESULTS', '20'))
+
+# Socket.IO viewport subscriptions by geohash cell (see websocket_events.py)
+GEOHASH_MIN_PRECISION = int(os.getenv('GEOHASH_MIN_PRECISION', '2'))
+GEOHASH_MAX_PRECISION = int(os.getenv('GEOHASH_MAX_PRECISION', '5'))
+VIEWPORT_MAX_CELLS = int(os.getenv('VIEWPORT_MAX_CELLS', '32'))
+INITIAL_DATA_LIMIT = int(os.getenv('INITIAL_DATA_LIMIT', '50'))
+
+# Hospital change feed (/api/hospitals/changes and the sync_hospitals socket event)
+CHANGE_FEED_PAGE_SIZE = int(os.getenv('CHANGE_FEED_PAGE_SIZE', '500'))
+CHANGE_FEED_MAX_PAGE_SIZE = int(os.getenv('CHANGE_FEED_MAX_PAGE_SIZE', '5000'))
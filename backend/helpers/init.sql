@@ -5,6 +5,22 @@ DROP TABLE IF EXISTS hospital_pages CASCADE;
 DROP TABLE IF EXISTS hospital_wait_times CASCADE;
 DROP TABLE IF EXISTS script_metadata CASCADE;
 DROP TABLE IF EXISTS hospital_page_links CASCADE;
+DROP TABLE IF EXISTS hospital_match_cache CASCADE;
+DROP TABLE IF EXISTS wait_time_profiles CASCADE;
+DROP TABLE IF EXISTS wait_time_forecasts CASCADE;
+DROP TABLE IF EXISTS page_extractions CASCADE;
+DROP TABLE IF EXISTS hospital_tombstones CASCADE;
+DROP SEQUENCE IF EXISTS hospital_change_seq;
+
+DROP TYPE IF EXISTS wait_time_status;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Why a hospital has no wait_minutes (see normalize_wait_time in hospital_data_service.py)
+CREATE TYPE wait_time_status AS ENUM ('reported', 'not_available', 'address_not_found', 'unparsed');
+
+-- Change versions for the hospital change feed; every write to hospitals or hospital_tombstones takes the next one
+CREATE SEQUENCE hospital_change_seq;
 
 -- Create hospitals table
 CREATE TABLE hospitals (
@@ -27,16 +43,47 @@ CREATE TABLE hospitals (
     longitude FLOAT,
     er_volume VARCHAR(50),
     wait_time INTEGER,
+    wait_minutes INTEGER,
+    wait_status wait_time_status NOT NULL DEFAULT 'not_available',
+    content_hash VARCHAR(64),
+    change_version BIGINT NOT NULL DEFAULT nextval('hospital_change_seq'),
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 
--- Create wait_times table
+-- Append-only wait time observations, partitioned by month (UTC)
 CREATE TABLE wait_times (
-    id SERIAL PRIMARY KEY,
-    hospital_id INTEGER REFERENCES hospitals(id),
-    wait_time INTEGER,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    id BIGSERIAL,
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    wait_time INTEGER NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE wait_times_default PARTITION OF wait_times DEFAULT;
+
+-- Running wait time aggregates per hospital, UTC day of week (0 = Sunday) and hour
+CREATE TABLE wait_time_profiles (
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    day_of_week SMALLINT NOT NULL,
+    hour SMALLINT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    total_minutes BIGINT NOT NULL,
+    min_minutes INTEGER NOT NULL,
+    max_minutes INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (hospital_id, day_of_week, hour)
+);
+
+-- Hourly forecasts refreshed in batch by wait_time_forecast.py
+CREATE TABLE wait_time_forecasts (
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    target_hour TIMESTAMPTZ NOT NULL,
+    predicted_minutes REAL NOT NULL,
+    lower_minutes REAL NOT NULL,
+    upper_minutes REAL NOT NULL,
+    generated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (hospital_id, target_hour)
 );
 
 -- Create hospital_pages table
@@ -44,7 +91,14 @@ CREATE TABLE hospital_pages (
     id SERIAL PRIMARY KEY,
     hospital_name VARCHAR(255) NOT NULL UNIQUE,
     url TEXT NOT NULL,
-    hospital_num INTEGER
+    hospital_num INTEGER,
+    -- Adaptive scrape schedule (see scrape_scheduler.py)
+    refresh_interval_seconds INTEGER NOT NULL DEFAULT 900,
+    next_due_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_attempt_at TIMESTAMPTZ,
+    last_success_at TIMESTAMPTZ,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    change_rate REAL NOT NULL DEFAULT 0.5
 );
 
 -- Create hospital_wait_times table (for backwards compatibility)
@@ -70,11 +124,51 @@ CREATE TABLE hospital_page_links (
     UNIQUE (hospital_id, hospital_page_id)
 );
 
+-- Create hospital_match_cache table (scraped hospital name per network -> matched CMS hospital)
+CREATE TABLE hospital_match_cache (
+    id SERIAL PRIMARY KEY,
+    network_name VARCHAR(255) NOT NULL,
+    extracted_name VARCHAR(255) NOT NULL,
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    score FLOAT,
+    matched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (network_name, extracted_name)
+);
+
+-- Create page_extractions table (last vision-model extraction per network, see page_fingerprint.py)
+CREATE TABLE page_extractions (
+    network_name VARCHAR(255) PRIMARY KEY,
+    text_hash TEXT NOT NULL,
+    image_hash TEXT NOT NULL,
+    extracted_data TEXT NOT NULL,
+    extracted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_checked_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+
+-- Create hospital_tombstones table (deleted hospitals, for clients syncing from an older change version)
+CREATE TABLE hospital_tombstones (
+    hospital_id INTEGER PRIMARY KEY,
+    facility_id VARCHAR(50) NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    change_version BIGINT NOT NULL DEFAULT nextval('hospital_change_seq')
+);
+
 -- Create indexes for faster queries
 CREATE INDEX idx_hospitals_lat_long ON hospitals (latitude, longitude);
+CREATE INDEX idx_hospitals_change_version ON hospitals (change_version);
+CREATE INDEX idx_hospital_tombstones_change_version ON hospital_tombstones (change_version);
+CREATE INDEX idx_hospitals_facility_name_id ON hospitals (facility_name, id);
+CREATE INDEX idx_hospitals_wait_minutes_id ON hospitals ((COALESCE(wait_minutes, 2147483647)), id);
+-- Trigram indexes serve the ILIKE '%term%' search filter
+CREATE INDEX idx_hospitals_facility_name_trgm ON hospitals USING GIN (facility_name gin_trgm_ops);
+CREATE INDEX idx_hospitals_address_trgm ON hospitals USING GIN (address gin_trgm_ops);
 CREATE INDEX idx_wait_times_hospital_timestamp ON wait_times (hospital_id, timestamp);
 CREATE INDEX idx_hospital_page_links_hospital_id ON hospital_page_links (hospital_id);
 CREATE INDEX idx_hospital_page_links_hospital_page_id ON hospital_page_links (hospital_page_id);
+CREATE INDEX idx_hospital_match_cache_hospital_id ON hospital_match_cache (hospital_id);
+CREATE INDEX idx_hospital_pages_next_due_at ON hospital_pages (next_due_at);
 
 -- Function to match hospitals with hospital pages
 CREATE OR REPLACE FUNCTION match_hospitals() RETURNS void AS $$
@@ -100,6 +194,90 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Monthly wait_times partition covering observed_at, created on first use
+CREATE OR REPLACE FUNCTION ensure_wait_times_partition(observed_at TIMESTAMPTZ) RETURNS void AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', observed_at AT TIME ZONE 'UTC');
+    partition_name TEXT := 'wait_times_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF wait_times FOR VALUES FROM (%L) TO (%L)',
+            partition_name,
+            month_start AT TIME ZONE 'UTC',
+            (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC'
+        );
+    END IF;
+EXCEPTION
+    -- Another writer created it first
+    WHEN duplicate_table OR unique_violation THEN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Append observations to wait_times and fold them into the hourly profiles in one call
+CREATE OR REPLACE FUNCTION record_wait_time_observations(
+    p_hospital_ids INTEGER[],
+    p_wait_minutes INTEGER[],
+    p_observed_at TIMESTAMPTZ[]
+) RETURNS INTEGER AS $$
+DECLARE
+    partition_month TIMESTAMPTZ;
+    inserted INTEGER;
+BEGIN
+    FOR partition_month IN
+        SELECT DISTINCT date_trunc('month', o.observed_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+        FROM unnest(p_observed_at) AS o(observed_at)
+    LOOP
+        PERFORM ensure_wait_times_partition(partition_month);
+    END LOOP;
+
+    INSERT INTO wait_times (hospital_id, wait_time, timestamp)
+    SELECT o.hospital_id, o.wait_minutes, o.observed_at
+    FROM unnest(p_hospital_ids, p_wait_minutes, p_observed_at) AS o(hospital_id, wait_minutes, observed_at)
+    WHERE o.wait_minutes IS NOT NULL;
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+
+    INSERT INTO wait_time_profiles (hospital_id, day_of_week, hour, sample_count, total_minutes, min_minutes, max_minutes, updated_at)
+    SELECT o.hospital_id,
+           EXTRACT(DOW FROM o.observed_at AT TIME ZONE 'UTC')::SMALLINT,
+           EXTRACT(HOUR FROM o.observed_at AT TIME ZONE 'UTC')::SMALLINT,
+           COUNT(*), SUM(o.wait_minutes), MIN(o.wait_minutes), MAX(o.wait_minutes), NOW()
+    FROM unnest(p_hospital_ids, p_wait_minutes, p_observed_at) AS o(hospital_id, wait_minutes, observed_at)
+    WHERE o.wait_minutes IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (hospital_id, day_of_week, hour) DO UPDATE SET
+        sample_count = wait_time_profiles.sample_count + EXCLUDED.sample_count,
+        total_minutes = wait_time_profiles.total_minutes + EXCLUDED.total_minutes,
+        min_minutes = LEAST(wait_time_profiles.min_minutes, EXCLUDED.min_minutes),
+        max_minutes = GREATEST(wait_time_profiles.max_minutes, EXCLUDED.max_minutes),
+        updated_at = EXCLUDED.updated_at;
+
+    RETURN inserted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop cached matches when CMS changes the identity of the matched hospital
+CREATE OR REPLACE FUNCTION invalidate_hospital_match_cache() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM hospital_match_cache WHERE hospital_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_hospitals_invalidate_match_cache
+AFTER UPDATE OF facility_name, address, city, state, zip_code, latitude, longitude ON hospitals
+FOR EACH ROW
+WHEN (
+    OLD.facility_name IS DISTINCT FROM NEW.facility_name OR
+    OLD.address IS DISTINCT FROM NEW.address OR
+    OLD.city IS DISTINCT FROM NEW.city OR
+    OLD.state IS DISTINCT FROM NEW.state OR
+    OLD.zip_code IS DISTINCT FROM NEW.zip_code OR
+    OLD.latitude IS DISTINCT FROM NEW.latitude OR
+    OLD.longitude IS DISTINCT FROM NEW.longitude
+)
+EXECUTE FUNCTION invalidate_hospital_match_cache();
+
 -- Initialize script_metadata
 INSERT INTO script_metadata (script_name, last_run) 
 VALUES ('main_script', TO_TIMESTAMP('1970-01-01 00:00:00', 'YYYY-MM-DD HH24:MI:SS'))
@@ -0,0 +1,35 @@
+-- Adds the persistent match cache to databases created before it existed in init.sql
+
+CREATE TABLE IF NOT EXISTS hospital_match_cache (
+    id SERIAL PRIMARY KEY,
+    network_name VARCHAR(255) NOT NULL,
+    extracted_name VARCHAR(255) NOT NULL,
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    score FLOAT,
+    matched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (network_name, extracted_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_hospital_match_cache_hospital_id ON hospital_match_cache (hospital_id);
+
+CREATE OR REPLACE FUNCTION invalidate_hospital_match_cache() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM hospital_match_cache WHERE hospital_id = NEW.id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_hospitals_invalidate_match_cache ON hospitals;
+CREATE TRIGGER trg_hospitals_invalidate_match_cache
+AFTER UPDATE OF facility_name, address, city, state, zip_code, latitude, longitude ON hospitals
+FOR EACH ROW
+WHEN (
+    OLD.facility_name IS DISTINCT FROM NEW.facility_name OR
+    OLD.address IS DISTINCT FROM NEW.address OR
+    OLD.city IS DISTINCT FROM NEW.city OR
+    OLD.state IS DISTINCT FROM NEW.state OR
+    OLD.zip_code IS DISTINCT FROM NEW.zip_code OR
+    OLD.latitude IS DISTINCT FROM NEW.latitude OR
+    OLD.longitude IS DISTINCT FROM NEW.longitude
+)
+EXECUTE FUNCTION invalidate_hospital_match_cache();
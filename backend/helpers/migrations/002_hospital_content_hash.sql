@@ -0,0 +1,3 @@
+-- Per-facility hash of the cleaned CMS record, used by sync_cms_data to skip unchanged rows
+
+ALTER TABLE hospitals ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
@@ -0,0 +1,3 @@
+-- Supports keyset pagination of the hospital listing, ordered by (facility_name, id)
+
+CREATE INDEX IF NOT EXISTS idx_hospitals_facility_name_id ON hospitals (facility_name, id);
@@ -0,0 +1,29 @@
+-- Typed wait time columns: wait_minutes holds parsed minutes, wait_status why there is no number
+
+DO $$
+BEGIN
+    CREATE TYPE wait_time_status AS ENUM ('reported', 'not_available', 'address_not_found', 'unparsed');
+EXCEPTION
+    WHEN duplicate_object THEN NULL;
+END
+$$;
+
+ALTER TABLE hospitals ADD COLUMN IF NOT EXISTS wait_minutes INTEGER;
+ALTER TABLE hospitals ADD COLUMN IF NOT EXISTS wait_status wait_time_status NOT NULL DEFAULT 'not_available';
+
+-- Backfill from the free-text wait_time; mirrors normalize_wait_time in hospital_data_service.py
+UPDATE hospitals SET
+    wait_minutes = CASE
+        WHEN btrim(wait_time::text) ~ '^\d+$' THEN btrim(wait_time::text)::integer
+        WHEN btrim(wait_time::text) ~ '^\d+:\d{2}$'
+            THEN split_part(btrim(wait_time::text), ':', 1)::integer * 60 + split_part(btrim(wait_time::text), ':', 2)::integer
+    END,
+    wait_status = CASE
+        WHEN btrim(wait_time::text) ~ '^\d+$' OR btrim(wait_time::text) ~ '^\d+:\d{2}$' THEN 'reported'
+        WHEN wait_time IS NULL OR lower(btrim(wait_time::text)) IN ('', 'n/a', 'na', 'none', 'unavailable', 'not available') THEN 'not_available'
+        WHEN lower(btrim(wait_time::text)) = 'hospital address not found' THEN 'address_not_found'
+        ELSE 'unparsed'
+    END::wait_time_status
+WHERE wait_minutes IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_hospitals_wait_minutes_id ON hospitals ((COALESCE(wait_minutes, 2147483647)), id);
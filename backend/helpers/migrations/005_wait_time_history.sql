@@ -0,0 +1,112 @@
+-- Turns wait_times into a monthly-partitioned, append-only observation log and
+-- adds the incrementally maintained wait_time_profiles rollup
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'wait_times' AND relkind = 'r') THEN
+        ALTER TABLE wait_times RENAME TO wait_times_unpartitioned;
+        ALTER TABLE wait_times_unpartitioned RENAME CONSTRAINT wait_times_pkey TO wait_times_unpartitioned_pkey;
+        ALTER INDEX IF EXISTS idx_wait_times_hospital_timestamp RENAME TO idx_wait_times_unpartitioned_hospital_timestamp;
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS wait_times (
+    id BIGSERIAL,
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    wait_time INTEGER NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE IF NOT EXISTS wait_times_default PARTITION OF wait_times DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_wait_times_hospital_timestamp ON wait_times (hospital_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS wait_time_profiles (
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    day_of_week SMALLINT NOT NULL,
+    hour SMALLINT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    total_minutes BIGINT NOT NULL,
+    min_minutes INTEGER NOT NULL,
+    max_minutes INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (hospital_id, day_of_week, hour)
+);
+
+-- Monthly wait_times partition covering observed_at, created on first use
+CREATE OR REPLACE FUNCTION ensure_wait_times_partition(observed_at TIMESTAMPTZ) RETURNS void AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', observed_at AT TIME ZONE 'UTC');
+    partition_name TEXT := 'wait_times_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF wait_times FOR VALUES FROM (%L) TO (%L)',
+            partition_name,
+            month_start AT TIME ZONE 'UTC',
+            (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC'
+        );
+    END IF;
+EXCEPTION
+    -- Another writer created it first
+    WHEN duplicate_table OR unique_violation THEN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Append observations to wait_times and fold them into the hourly profiles in one call
+CREATE OR REPLACE FUNCTION record_wait_time_observations(
+    p_hospital_ids INTEGER[],
+    p_wait_minutes INTEGER[],
+    p_observed_at TIMESTAMPTZ[]
+) RETURNS INTEGER AS $$
+DECLARE
+    partition_month TIMESTAMPTZ;
+    inserted INTEGER;
+BEGIN
+    FOR partition_month IN
+        SELECT DISTINCT date_trunc('month', o.observed_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+        FROM unnest(p_observed_at) AS o(observed_at)
+    LOOP
+        PERFORM ensure_wait_times_partition(partition_month);
+    END LOOP;
+
+    INSERT INTO wait_times (hospital_id, wait_time, timestamp)
+    SELECT o.hospital_id, o.wait_minutes, o.observed_at
+    FROM unnest(p_hospital_ids, p_wait_minutes, p_observed_at) AS o(hospital_id, wait_minutes, observed_at)
+    WHERE o.wait_minutes IS NOT NULL;
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+
+    INSERT INTO wait_time_profiles (hospital_id, day_of_week, hour, sample_count, total_minutes, min_minutes, max_minutes, updated_at)
+    SELECT o.hospital_id,
+           EXTRACT(DOW FROM o.observed_at AT TIME ZONE 'UTC')::SMALLINT,
+           EXTRACT(HOUR FROM o.observed_at AT TIME ZONE 'UTC')::SMALLINT,
+           COUNT(*), SUM(o.wait_minutes), MIN(o.wait_minutes), MAX(o.wait_minutes), NOW()
+    FROM unnest(p_hospital_ids, p_wait_minutes, p_observed_at) AS o(hospital_id, wait_minutes, observed_at)
+    WHERE o.wait_minutes IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (hospital_id, day_of_week, hour) DO UPDATE SET
+        sample_count = wait_time_profiles.sample_count + EXCLUDED.sample_count,
+        total_minutes = wait_time_profiles.total_minutes + EXCLUDED.total_minutes,
+        min_minutes = LEAST(wait_time_profiles.min_minutes, EXCLUDED.min_minutes),
+        max_minutes = GREATEST(wait_time_profiles.max_minutes, EXCLUDED.max_minutes),
+        updated_at = EXCLUDED.updated_at;
+
+    RETURN inserted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replay any rows from the old table (stored as UTC timestamps) through the new write path
+DO $$
+BEGIN
+    IF to_regclass('wait_times_unpartitioned') IS NOT NULL THEN
+        PERFORM record_wait_time_observations(
+            array_agg(hospital_id), array_agg(wait_time), array_agg(timestamp AT TIME ZONE 'UTC')
+        )
+        FROM wait_times_unpartitioned
+        WHERE hospital_id IS NOT NULL AND wait_time IS NOT NULL AND timestamp IS NOT NULL;
+        DROP TABLE wait_times_unpartitioned;
+    END IF;
+END
+$$;
@@ -0,0 +1,11 @@
+-- Hourly wait time forecasts, replaced in batch by wait_time_forecast.refresh_wait_time_forecasts
+
+CREATE TABLE IF NOT EXISTS wait_time_forecasts (
+    hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+    target_hour TIMESTAMPTZ NOT NULL,
+    predicted_minutes REAL NOT NULL,
+    lower_minutes REAL NOT NULL,
+    upper_minutes REAL NOT NULL,
+    generated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (hospital_id, target_hour)
+);
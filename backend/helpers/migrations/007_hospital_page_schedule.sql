@@ -0,0 +1,10 @@
+-- Per-network scrape schedule used by scrape_scheduler.py
+
+ALTER TABLE hospital_pages ADD COLUMN IF NOT EXISTS refresh_interval_seconds INTEGER NOT NULL DEFAULT 900;
+ALTER TABLE hospital_pages ADD COLUMN IF NOT EXISTS next_due_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+ALTER TABLE hospital_pages ADD COLUMN IF NOT EXISTS last_attempt_at TIMESTAMPTZ;
+ALTER TABLE hospital_pages ADD COLUMN IF NOT EXISTS last_success_at TIMESTAMPTZ;
+ALTER TABLE hospital_pages ADD COLUMN IF NOT EXISTS consecutive_failures INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE hospital_pages ADD COLUMN IF NOT EXISTS change_rate REAL NOT NULL DEFAULT 0.5;
+
+CREATE INDEX IF NOT EXISTS idx_hospital_pages_next_due_at ON hospital_pages (next_due_at);
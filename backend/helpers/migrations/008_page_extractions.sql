@@ -0,0 +1,12 @@
+-- Last vision-model extraction per network, reused while the page fingerprint is unchanged (see page_fingerprint.py)
+
+CREATE TABLE IF NOT EXISTS page_extractions (
+    network_name VARCHAR(255) PRIMARY KEY,
+    text_hash TEXT NOT NULL,
+    image_hash TEXT NOT NULL,
+    extracted_data TEXT NOT NULL,
+    extracted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_checked_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,6 @@
+-- Trigram indexes so the /api/hospitals search filter (ILIKE '%term%' on name and address) no longer scans the table
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_hospitals_facility_name_trgm ON hospitals USING GIN (facility_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_hospitals_address_trgm ON hospitals USING GIN (address gin_trgm_ops);
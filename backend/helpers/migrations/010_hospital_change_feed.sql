@@ -0,0 +1,20 @@
+-- Versioned change feed for /api/hospitals/changes (see get_hospital_changes in hospital_data_service.py)
+
+CREATE SEQUENCE IF NOT EXISTS hospital_change_seq;
+
+ALTER TABLE hospitals ADD COLUMN IF NOT EXISTS change_version BIGINT;
+UPDATE hospitals SET change_version = nextval('hospital_change_seq') WHERE change_version IS NULL;
+ALTER TABLE hospitals ALTER COLUMN change_version SET DEFAULT nextval('hospital_change_seq');
+ALTER TABLE hospitals ALTER COLUMN change_version SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_hospitals_change_version ON hospitals (change_version);
+
+-- Deleted hospitals, so clients syncing from an older version can drop them
+CREATE TABLE IF NOT EXISTS hospital_tombstones (
+    hospital_id INTEGER PRIMARY KEY,
+    facility_id VARCHAR(50) NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    change_version BIGINT NOT NULL DEFAULT nextval('hospital_change_seq')
+);
+
+CREATE INDEX IF NOT EXISTS idx_hospital_tombstones_change_version ON hospital_tombstones (change_version);
@@ -0,0 +1,105 @@
+import json
+import select
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from helpers.config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from logger_setup import logger
+
+# Postgres LISTEN/NOTIFY channel announcing which hospitals were written, so
+# in-memory structures in other processes (spatial index, response cache)
+# can refresh exactly those rows.
+CHANNEL = 'hospital_changes'
+
+# Keeps each payload well under the 8000 byte NOTIFY limit
+MAX_IDS_PER_NOTIFICATION = 500
+
+# Advisory lock key held by every transaction that stamps hospital change versions
+CHANGE_VERSION_LOCK = 0x686f7370
+
+
+def _payloads(hospital_ids, kind):
+    hospital_ids = list(hospital_ids)
+    for i in range(0, len(hospital_ids), MAX_IDS_PER_NOTIFICATION):
+        yield json.dumps({'kind': kind, 'ids': hospital_ids[i:i + MAX_IDS_PER_NOTIFICATION]})
+
+
+def notify_hospital_changes(cursor, hospital_ids, kind):
+    """Queue a change notification on a psycopg2 cursor; it is delivered when the transaction commits."""
+    for payload in _payloads(hospital_ids, kind):
+        cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+
+
+async def notify_hospital_changes_async(conn, hospital_ids, kind):
+    """asyncpg counterpart of notify_hospital_changes."""
+    for payload in _payloads(hospital_ids, kind):
+        await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+
+
+def lock_change_versions(cursor):
+    """
+    Take the change-version lock until the transaction ends. Call before
+    any statement that draws from hospital_change_seq.
+
+    The sequence hands out versions in call order, not commit order; with
+    writers serialized from their first version to commit, a change feed
+    reader that has seen version N can never later find a smaller one.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (CHANGE_VERSION_LOCK,))
+
+
+async def lock_change_versions_async(conn):
+    """asyncpg counterpart of lock_change_versions."""
+    await conn.execute("SELECT pg_advisory_xact_lock($1)", CHANGE_VERSION_LOCK)
+
+
+class HospitalChangeListener(threading.Thread):
+    """Background thread that LISTENs on CHANNEL and calls ``callback(hospital_ids, kind)``."""
+
+    def __init__(self, callback, reconnect_delay=5):
+        super().__init__(name='hospital-change-listener', daemon=True)
+        self.callback = callback
+        self.reconnect_delay = reconnect_delay
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(
+                    dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+                )
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                logger.info(f"Listening for hospital changes on channel {CHANNEL}")
+                # Anything may have changed while we weren't listening
+                self.callback(None, 'reconnect')
+
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        try:
+                            payload = json.loads(notification.payload)
+                            self.callback(payload['ids'], payload.get('kind'))
+                        except Exception as e:
+                            logger.error(f"Error handling hospital change notification: {e}")
+            except Exception as e:
+                logger.error(f"Hospital change listener error: {e}")
+                time.sleep(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def start_hospital_change_listener(callback):
+    listener = HospitalChangeListener(callback)
+    listener.start()
+    return listener
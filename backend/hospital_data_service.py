@@ -1,36 +1,163 @@
+import base64
+import bisect
 import csv
+import hashlib
+import io
+import json
 import os
-import psycopg2
-from psycopg2.extras import execute_values
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderQuotaExceeded, GeocoderServiceError
+import resource
+import sys
 from fuzzywuzzy import fuzz
 import time
-from datetime import datetime
-import json
-from helpers.config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from datetime import date, datetime, timezone
+import functools
+import math
+import re
+from helpers.config import SPATIAL_INDEX_CELL_SIZE, SPATIAL_INDEX_TTL, NEAREST_AVERAGE_SPEED_MPH, NEAREST_UNKNOWN_WAIT_MINUTES, SYNC_BATCH_SIZE, CHANGE_FEED_PAGE_SIZE
 from logger_setup import logger
-import multiprocessing
+from db import db_pool
+import threading
 from dateutil import parser
-from geopy.distance import geodesic
-import requests
+from spatial_index import SpatialIndex
+from clustering import ClusterHierarchy
+from search_index import SearchIndex
+from match_blocking import MatchBlocker
+from geocoding import geocoder, address_cache_key
+from hospital_changes import notify_hospital_changes, lock_change_versions
+from wait_time_history import record_wait_time_observations, build_wait_profile
+
+KM_PER_MILE = 1.609344
+
+CMS_CSV_COLUMNS = ['Facility ID', 'Facility Name', 'Address', 'City/Town', 'State', 'ZIP Code', 'County/Parish', 'Telephone Number', 'Measure ID', 'Score', 'End Date']
+
+UPSERT_COLUMNS = [
+    'facility_id', 'facility_name', 'address', 'city', 'state', 'zip_code', 'county',
+    'phone_number', 'emergency_services', 'er_volume', 'wait_time', 'has_wait_time_data', 'has_live_wait_time',
+    'latitude', 'longitude', 'last_updated', 'content_hash', 'wait_minutes', 'wait_status'
+]
+
+# NULL marker for COPY so that empty strings stay empty strings
+COPY_NULL = '\\N'
+
+def peak_memory_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+LISTING_COLUMNS = ['id', 'facility_name', 'address', 'city', 'state', 'zip_code', 'latitude', 'longitude', 'wait_time', 'wait_status', 'has_live_wait_time', 'has_wait_time_data']
+
+# Listings serve wait_time from the normalized wait_minutes column
+LISTING_SELECT = ', '.join('wait_minutes AS wait_time' if column == 'wait_time' else column for column in LISTING_COLUMNS)
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+SORT_MODES = ('name', 'wait')
+
+# Hospitals without a wait time sort last when ordering by wait
+UNKNOWN_WAIT_SORT_KEY = 2 ** 31 - 1
+
+# Values of the wait_time_status enum
+WAIT_STATUSES = ('reported', 'not_available', 'address_not_found', 'unparsed')
+
+_WAIT_DURATION = re.compile(r'(?:(\d+)\s*(?:h|hr|hrs|hour|hours))?\s*(?:(\d+)\s*(?:m|min|mins|minute|minutes))?')
+
+def normalize_wait_time(wait_time):
+    """
+    Parse a raw wait time ('45', '1 hr 5 min', '0:45', 'N/A', ...) into
+    ``(minutes, status)`` for the wait_minutes / wait_status columns.
+    """
+    if wait_time is None:
+        return None, 'not_available'
+    if isinstance(wait_time, (int, float)) and not isinstance(wait_time, bool):
+        return (int(wait_time), 'reported') if wait_time >= 0 else (None, 'unparsed')
+
+    text = str(wait_time).strip().lower()
+    if text in ('', 'n/a', 'na', 'none', 'unavailable', 'not available'):
+        return None, 'not_available'
+    if text == 'hospital address not found':
+        return None, 'address_not_found'
+    if text.isdigit():
+        return int(text), 'reported'
+
+    clock = re.fullmatch(r'(\d+):(\d{2})', text)
+    if clock:
+        return int(clock.group(1)) * 60 + int(clock.group(2)), 'reported'
+    duration = _WAIT_DURATION.fullmatch(text)
+    if duration and (duration.group(1) or duration.group(2)):
+        return int(duration.group(1) or 0) * 60 + int(duration.group(2) or 0), 'reported'
+    return None, 'unparsed'
+
+def encode_cursor(sort_value, hospital_id):
+    """Opaque keyset cursor pointing just after ``(sort_value, id)``."""
+    return base64.urlsafe_b64encode(json.dumps([sort_value, hospital_id]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort='name'):
+    try:
+        sort_value, hospital_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    expected_type = str if sort == 'name' else int
+    if not isinstance(sort_value, expected_type) or not isinstance(hospital_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return sort_value, hospital_id
+
+def parse_bbox(value):
+    """Parse a ``south,west,north,east`` string; ``west > east`` crosses the antimeridian."""
+    south, west, north, east = (float(part) for part in value.split(','))
+    if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError(f"Invalid bbox: {value}")
+    return south, west, north, east
+
+
+def compact_page(result, coordinate_decimals=5):
+    """
+    Columnar form of a listing page: ``hospitals`` becomes one array per
+    column instead of one object per hospital, so keys aren't repeated for
+    every row. Coordinates are rounded to ``coordinate_decimals`` (about a
+    metre at 5).
+    """
+    hospitals = result['hospitals']
+    columns = {column: [hospital.get(column) for hospital in hospitals] for column in LISTING_COLUMNS}
+    for column in ('latitude', 'longitude'):
+        columns[column] = [None if value is None else round(float(value), coordinate_decimals) for value in columns[column]]
+    return dict(result, hospitals=columns, format='compact')
+
 
+def listing_sort_key(record, sort='name'):
+    if sort == 'wait':
+        return (UNKNOWN_WAIT_SORT_KEY if record['wait_time'] is None else record['wait_time'], record['id'])
+    return (record['facility_name'] or '', record['id'])
+
+@functools.lru_cache(maxsize=4096)
 def parse_date(date_string):
+    # CMS dates are MM/DD/YYYY and repeat across the whole file; dateutil is only the fallback
     try:
-        return parser.parse(date_string).date()
+        month, day, year = date_string.split('/')
+        return date(int(year), int(month), int(day))
     except ValueError:
+        pass
+    try:
+        return parser.parse(date_string).date()
+    except (ValueError, OverflowError):
         logger.warning(f"Invalid date format: {date_string}")
         return None
 
-def process_hospital_chunk(chunk):
-    processed_hospitals = []
-    for hospital in chunk:
+def iter_clean_hospitals(hospitals):
+    for hospital in hospitals:
         try:
-            processed_hospital = clean_hospital_data(hospital)
-            processed_hospitals.append(processed_hospital)
+            yield clean_hospital_data(hospital)
         except Exception as e:
             logger.error(f"Error processing hospital {hospital.get('Facility ID')}: {str(e)}")
-    return processed_hospitals
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 def clean_hospital_data(hospital):
     facility_id = hospital.get("Facility ID", "")
@@ -40,7 +167,7 @@ def clean_hospital_data(hospital):
     state = hospital.get("State", "")
     zip_code = hospital.get("ZIP Code", "")
     
-    logger.info(f"Processing {facility_id}: {facility_name}")
+    logger.debug(f"Processing {facility_id}: {facility_name}")
 
     last_updated = parse_date(hospital.get("Last Updated Date", ""))
 
@@ -62,71 +189,50 @@ def clean_hospital_data(hospital):
         "last_updated": last_updated
     }
 
+def hospital_content_hash(hospital):
+    """Hash of a cleaned CMS record, ignoring geocoded and bookkeeping fields."""
+    content = {key: value for key, value in hospital.items() if key not in ('latitude', 'longitude', 'content_hash')}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
 class HospitalDataService:
     def __init__(self):
         self.csv_path = os.path.join(os.path.dirname(__file__), 'data', 'Hospital_General_Information.csv')
-        self.geolocator = None
-        self.geocode_cache = {}
-        self.load_geocode_cache()
+        self.geocoder = geocoder
+        self.spatial_index = SpatialIndex(cell_size=SPATIAL_INDEX_CELL_SIZE)
+        self._spatial_index_lock = threading.Lock()
+        self.cluster_hierarchy = ClusterHierarchy()
+        self.search_index = SearchIndex()
+        self._derived_index_lock = threading.Lock()
+        # Bumped when names or addresses may have changed; wait time updates leave the search index alone
+        self._search_source_version = 0
+        self._search_index_lock = threading.Lock()
+        self._match_blocker = None
+        self._match_blocker_lock = threading.Lock()
+        self._change_listeners = []
 
     def get_coordinates(self, address):
-        base_url = "https://maps.googleapis.com/maps/api/geocode/json"
-        api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-        
-        params = {
-            "address": address,
-            "key": api_key
-        }
-        
-        response = requests.get(base_url, params=params)
-        data = response.json()
-        
-        if data["status"] == "OK":
-            location = data["results"][0]["geometry"]["location"]
-            return (location["lat"], location["lng"])
-        else:
+        result = self.geocoder.geocode_sync(address)
+        if result is None:
             logger.warning(f"Geocoding failed for address: {address}")
             return None
-
-
-    def init_geolocator(self):
-        self.geolocator = Nominatim(user_agent="hospital_matcher", timeout=10)
+        return (result.latitude, result.longitude)
 
     def get_db_connection(self):
-        return psycopg2.connect(
-            dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-        )
-
-    def load_geocode_cache(self):
-        try:
-            with open('geocode_cache.json', 'r') as f:
-                self.geocode_cache = json.load(f)
-        except FileNotFoundError:
-            self.geocode_cache = {}
-            logger.warning("geocode_cache.json not found. Proceeding without pre-loaded cache.")
-
-    def save_geocode_cache(self):
-        with open('geocode_cache.json', 'w') as f:
-            json.dump(self.geocode_cache, f)
+        return db_pool.connection()
 
     def geocode_addresses(self, hospitals):
-        logger.info("Starting geocoding of addresses")
-        self.init_geolocator()
-        
-        for hospital in hospitals:
-            facility_name = hospital.get("Facility Name", "")
-            address = hospital.get("Address", "")
-            city = hospital.get("City", "")
-            state = hospital.get("State", "")
-            zip_code = hospital.get("ZIP Code", "")
-            
-            logger.info(f"Geocoding hospital: {facility_name}")
+        if not hospitals:
+            return
+        logger.info(f"Starting geocoding of {len(hospitals)} addresses")
+        start_time = time.time()
 
-            key = f"{facility_name}, {city}, {state}"
-            if key in self.geocode_cache:
-                hospital['latitude'], hospital['longitude'] = self.geocode_cache[key]
-                logger.info(f"Found cached coordinates for {key}: {self.geocode_cache[key]}")
-                continue
+        geocode_requests = []
+        for hospital in hospitals:
+            facility_name = hospital.get("facility_name", "")
+            address = hospital.get("address", "")
+            city = hospital.get("city", "")
+            state = hospital.get("state", "")
+            zip_code = hospital.get("zip_code", "")
 
             geocoding_attempts = [
                 f"{address}, {city}, {state} {zip_code}",
@@ -136,29 +242,20 @@ class HospitalDataService:
                 facility_name,
                 f"{city}, {state} {zip_code}"
             ]
+            geocode_requests.append((geocoding_attempts, address_cache_key(address, state, zip_code)))
 
-            for attempt in geocoding_attempts:
-                try:
-                    logger.info(f"Attempting to geocode: {attempt}")
-                    location = self.geolocator.geocode(attempt)
-                    if location:
-                        result = (location.latitude, location.longitude)
-                        self.geocode_cache[key] = result
-                        hospital['latitude'], hospital['longitude'] = result
-                        logger.info(f"Geocoding successful for {attempt}: {result}")
-                        break
-                    time.sleep(1)
-                except (GeocoderTimedOut, GeocoderServiceError) as e:
-                    logger.warning(f"Geocoding error for {attempt}: {str(e)}")
-                    time.sleep(2)
-                except Exception as e:
-                    logger.error(f"Unexpected error geocoding {attempt}: {str(e)}")
+        results = self.geocoder.run_sync(self.geocoder.geocode_many(geocode_requests))
 
-            if 'latitude' not in hospital or 'longitude' not in hospital:
-                logger.error(f"Failed to geocode hospital: {facility_name}")
+        failed = 0
+        for hospital, result in zip(hospitals, results):
+            if result is None:
+                logger.error(f"Failed to geocode hospital: {hospital.get('facility_name', '')}")
                 hospital['latitude'], hospital['longitude'] = None, None
+                failed += 1
+            else:
+                hospital['latitude'], hospital['longitude'] = result.latitude, result.longitude
 
-        logger.info("Geocoding of addresses completed")
+        logger.info(f"Geocoding of addresses completed in {time.time() - start_time:.2f} seconds ({failed} failed)")
 
     def get_all_hospitals(self):
         logger.info(f"Reading CSV file: {self.csv_path}")
@@ -167,125 +264,202 @@ class HospitalDataService:
         total_rows = 0
         er_count = 0
         wait_time_count = 0
+        start_time = time.time()
         
         try:
-            with open(self.csv_path, 'r', encoding='utf-8') as csvfile:
-                csv_reader = csv.DictReader(csvfile)
+            with open(self.csv_path, 'r', encoding='utf-8', newline='') as csvfile:
+                csv_reader = csv.reader(csvfile)
+                header = next(csv_reader)
+                columns = {name: header.index(name) for name in CMS_CSV_COLUMNS}
+                measure_col = columns['Measure ID']
+                facility_col = columns['Facility ID']
+                score_col = columns['Score']
                 
                 for row in csv_reader:
                     total_rows += 1
-                    facility_id = row.get('Facility ID', '')
-                    measure_id = row.get('Measure ID', '')
+                    measure_id = row[measure_col]
                     
+                    # Only two measures matter; skip everything else before touching other columns
                     if measure_id == 'EDV':
                         er_count += 1
+                        facility_id = row[facility_col]
                         if facility_id not in hospitals:
                             hospitals[facility_id] = {
                                 'Facility ID': facility_id,
-                                'Facility Name': row.get('Facility Name', ''),
-                                'Address': row.get('Address', ''),
-                                'City': row.get('City/Town', ''),
-                                'State': row.get('State', ''),
-                                'ZIP Code': row.get('ZIP Code', ''),
-                                'County': row.get('County/Parish', ''),
-                                'Phone Number': row.get('Telephone Number', ''),
+                                'Facility Name': row[columns['Facility Name']],
+                                'Address': row[columns['Address']],
+                                'City': row[columns['City/Town']],
+                                'State': row[columns['State']],
+                                'ZIP Code': row[columns['ZIP Code']],
+                                'County': row[columns['County/Parish']],
+                                'Phone Number': row[columns['Telephone Number']],
                                 'Emergency Services': True,
-                                'ER Volume': row.get('Score', ''),
+                                'ER Volume': row[score_col],
                                 'Wait Time': '360',
-                                'Last Updated Date': row.get('End Date', '')
+                                'Last Updated Date': row[columns['End Date']]
                             }
                     elif measure_id == 'ED_2_Strata_1':
+                        facility_id = row[facility_col]
                         if facility_id in hospitals:
                             wait_time_count += 1
-                            hospitals[facility_id]['Wait Time'] = row.get('Score', '360')
+                            hospitals[facility_id]['Wait Time'] = row[score_col]
 
+            elapsed = time.time() - start_time
+            file_mb = os.path.getsize(self.csv_path) / (1024 * 1024)
             logger.info(f"Total rows in CSV: {total_rows}")
             logger.info(f"Total Emergency Rooms found: {er_count}")
             logger.info(f"Total Wait Times found: {wait_time_count}")
             logger.info(f"Successfully processed {len(hospitals)} unique Emergency Room hospitals")
+            logger.info(
+                f"Read {file_mb:.1f} MB in {elapsed:.2f} seconds "
+                f"({total_rows / max(elapsed, 1e-9):,.0f} rows/s, {file_mb / max(elapsed, 1e-9):.1f} MB/s, "
+                f"peak RSS {peak_memory_mb():.0f} MB)"
+            )
             return list(hospitals.values())
         
         except Exception as e:
             logger.error(f"Unexpected error when reading CSV: {str(e)}")
             raise
 
-    def sync_cms_data(self, cursor, last_run_time):
+    def sync_cms_data(self, cursor, last_run_time=None):
+        """
+        Bring ``hospitals`` in line with the CMS file.
+
+        Each cleaned record is hashed and only facilities whose hash changed are
+        geocoded and upserted; facilities missing from the file are deleted.
+        ``last_run_time`` is unused and only kept for existing callers.
+        Returns a summary of inserted/updated/unchanged/deleted counts.
+        """
         logger.info("Starting CMS data sync")
         
         try:
             raw_hospitals = self.get_all_hospitals()
             logger.info(f"Fetched {len(raw_hospitals)} hospitals from CMS")
 
-            cursor.execute("SELECT facility_id, latitude, longitude FROM hospitals")
-            existing_hospitals = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            cursor.execute("SELECT facility_id, content_hash, address, city, state, zip_code, latitude FROM hospitals")
+            existing_hospitals = {row[0]: row[1:] for row in cursor.fetchall()}
 
-            hospitals_to_process = [
-                hospital for hospital in raw_hospitals
-                if hospital.get("Facility ID") not in existing_hospitals or 
-                self.is_hospital_new_or_updated(hospital, last_run_time)
-            ]
+            summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+            # Taken from the raw records, so a record that fails cleaning doesn't get its hospital deleted
+            cms_facility_ids = {hospital.get('Facility ID') for hospital in raw_hospitals}
+
+            def changed_hospitals():
+                for hospital in iter_clean_hospitals(raw_hospitals):
+                    hospital['content_hash'] = hospital_content_hash(hospital)
+                    existing = existing_hospitals.get(hospital['facility_id'])
+                    if existing is None:
+                        summary['inserted'] += 1
+                    elif existing[0] != hospital['content_hash']:
+                        summary['updated'] += 1
+                    elif existing[5] is None:
+                        # Unchanged, but an earlier geocode failed; try again so it doesn't stay off the map
+                        hospital['retry_geocoding'] = True
+                    else:
+                        summary['unchanged'] += 1
+                        continue
+                    yield hospital
 
-            logger.info(f"Found {len(hospitals_to_process)} hospitals to process")
+            def is_write_needed(hospital):
+                if not hospital.pop('retry_geocoding', False):
+                    return True
+                if hospital['latitude'] is None:
+                    summary['unchanged'] += 1
+                    return False
+                summary['updated'] += 1
+                return True
 
-            # Geocode addresses before multiprocessing
-            self.geocode_addresses(hospitals_to_process)
+            def needs_geocoding(hospital):
+                # Only geocode when there are no coordinates yet or the address moved
+                existing = existing_hospitals.get(hospital['facility_id'])
+                address = (hospital['address'], hospital['city'], hospital['state'], hospital['zip_code'])
+                return existing is None or existing[5] is None or tuple(existing[1:5]) != address
 
-            # Use multiprocessing Pool for data cleaning
-            with multiprocessing.Pool() as pool:
-                chunk_size = 100
-                hospital_chunks = [hospitals_to_process[i:i+chunk_size] for i in range(0, len(hospitals_to_process), chunk_size)]
-                
-                logger.info(f"Splitting {len(hospitals_to_process)} hospitals into {len(hospital_chunks)} chunks")
-                for chunk_result in pool.imap_unordered(process_hospital_chunk, hospital_chunks):
-                    logger.info(f"Processed chunk of {len(chunk_result)} hospitals")
-                    logger.info("Pool Number: {}".format(multiprocessing.current_process().name))
-                    if chunk_result:
-                        logger.info(f"Updating database with chunk of {len(chunk_result)} hospitals")
-                        self.bulk_upsert_hospitals(cursor, chunk_result)
+            # Cleaning is lazy, so only changed hospitals are kept. They are all geocoded before the
+            # first write, because writes hold the change-version lock until this transaction commits.
+            batches = []
+            for batch in iter_batches(changed_hospitals(), SYNC_BATCH_SIZE):
+                self.geocode_addresses([hospital for hospital in batch if needs_geocoding(hospital)])
+                batch = [hospital for hospital in batch if is_write_needed(hospital)]
+                if batch:
+                    batches.append(batch)
+            for batch in batches:
+                self.bulk_upsert_hospitals(cursor, batch)
 
-            self.save_geocode_cache()
+            removed_facility_ids = [facility_id for facility_id in existing_hospitals if facility_id not in cms_facility_ids]
+            if cms_facility_ids and removed_facility_ids:
+                summary['deleted'] = self.delete_hospitals(cursor, removed_facility_ids)
 
-            logger.info("CMS data sync completed")
+            logger.info(
+                f"CMS data sync completed: {summary['inserted']} inserted, {summary['updated']} updated, "
+                f"{summary['unchanged']} unchanged, {summary['deleted']} deleted"
+            )
+            return summary
         
         except Exception as e:
             logger.error(f"Error in CMS data sync: {str(e)}")
             raise
 
-    def is_hospital_new_or_updated(self, hospital, last_run_time):
-        last_updated_str = hospital.get('Last Updated Date', '').strip()
-        if not last_updated_str:
-            return True
-        try:
-            hospital_update_date = parse_date(last_updated_str)
-            return hospital_update_date > last_run_time.date()
-        except ValueError:
-            logger.warning(f"Invalid date format for hospital {hospital.get('Facility Name', 'Unknown')}: {last_updated_str}")
-            return True
+    def delete_hospitals(self, cursor, facility_ids):
+        cursor.execute("SELECT id FROM hospitals WHERE facility_id = ANY(%s)", (facility_ids,))
+        hospital_ids = [row[0] for row in cursor.fetchall()]
+        if not hospital_ids:
+            return 0
+
+        # Rows referencing hospitals without ON DELETE CASCADE
+        cursor.execute("DELETE FROM hospital_page_links WHERE hospital_id = ANY(%s)", (hospital_ids,))
+        cursor.execute("DELETE FROM wait_times WHERE hospital_id = ANY(%s)", (hospital_ids,))
+        # Tombstones tell change feed clients to drop these hospitals
+        lock_change_versions(cursor)
+        cursor.execute("""
+            WITH deleted AS (
+                DELETE FROM hospitals WHERE id = ANY(%s) RETURNING id, facility_id
+            )
+            INSERT INTO hospital_tombstones (hospital_id, facility_id)
+            SELECT id, facility_id FROM deleted
+        """, (hospital_ids,))
+        notify_hospital_changes(cursor, hospital_ids, 'cms')
+        logger.info(f"Deleted {len(hospital_ids)} hospitals no longer present in CMS data")
+        return len(hospital_ids)
 
     def update_wait_times(self, cursor, hospital_identifier, wait_time, is_live=False):
+        wait_minutes, wait_status = normalize_wait_time(wait_time)
         try:
+            lock_change_versions(cursor)
             if isinstance(hospital_identifier, int):
                 cursor.execute("""
                     UPDATE hospitals
                     SET wait_time = %s, 
-                        has_wait_time_data = TRUE, 
+                        wait_minutes = %s,
+                        wait_status = %s,
+                        has_wait_time_data = %s, 
                         has_live_wait_time = CASE WHEN %s THEN TRUE ELSE has_live_wait_time END,
+                        change_version = nextval('hospital_change_seq'),
                         last_updated = NOW()
                     WHERE id = %s
-                """, (wait_time, is_live, hospital_identifier))
+                    RETURNING id
+                """, (wait_minutes, wait_minutes, wait_status, wait_minutes is not None, is_live, hospital_identifier))
             else:
                 cursor.execute("""
                     UPDATE hospitals h
                     SET wait_time = %s, 
-                        has_wait_time_data = TRUE, 
+                        wait_minutes = %s,
+                        wait_status = %s,
+                        has_wait_time_data = %s, 
                         has_live_wait_time = CASE WHEN %s THEN TRUE ELSE has_live_wait_time END,
+                        change_version = nextval('hospital_change_seq'),
                         last_updated = NOW()
                     FROM hospital_page_links hpl
                     JOIN hospital_pages hp ON hpl.hospital_page_id = hp.id
                     WHERE h.id = hpl.hospital_id AND hp.hospital_name = %s
-                """, (wait_time, is_live, hospital_identifier))
+                    RETURNING h.id
+                """, (wait_minutes, wait_minutes, wait_status, wait_minutes is not None, is_live, hospital_identifier))
 
-            if cursor.rowcount > 0:
+            # The spatial index picks these up from the NOTIFY, which is only delivered on commit
+            updated_ids = [row[0] for row in cursor.fetchall()]
+            if updated_ids:
+                observed_at = datetime.now(timezone.utc)
+                record_wait_time_observations(cursor, [(hospital_id, wait_minutes, observed_at) for hospital_id in updated_ids])
+                notify_hospital_changes(cursor, updated_ids, 'wait_time')
                 logger.info(f"Updated wait time for {hospital_identifier}")
                 return True
             else:
@@ -311,16 +485,38 @@ class HospitalDataService:
 
     
     def bulk_upsert_hospitals(self, cursor, hospitals):
+        """
+        Load hospitals with COPY into a temporary staging table and merge them
+        into ``hospitals`` with a single INSERT ... ON CONFLICT statement.
+        """
         if not hospitals:
             logger.warning("No hospitals to upsert")
             return
 
-        insert_query = """
-        INSERT INTO hospitals (
-            facility_id, facility_name, address, city, state, zip_code, county,
-            phone_number, emergency_services, er_volume, wait_time, has_wait_time_data, has_live_wait_time, 
-            latitude, longitude, last_updated
-        ) VALUES %s
+        start_time = time.time()
+        columns = ', '.join(UPSERT_COLUMNS)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for h in hospitals:
+            wait_minutes, wait_status = normalize_wait_time(h['wait_time'])
+            writer.writerow([
+                COPY_NULL if value is None else value
+                for value in (
+                    h['facility_id'], h['facility_name'], h['address'], h['city'],
+                    h['state'], h['zip_code'], h['county'], h['phone_number'],
+                    h['emergency_services'], h['er_volume'], wait_minutes,
+                    wait_minutes is not None,  # has_wait_time_data
+                    False,  # has_live_wait_time (CMS data is not live)
+                    h['latitude'], h['longitude'], h['last_updated'], h.get('content_hash'),
+                    wait_minutes, wait_status
+                )
+            ])
+        buffer.seek(0)
+
+        merge_query = f"""
+        INSERT INTO hospitals ({columns})
+        SELECT DISTINCT ON (facility_id) {columns} FROM hospitals_staging
         ON CONFLICT (facility_id) DO UPDATE SET
             facility_name = EXCLUDED.facility_name,
             address = EXCLUDED.address,
@@ -332,46 +528,58 @@ class HospitalDataService:
             emergency_services = EXCLUDED.emergency_services,
             er_volume = EXCLUDED.er_volume,
             wait_time = EXCLUDED.wait_time,
-            has_wait_time_data = CASE
-                WHEN EXCLUDED.wait_time IS NOT NULL AND EXCLUDED.wait_time != 'N/A' THEN TRUE
-                ELSE hospitals.has_wait_time_data
-            END,
+            wait_minutes = EXCLUDED.wait_minutes,
+            wait_status = EXCLUDED.wait_status,
+            has_wait_time_data = EXCLUDED.has_wait_time_data OR hospitals.has_wait_time_data,
             has_live_wait_time = hospitals.has_live_wait_time,
             latitude = COALESCE(EXCLUDED.latitude, hospitals.latitude),
             longitude = COALESCE(EXCLUDED.longitude, hospitals.longitude),
-            last_updated = EXCLUDED.last_updated
+            last_updated = EXCLUDED.last_updated,
+            content_hash = EXCLUDED.content_hash,
+            change_version = nextval('hospital_change_seq')
+        RETURNING id
         """
-        
-        hospital_data = [
-            (
-                h['facility_id'], h['facility_name'], h['address'], h['city'],
-                h['state'], h['zip_code'], h['county'], h['phone_number'],
-                h['emergency_services'], h['er_volume'], h['wait_time'], 
-                h['wait_time'] is not None and h['wait_time'] != 'N/A',  # has_wait_time_data
-                False,  # has_live_wait_time (CMS data is not live)
-                h['latitude'], h['longitude'], h['last_updated']
-            )
-            for h in hospitals
-        ]
 
         try:
-            execute_values(cursor, insert_query, hospital_data)
-            logger.info(f"Upserted {len(hospital_data)} hospitals")
+            # Same column types as hospitals, but none of its constraints or defaults
+            cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS hospitals_staging ON COMMIT DROP AS
+                SELECT {columns} FROM hospitals WITH NO DATA
+            """)
+            cursor.execute("TRUNCATE hospitals_staging")
+            cursor.copy_expert(
+                f"COPY hospitals_staging ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                buffer
+            )
+            # New rows take their change_version from the column default
+            lock_change_versions(cursor)
+            cursor.execute(merge_query)
+            notify_hospital_changes(cursor, [row[0] for row in cursor.fetchall()], 'cms')
+            elapsed = time.time() - start_time
+            logger.info(
+                f"Upserted {len(hospitals)} hospitals in {elapsed:.2f} seconds "
+                f"({len(hospitals) / max(elapsed, 1e-9):,.0f} rows/s, peak RSS {peak_memory_mb():.0f} MB)"
+            )
         except Exception as e:
             logger.error(f"Error during bulk upsert: {str(e)}")
-            for h in hospital_data:
-                try:
-                    cursor.execute(insert_query, (h,))
-                    logger.info(f"Inserted hospital {h[0]} individually")
-                except Exception as individual_error:
-                    logger.error(f"Error inserting hospital {h[0]}: {str(individual_error)}")
-            cursor.connection.commit()
+            raise
+
+    def get_match_blocker(self, database_hospitals):
+        with self._match_blocker_lock:
+            if self._match_blocker is None or self._match_blocker.source is not database_hospitals:
+                start_time = time.time()
+                self._match_blocker = MatchBlocker(database_hospitals)
+                logger.info(f"Built match blocking index over {len(database_hospitals)} hospitals in {time.time() - start_time:.2f} seconds")
+            return self._match_blocker
 
-    def match_hospitals_from_screenshot(self, extracted_hospitals, database_hospitals, network_name):
+    def match_hospitals_from_screenshot(self, extracted_hospitals, database_hospitals, network_name, exclude_ids=None):
         matched_pairs = []
-        matched_db_hospitals = set()
+        matched_db_hospitals = set(exclude_ids or ())
         start_time = time.time()
         logger.info(f"Starting matching process for {len(extracted_hospitals)} extracted hospitals against {len(database_hospitals)} database hospitals")
+
+        blocker = self.get_match_blocker(database_hospitals)
+        network = network_name.lower()
         
         for i, extracted_hospital in enumerate(extracted_hospitals):
             best_match = None
@@ -381,29 +589,30 @@ class HospitalDataService:
             extracted_name = extracted_hospital['hospital_name'].lower()
             extracted_address = extracted_hospital['address'].lower()
             
-            # Get coordinates for extracted hospital
-            extracted_coords = self.get_coordinates(f"{extracted_name}, {extracted_address}")
+            # Get coordinates for extracted hospital (the scraper geocodes them up front in one batch)
+            if 'coordinates' in extracted_hospital:
+                extracted_coords = extracted_hospital['coordinates']
+            else:
+                extracted_coords = self.get_coordinates(f"{extracted_name}, {extracted_address}")
+
+            candidate_indices, distances = blocker.candidates(extracted_name, extracted_address, extracted_coords)
+            logger.debug(f"Scoring {len(candidate_indices)} candidates for {extracted_hospital['hospital_name']}")
             
-            for j, db_hospital in enumerate(database_hospitals):
+            for j, distance in zip(candidate_indices.tolist(), distances.tolist()):
+                db_hospital = database_hospitals[j]
                 if db_hospital['id'] in matched_db_hospitals:
                     continue  # Skip already matched hospitals
                 
-                db_name = db_hospital['facility_name'].lower()
-                db_address = f"{db_hospital['address']}, {db_hospital['city']}, {db_hospital['state']} {db_hospital['zip_code']}".lower()
+                db_name = blocker.names[j]
+                db_address = blocker.addresses[j]
                 
                 # Calculate various similarity scores
                 name_score = fuzz.token_set_ratio(extracted_name, db_name)
                 address_score = fuzz.token_set_ratio(extracted_address, db_address)
-                network_score = fuzz.partial_ratio(network_name.lower(), db_name) * 0.1
+                network_score = fuzz.partial_ratio(network, db_name) * 0.1
                 
-                # Calculate geographic distance if coordinates are available
-                distance_score = 0
-                if db_hospital['latitude'] and db_hospital['longitude'] and extracted_coords:
-                    try:
-                        distance = geodesic(extracted_coords, (db_hospital['latitude'], db_hospital['longitude'])).miles
-                        distance_score = max(0, 100 - distance)  # 100 points for 0 miles, decreasing as distance increases
-                    except Exception as e:
-                        logger.warning(f"Error calculating distance: {e}")
+                # 100 points for 0 miles, decreasing as distance increases (NaN when either side has no coordinates)
+                distance_score = 0 if math.isnan(distance) else max(0, 100 - distance)
                 
                 # Calculate weighted total score
                 total_score = (
@@ -456,84 +665,446 @@ class HospitalDataService:
         logger.info(f"Retrieved {len(results)} hospitals from database in {end_time - start_time:.2f} seconds")
         return results
     
-    def get_hospitals_paginated(self, page=1, per_page=50, search_term=None, lat=0, lon=0, radius=0):
-        offset = (page - 1) * per_page
-        query = """
-            SELECT id, facility_name, address, city, state, zip_code, latitude, longitude, 
-                   wait_time, has_live_wait_time, has_wait_time_data
+    def refresh_spatial_index(self, cursor=None):
+        start_time = time.time()
+        query = f"SELECT {LISTING_SELECT} FROM hospitals"
+        if cursor is None:
+            with self.get_db_connection() as conn:
+                with conn.cursor() as own_cursor:
+                    own_cursor.execute(query)
+                    rows = own_cursor.fetchall()
+        else:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+
+        self.spatial_index.build(dict(zip(LISTING_COLUMNS, row)) for row in rows)
+        self._search_source_version += 1
+        logger.info(f"Built spatial index over {len(rows)} hospitals in {time.time() - start_time:.2f} seconds")
+
+    def add_change_listener(self, listener):
+        """Register ``listener(hospital_ids, locations, kind)``, called after hospitals change."""
+        self._change_listeners.append(listener)
+
+    def apply_hospital_changes(self, hospital_ids, kind=None):
+        """
+        Reload changed hospitals into the spatial index and notify listeners.
+
+        Fed by the hospital_changes LISTEN/NOTIFY channel; ``hospital_ids=None``
+        means anything may have changed.
+        """
+        if hospital_ids is None:
+            if self.spatial_index.is_built:
+                self.refresh_spatial_index()
+            for listener in self._change_listeners:
+                listener(None, None, kind)
+            return
+
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT {LISTING_SELECT} FROM hospitals WHERE id = ANY(%s)", (list(hospital_ids),))
+                rows = {row[0]: dict(zip(LISTING_COLUMNS, row)) for row in cursor.fetchall()}
+
+        locations = []
+        for hospital_id in hospital_ids:
+            previous = self.spatial_index.get(hospital_id)
+            current = rows.get(hospital_id)
+            for record in (previous, current):
+                if record is not None and record['latitude'] is not None and record['longitude'] is not None:
+                    locations.append((record['latitude'], record['longitude']))
+            if current is None:
+                self.spatial_index.remove(hospital_id)
+            else:
+                self.spatial_index.upsert(current)
+        if kind != 'wait_time':
+            self._search_source_version += 1
+
+        for listener in self._change_listeners:
+            listener(hospital_ids, locations, kind)
+
+    def get_spatial_index(self):
+        index = self.spatial_index
+        is_stale = not index.is_built or time.monotonic() - index.built_at > SPATIAL_INDEX_TTL
+        if is_stale:
+            # Only one request thread rebuilds; the others keep serving the previous snapshot
+            if self._spatial_index_lock.acquire(blocking=not index.is_built):
+                try:
+                    if not index.is_built or time.monotonic() - index.built_at > SPATIAL_INDEX_TTL:
+                        self.refresh_spatial_index()
+                finally:
+                    self._spatial_index_lock.release()
+        return index
+
+    def get_hospitals_paginated(self, page=1, per_page=50, search_term=None, lat=0, lon=0, radius=0, cursor=None, count=None,
+                                max_wait=None, sort='name', bbox=None):
+        """
+        Return one page of hospitals ordered by ``(facility_name, id)``, or by
+        ``(wait minutes, id)`` with ``sort='wait'`` (unknown waits last).
+
+        Pass the previous response's ``next_cursor`` as ``cursor`` for keyset
+        pagination, which costs the same on every page; ``page`` (OFFSET) is
+        still accepted for older clients. ``count`` is ``'exact'``,
+        ``'estimate'`` (planner row estimate) or ``'none'``, and defaults to
+        ``'exact'`` only for offset pagination. ``max_wait`` keeps hospitals
+        whose current wait is at most that many minutes.
+
+        ``bbox`` is a ``(south, west, north, east)`` viewport and takes
+        precedence over ``lat``/``lon``/``radius`` (km); both are answered
+        from the in-memory spatial index.
+        """
+        if count is None:
+            count = 'exact' if cursor is None else 'none'
+        if count not in COUNT_MODES:
+            raise ValueError(f"Invalid count mode: {count}")
+        if sort not in SORT_MODES:
+            raise ValueError(f"Invalid sort: {sort}")
+        after = decode_cursor(cursor, sort) if cursor else None
+
+        if bbox is not None:
+            matches = self.get_spatial_index().query_bbox(*bbox)
+            return self._page_from_index(matches, page, per_page, search_term, after, count, max_wait, sort,
+                                         ('spatial_index.query_bbox', bbox))
+        if lat and lon and radius:
+            matches = [record for _, record in self.get_spatial_index().query_radius(lat, lon, radius)]
+            return self._page_from_index(matches, page, per_page, search_term, after, count, max_wait, sort,
+                                         ('spatial_index.query_radius', (lat, lon, radius)))
+
+        conditions = []
+        params = []
+        if search_term:
+            search_pattern = f'%{search_term}%'
+            conditions.append("(facility_name ILIKE %s OR address ILIKE %s)")
+            params.extend([search_pattern, search_pattern])
+        if max_wait is not None:
+            conditions.append("wait_minutes <= %s")
+            params.append(max_wait)
+        filter_conditions = list(conditions)
+        filter_params = list(params)
+
+        sort_expression = f"COALESCE(wait_minutes, {UNKNOWN_WAIT_SORT_KEY})" if sort == 'wait' else "facility_name"
+        offset = 0
+        if after is not None:
+            conditions.append(f"({sort_expression}, id) > (%s, %s)")
+            params.extend(after)
+        else:
+            offset = (page - 1) * per_page
+
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT {LISTING_SELECT}
             FROM hospitals
-            WHERE (%s IS NULL OR facility_name ILIKE %s OR address ILIKE %s)
-            AND (
-                %s = 0 OR %s = 0 OR %s = 0 OR
-                (
-                    6371 * acos(
-                        cos(radians(%s)) * cos(radians(latitude)) *
-                        cos(radians(longitude) - radians(%s)) +
-                        sin(radians(%s)) * sin(radians(latitude))
-                    )
-                ) <= %s
-            )
-            ORDER BY facility_name
+            {where_clause}
+            ORDER BY {sort_expression}, id
             LIMIT %s OFFSET %s
         """
-        count_query = """
-            SELECT COUNT(*) FROM hospitals
-            WHERE (%s IS NULL OR facility_name ILIKE %s OR address ILIKE %s)
-            AND (
-                %s = 0 OR %s = 0 OR %s = 0 OR
-                (
-                    6371 * acos(
-                        cos(radians(%s)) * cos(radians(latitude)) *
-                        cos(radians(longitude) - radians(%s)) +
-                        sin(radians(%s)) * sin(radians(latitude))
-                    )
-                ) <= %s
-            )
+        # One extra row tells us whether there is a next page without counting
+        query_params = tuple(params) + (per_page + 1, offset)
+
+        with self.get_db_connection() as conn:
+            with conn.cursor() as db_cursor:
+                db_cursor.execute(query, query_params)
+                rows = db_cursor.fetchall()
+                total_count = self._count_hospitals(db_cursor, filter_conditions, filter_params, count)
+
+        hospitals = [dict(zip(LISTING_COLUMNS, row)) for row in rows[:per_page]]
+
+        debug_info = {
+            'query': query,
+            'params': query_params
+        }
+
+        return self._build_page(hospitals, total_count, page, per_page, len(rows) > per_page, sort), debug_info
+
+    def _count_hospitals(self, cursor, conditions, params, count):
+        if count == 'none':
+            return None
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if count == 'exact':
+            cursor.execute(f"SELECT COUNT(*) FROM hospitals {where_clause}", params)
+            return cursor.fetchone()[0]
+
+        cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM hospitals {where_clause}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def _page_from_index(self, matches, page, per_page, search_term, after, count, max_wait, sort, query):
+        if search_term:
+            term = search_term.lower()
+            matches = [
+                record for record in matches
+                if term in (record['facility_name'] or '').lower() or term in (record['address'] or '').lower()
+            ]
+        if max_wait is not None:
+            matches = [record for record in matches if record['wait_time'] is not None and record['wait_time'] <= max_wait]
+
+        matches.sort(key=lambda record: listing_sort_key(record, sort))
+        if after is not None:
+            offset = bisect.bisect_right([listing_sort_key(record, sort) for record in matches], after)
+        else:
+            offset = (page - 1) * per_page
+        page_records = [dict(record) for record in matches[offset:offset + per_page]]
+
+        query_name, region = query
+        debug_info = {
+            'query': query_name,
+            'params': (search_term, region, max_wait, sort, per_page, offset)
+        }
+
+        # The region is already fully materialized, so an exact count costs nothing extra
+        total_count = None if count == 'none' else len(matches)
+        return self._build_page(page_records, total_count, page, per_page, offset + per_page < len(matches), sort), debug_info
+
+    def _current(self, derived):
+        """Rebuild ``derived`` (clusters) from the spatial index if the index has changed since."""
+        index = self.get_spatial_index()
+        if derived.version != index.version:
+            with self._derived_index_lock:
+                if derived.version != index.version:
+                    version, records = index.snapshot()
+                    derived.build(records, version)
+        return derived
+
+    def get_clusters(self, bbox, zoom):
+        """
+        Pre-aggregated hospital clusters for a ``(south, west, north, east)``
+        viewport at a map zoom level. The hierarchy is rebuilt only after the
+        spatial index changes, by the first request to see the change.
+        """
+        clusters = self._current(self.cluster_hierarchy).query(bbox, zoom)
+        return {
+            'zoom': zoom,
+            'bbox': bbox,
+            'total_count': sum(cluster['count'] for cluster in clusters),
+            'clusters': clusters
+        }
+
+    def _current_search_index(self):
+        """
+        The search index, rebuilt only when names or addresses may have changed.
+
+        The first build happens on the requesting thread; later rebuilds run
+        in a background thread while requests keep searching the previous index.
+        """
+        search_index = self.search_index
+        if search_index.version is None:
+            with self._search_index_lock:
+                if search_index.version is None:
+                    self._build_search_index()
+        elif search_index.version != self._search_source_version and self._search_index_lock.acquire(blocking=False):
+            def rebuild():
+                try:
+                    self._build_search_index()
+                except Exception as e:
+                    logger.error(f"Failed to rebuild search index: {e}")
+                finally:
+                    self._search_index_lock.release()
+
+            threading.Thread(target=rebuild, daemon=True).start()
+        return search_index
+
+    def _build_search_index(self):
+        index = self.get_spatial_index()
+        # Read before the snapshot, so a change made during the build triggers another one
+        version = self._search_source_version
+        _, records = index.snapshot()
+        self.search_index.build(records, version)
+
+    def autocomplete_hospitals(self, query, limit=10):
+        """Ranked, typo-tolerant suggestions for a partial hospital name, address, city or ZIP."""
+        matches = self._current_search_index().search(query, limit)
+        suggestions = []
+        for score, record in matches:
+            # Wait times change between rebuilds, so they come from the live index
+            live = self.spatial_index.get(record['id']) or record
+            suggestions.append({
+                'id': record['id'],
+                'facility_name': record['facility_name'],
+                'address': record['address'],
+                'city': record['city'],
+                'state': record['state'],
+                'zip_code': record['zip_code'],
+                'latitude': record['latitude'],
+                'longitude': record['longitude'],
+                'wait_time': live['wait_time'],
+                'score': score
+            })
+        return {'query': query, 'suggestions': suggestions}
+
+    def get_hospital_changes(self, since=None, limit=CHANGE_FEED_PAGE_SIZE):
+        """
+        Hospitals changed or deleted after change version ``since``, oldest first.
+
+        Returns at most ``limit`` changes; pass the returned ``version`` as the
+        next ``since`` (while ``has_more``) to continue. Without ``since``
+        only the current version is returned, as a starting point for a
+        client that has just loaded its data.
         """
-        search_pattern = f'%{search_term}%' if search_term else None
-        
-        params = (search_term, search_pattern, search_pattern, lat, lon, radius, lat, lon, lat, radius)
-        count_params = params
-        query_params = params + (per_page, offset)
-        
         with self.get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(count_query, count_params)
-                total_count = cursor.fetchone()[0]
-                
-                cursor.execute(query, query_params)
-                hospitals = cursor.fetchall()
-        
-        result = {
-            'hospitals': []
+                if since is None:
+                    cursor.execute("""
+                        SELECT GREATEST(
+                            (SELECT MAX(change_version) FROM hospitals),
+                            (SELECT MAX(change_version) FROM hospital_tombstones)
+                        )
+                    """)
+                    return {'since': None, 'version': cursor.fetchone()[0] or 0, 'has_more': False, 'changed': [], 'deleted': []}
+
+                # One statement, so both tables are read from the same snapshot. Read separately,
+                # a sync committing in between could show its tombstones without its upserts,
+                # whose lower versions the client would then skip.
+                tombstone_columns = ', '.join(['hospital_id'] + ['NULL'] * (len(LISTING_COLUMNS) - 1))
+                cursor.execute(f"""
+                    SELECT * FROM (
+                        (SELECT FALSE AS deleted, change_version, {LISTING_SELECT}
+                         FROM hospitals
+                         WHERE change_version > %s
+                         ORDER BY change_version
+                         LIMIT %s)
+                        UNION ALL
+                        (SELECT TRUE, change_version, {tombstone_columns}
+                         FROM hospital_tombstones
+                         WHERE change_version > %s
+                         ORDER BY change_version
+                         LIMIT %s)
+                    ) changes
+                    ORDER BY change_version
+                    LIMIT %s
+                """, (since, limit + 1, since, limit + 1, limit + 1))
+                rows = cursor.fetchall()
+
+        page = rows[:limit]
+        return {
+            'since': since,
+            'version': page[-1][1] if page else since,
+            'has_more': len(rows) > limit,
+            'changed': [dict(zip(LISTING_COLUMNS, row[2:])) for row in page if not row[0]],
+            'deleted': [row[2] for row in page if row[0]]
         }
 
-        for hospital in hospitals:
-            hospital_dict = dict(zip(['id', 'facility_name', 'address', 'city', 'state', 'zip_code', 'latitude', 'longitude', 'wait_time', 'has_live_wait_time', 'has_wait_time_data'], hospital))
-            
-            # Sanitize wait_time
-            if hospital_dict['wait_time'] in ['Hospital address not found', 'N/A', None, '']:
-                hospital_dict['wait_time'] = None
-            else:
-                try:
-                    hospital_dict['wait_time'] = int(hospital_dict['wait_time'])
-                except ValueError:
-                    hospital_dict['wait_time'] = None
+    def get_wait_time_profile(self, hospital_id, utc_offset_minutes=0):
+        """Typical wait per local day of week and hour, read from the wait_time_profiles rollup."""
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT day_of_week, hour, sample_count, total_minutes, min_minutes, max_minutes
+                    FROM wait_time_profiles
+                    WHERE hospital_id = %s
+                """, (hospital_id,))
+                rows = cursor.fetchall()
+
+        buckets = build_wait_profile(rows, utc_offset_minutes)
+        return {
+            'hospital_id': hospital_id,
+            'utc_offset_minutes': utc_offset_minutes,
+            'total_samples': sum(bucket['samples'] for bucket in buckets),
+            'buckets': buckets
+        }
 
-            result['hospitals'].append(hospital_dict)
+    def get_wait_time_forecast(self, hospital_id):
+        """Precomputed hourly forecasts for the hours that haven't started yet."""
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT target_hour, predicted_minutes, lower_minutes, upper_minutes, generated_at
+                    FROM wait_time_forecasts
+                    WHERE hospital_id = %s AND target_hour >= date_trunc('hour', NOW())
+                    ORDER BY target_hour
+                """, (hospital_id,))
+                rows = cursor.fetchall()
 
-        result.update({
+        return {
+            'hospital_id': hospital_id,
+            'generated_at': rows[0][4].isoformat() if rows else None,
+            'forecasts': [
+                {
+                    'target_hour': target_hour.isoformat(),
+                    'predicted_minutes': round(predicted_minutes),
+                    'lower_minutes': round(lower_minutes),
+                    'upper_minutes': round(upper_minutes)
+                }
+                for target_hour, predicted_minutes, lower_minutes, upper_minutes, _ in rows
+            ]
+        }
+
+    def get_extraction_cache_stats(self):
+        """Hits and misses of the scraper's extraction cache (see page_fingerprint.py), per network and overall."""
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT network_name, hits, misses, extracted_at, last_checked_at
+                    FROM page_extractions
+                    ORDER BY network_name
+                """)
+                rows = cursor.fetchall()
+
+        hits = sum(row[1] for row in rows)
+        misses = sum(row[2] for row in rows)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            'networks': [
+                {
+                    'network_name': network_name,
+                    'hits': network_hits,
+                    'misses': network_misses,
+                    'extracted_at': extracted_at.isoformat(),
+                    'last_checked_at': last_checked_at.isoformat()
+                }
+                for network_name, network_hits, network_misses, extracted_at, last_checked_at in rows
+            ]
+        }
+
+    def get_nearest_hospitals(self, lat, lon, k=10, rank='distance'):
+        """
+        Return the ``k`` closest hospitals to a point, nearest first.
+
+        With ``rank='combined'`` hospitals are ordered by estimated driving time
+        plus current wait time instead; hospitals without wait time data are
+        charged NEAREST_UNKNOWN_WAIT_MINUTES.
+        """
+        index = self.get_spatial_index()
+        minutes_per_km = 60 / (NEAREST_AVERAGE_SPEED_MPH * KM_PER_MILE)
+
+        if rank == 'combined':
+            def score(distance, record):
+                wait_time = record['wait_time']
+                return distance * minutes_per_km + (NEAREST_UNKNOWN_WAIT_MINUTES if wait_time is None else wait_time)
+
+            neighbours = index.nearest(lat, lon, k, score=score, lower_bound=lambda distance: distance * minutes_per_km)
+        elif rank == 'distance':
+            neighbours = index.nearest(lat, lon, k)
+        else:
+            raise ValueError(f"Unknown rank: {rank}")
+
+        hospitals = []
+        for score, distance, record in neighbours:
+            hospital_dict = dict(record)
+            hospital_dict['distance_km'] = round(distance, 3)
+            hospital_dict['distance_miles'] = round(distance / KM_PER_MILE, 3)
+            hospital_dict['travel_minutes'] = round(distance * minutes_per_km, 1)
+            if rank == 'combined':
+                hospital_dict['combined_minutes'] = round(score, 1)
+            hospitals.append(hospital_dict)
+
+        return {
+            'hospitals': hospitals,
+            'rank': rank,
+            'k': k
+        }
+
+    def _build_page(self, hospitals, total_count, page, per_page, has_more, sort='name'):
+        last = hospitals[-1] if hospitals else None
+        return {
+            'hospitals': hospitals,
             'total_count': total_count,
             'page': page,
             'per_page': per_page,
-            'total_pages': (total_count + per_page - 1) // per_page
-        })
-        
-        debug_info = {
-            'query': query,
-            'params': query_params
+            'total_pages': (total_count + per_page - 1) // per_page if total_count is not None else None,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(*listing_sort_key(last, sort)) if has_more else None
         }
-        
-        return result, debug_info
 
 hospital_data_service = HospitalDataService()
\ No newline at end of file
@@ -1,33 +1,37 @@
+import argparse
 import asyncio
 import aiohttp
 import time
 import numpy as np
 import cv2
 import base64
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import asyncpg
 from contextlib import asynccontextmanager
 from logger_setup import logger
 from dotenv import load_dotenv
 import json
-import os
-from datetime import datetime, timezone
-from helpers.config import OPENAI_API_KEY, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
-from hospital_data_service import hospital_data_service
-from tasks import sync_cms_data_task
+from datetime import datetime, timedelta, timezone
+from helpers.config import OPENAI_API_KEY, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, SCRAPER_PAGE_TIMEOUT, CMS_SYNC_INTERVAL, HOSPITALS_RELOAD_INTERVAL, FORECAST_REFRESH_INTERVAL
+from hospital_data_service import hospital_data_service, normalize_wait_time
+from geocoding import geocoder
+from scraper_pool import BrowserPool, wait_until_ready, scroll_to
+from scrape_scheduler import ScrapeScheduler
+from page_fingerprint import ExtractionCache, PAGE_TEXT_SCRIPT, text_fingerprint, image_fingerprint
+from extractors import load_extractors, needs_browser, extract_from_dom, extract_from_endpoint
+from hospital_changes import notify_hospital_changes_async, lock_change_versions_async
+from wait_time_history import record_wait_time_observations_async
+from tasks import sync_cms_data_task, refresh_wait_time_forecasts_task
 from background_tasks import run_task_in_background
 import urllib3
-from websocket_events import broadcast_wait_time_update
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 urllib3.disable_warnings(urllib3.exceptions.NotOpenSSLWarning)
 
 load_dotenv()
 
+# Unchanged pages reuse their last extraction instead of another vision-model call
+extraction_cache = ExtractionCache()
+
 @asynccontextmanager
 async def get_db_pool():
     pool = await asyncpg.create_pool(
@@ -104,8 +108,7 @@ async def capture_full_page_screenshot(driver):
     
     stitched_image = None
     for y in range(0, total_height, viewport_height):
-        await asyncio.to_thread(driver.execute_script, f"window.scrollTo(0, {y});")
-        await asyncio.sleep(1)
+        await asyncio.to_thread(scroll_to, driver, y)
         screenshot = await asyncio.to_thread(driver.get_screenshot_as_png)
         np_image = np.frombuffer(screenshot, np.uint8)
         img = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
@@ -127,20 +130,25 @@ def encode_image(image):
     _, buffer = cv2.imencode('.png', image)
     return base64.b64encode(buffer).decode('utf-8')
 
-async def parse_extracted_data(extracted_data, network_name):
+async def parse_extracted_data(extracted_data, network_name, known_names=()):
+    # Accepts the vision model's JSON text or an already-parsed dict from a structured extractor
     extracted_hospitals = []
     try:
-        if extracted_data.startswith("```json"):
-            extracted_data = extracted_data[7:]
-        if extracted_data.endswith("```"):
-            extracted_data = extracted_data[:-3]
+        if isinstance(extracted_data, dict):
+            data = extracted_data
+        else:
+            if extracted_data.startswith("```json"):
+                extracted_data = extracted_data[7:]
+            if extracted_data.endswith("```"):
+                extracted_data = extracted_data[:-3]
+            data = json.loads(extracted_data)
 
-        data = json.loads(extracted_data)
         hospitals = data.get("hospitals", [])
         for hospital in hospitals:
             hospital_name = hospital.get("hospital_name", "").strip()
             hospital_address = hospital.get("address", "").strip()
-            if hospital_address == "Hospital address not found" or not hospital_address[-3:].isdigit():
+            # Hospitals already in the match cache don't need their address looked up
+            if hospital_name not in known_names and (hospital_address == "Hospital address not found" or not hospital_address[-3:].isdigit()):
                 new_address = await hospital_search(hospital_name, network_name)
                 if new_address != "Address not found":
                     hospital_address = new_address
@@ -159,95 +167,220 @@ async def parse_extracted_data(extracted_data, network_name):
     return extracted_hospitals
 
 async def hospital_search(hospital_name, network_name=""):
-    api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-    base_url = "https://maps.googleapis.com/maps/api/geocode/json"
-    
-    params = {
-        "address": f"{network_name} {hospital_name}",
-        "key": api_key
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(base_url, params=params) as response:
-            data = await response.json()
-    
-    if data["status"] == "OK":
-        address = data["results"][0]["formatted_address"]
-        return address
+    result = await geocoder.geocode(f"{network_name} {hospital_name}")
+    if result is not None and result.formatted_address:
+        return result.formatted_address
     else:
         return "Address not found"
 
-async def process_hospital_page(url, hospital_name, hospital_num, driver, database_hospitals, pool):
+async def extract_from_screenshot(driver, url, hospital_name, hospital_num, pool):
+    """
+    Vision-model extraction of the loaded page. Returns ``(extracted_data,
+    fingerprint)``; ``fingerprint`` is None when the cached extraction was
+    reused, otherwise the ``(text_hash, image_hash)`` to store it under.
+    """
+    img = await capture_full_page_screenshot(driver)
+    logger.info(f"Captured full-page screenshot for URL: {url}")
+
+    page_text = await asyncio.to_thread(driver.execute_script, PAGE_TEXT_SCRIPT)
+    text_hash = text_fingerprint(page_text)
+    image_hash = image_fingerprint(img)
+
+    async with pool.acquire() as conn:
+        extracted_data = await extraction_cache.lookup(conn, hospital_name, text_hash, image_hash)
+    if extracted_data is not None:
+        return extracted_data, None
+
+    base64_image = encode_image(img)
+    logger.info("Encoded screenshot to base64")
+
+    extracted_data = await get_wait_times_from_image(OPENAI_API_KEY, base64_image, hospital_name, hospital_num, detail='high')
+    logger.info("Extracted wait times from image")
+    return extracted_data, (text_hash, image_hash)
+
+async def try_structured_extraction(extractor, hospital_name, hospital_num, driver=None):
+    # Returns the extracted dict, or None so the caller falls back to the screenshot path
+    start_time = time.monotonic()
+    try:
+        if needs_browser(extractor):
+            extracted_data = await asyncio.to_thread(extract_from_dom, driver, extractor, hospital_num)
+        else:
+            extracted_data = await extract_from_endpoint(extractor, hospital_num)
+    except Exception as e:
+        logger.warning(f"Structured extraction failed for {hospital_name}, falling back to screenshot: {e}")
+        return None
+    logger.info(f"Extracted {len(extracted_data['hospitals'])} hospitals for {hospital_name} with the "
+                f"{extractor['type']} extractor in {time.monotonic() - start_time:.2f} seconds")
+    return extracted_data
+
+async def process_hospital_page(url, hospital_name, hospital_num, driver, database_hospitals, pool, extractor=None):
+    # Returns how many hospitals' waits changed, or None when the page couldn't be scraped
     logger.info(f"Processing network: {hospital_name}, URL: {url}")
     try:
-        await asyncio.to_thread(driver.get, url)
-        logger.info(f"Loaded URL: {url}")
-        
-        # Wait for the page to load
-        try:
-            await asyncio.to_thread(
-                WebDriverWait(driver, 10).until,
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-        except Exception as e:
-            logger.error(f"Timeout waiting for page to load: {url}")
-            return
-
-        await asyncio.sleep(5)
-
-        img = await capture_full_page_screenshot(driver)
-        logger.info(f"Captured full-page screenshot for URL: {url}")
-
-        base64_image = encode_image(img)
-        logger.info("Encoded screenshot to base64")
-
-        extracted_data = await get_wait_times_from_image(OPENAI_API_KEY, base64_image, hospital_name, hospital_num, detail='high')
-        logger.info("Extracted wait times from image")
+        extracted_data = None
+        fingerprint = None
+        # JSON endpoints don't need the page at all
+        if extractor is not None and not needs_browser(extractor):
+            extracted_data = await try_structured_extraction(extractor, hospital_name, hospital_num)
+
+        if extracted_data is None:
+            await asyncio.to_thread(driver.get, url)
+            logger.info(f"Loaded URL: {url}")
+
+            # Wait for the page to load and for late-rendered widgets to settle
+            try:
+                await asyncio.to_thread(wait_until_ready, driver, SCRAPER_PAGE_TIMEOUT)
+            except Exception as e:
+                logger.error(f"Timeout waiting for page to load: {url}")
+                return None
+
+            if extractor is not None and needs_browser(extractor):
+                extracted_data = await try_structured_extraction(extractor, hospital_name, hospital_num, driver)
+
+        if extracted_data is None:
+            extracted_data, fingerprint = await extract_from_screenshot(driver, url, hospital_name, hospital_num, pool)
         logger.debug(f"Extracted data for {hospital_name}: {extracted_data}")
 
-        extracted_hospitals = await parse_extracted_data(extracted_data, hospital_name)
+        async with pool.acquire() as conn:
+            cached_matches = await get_cached_matches(conn, hospital_name)
+
+        extracted_hospitals = await parse_extracted_data(extracted_data, hospital_name, known_names=cached_matches.keys())
 
         if not extracted_hospitals:
             logger.warning(f"No wait times extracted for URL: {url}")
-            return
-
-        logger.info(f"Matching extracted hospitals with database for network: {hospital_name}")
-        matched_pairs = await asyncio.to_thread(
-            hospital_data_service.match_hospitals_from_screenshot,
-            extracted_hospitals,
-            database_hospitals,
-            hospital_name
-        )
+            return None
+
+        if fingerprint is not None:
+            # Only vision extractions that parsed are worth reusing
+            async with pool.acquire() as conn:
+                await extraction_cache.store(conn, hospital_name, *fingerprint, extracted_data)
+
+        hospitals_by_id = {db_hospital['id']: db_hospital for db_hospital in database_hospitals}
+        matched_pairs = []
+        unmatched_hospitals = []
+        for extracted_hospital in extracted_hospitals:
+            cached = cached_matches.get(extracted_hospital['hospital_name'])
+            if cached and cached['hospital_id'] in hospitals_by_id:
+                matched_pairs.append({
+                    'extracted': extracted_hospital,
+                    'matched': hospitals_by_id[cached['hospital_id']],
+                    'score': cached['score']
+                })
+            else:
+                unmatched_hospitals.append(extracted_hospital)
+        logger.info(f"Match cache hits for {hospital_name}: {len(matched_pairs)}/{len(extracted_hospitals)}")
+
+        new_pairs = []
+        if unmatched_hospitals:
+            coordinates = await geocoder.geocode_many([
+                ([f"{h['hospital_name'].lower()}, {h['address'].lower()}"], None) for h in unmatched_hospitals
+            ])
+            for extracted_hospital, result in zip(unmatched_hospitals, coordinates):
+                extracted_hospital['coordinates'] = (result.latitude, result.longitude) if result else None
+
+            logger.info(f"Matching extracted hospitals with database for network: {hospital_name}")
+            new_pairs = await asyncio.to_thread(
+                hospital_data_service.match_hospitals_from_screenshot,
+                unmatched_hospitals,
+                database_hospitals,
+                hospital_name,
+                {pair['matched']['id'] for pair in matched_pairs}
+            )
+            matched_pairs.extend(new_pairs)
+
+        updates = []
+        for pair in matched_pairs:
+            extracted_hospital = pair['extracted']
+            matched_hospital = pair['matched']
+            match_score = pair['score']
+            logger.info(f"Matched {extracted_hospital['hospital_name']} to {matched_hospital['facility_name']} with score {match_score}")
+            updates.append((matched_hospital['id'], extracted_hospital['wait_time']))
 
         async with pool.acquire() as conn:
-            for pair in matched_pairs:
-                extracted_hospital = pair['extracted']
-                matched_hospital = pair['matched']
-                match_score = pair['score']
-                logger.info(f"Matched {extracted_hospital['hospital_name']} to {matched_hospital['facility_name']} with score {match_score}")
-                await update_wait_times(conn, matched_hospital['id'], extracted_hospital['wait_time'])
+            await save_cached_matches(conn, hospital_name, new_pairs)
+            try:
+                changed = await apply_wait_time_updates(conn, updates, datetime.now(timezone.utc))
+            except Exception as e:
+                logger.error(f"Error updating wait times for network {hospital_name}: {e}")
+                return None
 
         logger.info(f"Completed processing for network: {hospital_name}")
+        return len(changed)
 
     except Exception as e:
         logger.error(f"Error processing URL {url}: {str(e)}", exc_info=True)
-
-async def update_wait_times(conn, hospital_id, wait_time):
+        return None
+
+async def get_cached_matches(conn, network_name):
+    rows = await conn.fetch("""
+        SELECT extracted_name, hospital_id, score
+        FROM hospital_match_cache
+        WHERE network_name = $1
+    """, network_name)
+    return {row['extracted_name']: {'hospital_id': row['hospital_id'], 'score': row['score']} for row in rows}
+
+async def save_cached_matches(conn, network_name, matched_pairs):
+    if not matched_pairs:
+        return
     try:
-        await conn.execute("""
-            UPDATE hospitals
-            SET wait_time = $1,
-                has_wait_time_data = TRUE,
+        await conn.executemany("""
+            INSERT INTO hospital_match_cache (network_name, extracted_name, hospital_id, score, matched_at)
+            VALUES ($1, $2, $3, $4, NOW())
+            ON CONFLICT (network_name, extracted_name) DO UPDATE SET
+                hospital_id = EXCLUDED.hospital_id,
+                score = EXCLUDED.score,
+                matched_at = EXCLUDED.matched_at
+        """, [
+            (network_name, pair['extracted']['hospital_name'], pair['matched']['id'], pair['score'])
+            for pair in matched_pairs
+        ])
+        logger.info(f"Cached {len(matched_pairs)} matches for network: {network_name}")
+    except Exception as e:
+        logger.error(f"Error caching matches for network {network_name}: {e}")
+
+async def apply_wait_time_updates(conn, updates, observed_at):
+    """
+    Write a network's ``(hospital_id, wait_time)`` results in one statement.
+
+    Rows whose wait didn't change are skipped; every result is still kept as
+    an observation in the wait time history. Returns the changed
+    ``(id, wait_minutes)`` rows.
+    """
+    # Later results for the same hospital win
+    normalized = {hospital_id: normalize_wait_time(wait_time) for hospital_id, wait_time in updates}
+    if not normalized:
+        return []
+    hospital_ids = list(normalized)
+    wait_minutes = [normalized[hospital_id][0] for hospital_id in hospital_ids]
+    wait_statuses = [normalized[hospital_id][1] for hospital_id in hospital_ids]
+
+    async with conn.transaction():
+        await lock_change_versions_async(conn)
+        changed = await conn.fetch("""
+            UPDATE hospitals h
+            SET wait_time = u.wait_minutes,
+                wait_minutes = u.wait_minutes,
+                wait_status = u.wait_status::wait_time_status,
+                has_wait_time_data = u.wait_minutes IS NOT NULL,
                 has_live_wait_time = TRUE,
+                change_version = nextval('hospital_change_seq'),
                 last_updated = NOW()
-            WHERE id = $2
-        """, wait_time, hospital_id)
-        logger.info(f"Updated wait time for hospital {hospital_id}")
-        
-        # Call the broadcast function
-        await broadcast_wait_time_update(hospital_id, wait_time, True)
-    except Exception as e:
-        logger.error(f"Error updating wait time for hospital {hospital_id}: {e}")
+            FROM UNNEST($1::integer[], $2::integer[], $3::text[]) AS u(hospital_id, wait_minutes, wait_status)
+            WHERE h.id = u.hospital_id
+              AND (h.wait_minutes IS DISTINCT FROM u.wait_minutes
+                   OR h.wait_status IS DISTINCT FROM u.wait_status::wait_time_status
+                   OR NOT h.has_live_wait_time)
+            RETURNING h.id, h.wait_minutes
+        """, hospital_ids, wait_minutes, wait_statuses)
+
+        await record_wait_time_observations_async(
+            conn, [(hospital_id, minutes, observed_at) for hospital_id, minutes in zip(hospital_ids, wait_minutes)]
+        )
+        # The API relays this as a single wait_time_updates socket event
+        await notify_hospital_changes_async(conn, [row['id'] for row in changed], 'wait_time')
+
+    logger.info(f"Updated wait times for {len(changed)} of {len(hospital_ids)} hospitals ({len(hospital_ids) - len(changed)} unchanged)")
+    return changed
 
 async def get_last_run_time(conn):
     row = await conn.fetchrow("SELECT last_run FROM script_metadata WHERE script_name = 'main_script'")
@@ -267,10 +400,28 @@ async def update_last_run_time(conn):
         ON CONFLICT (script_name) DO UPDATE SET last_run = EXCLUDED.last_run
     """, current_time)
 
-async def main():
+async def load_database_hospitals(pool):
+    async with pool.acquire() as conn:
+        database_hospitals = await conn.fetch("""
+            SELECT id, facility_id, facility_name, address, city, state, zip_code, latitude, longitude
+            FROM hospitals
+        """)
+    logger.info(f"Fetched {len(database_hospitals)} hospitals from database for matching")
+    return database_hospitals
+
+async def run_cms_sync_if_due(pool):
+    async with pool.acquire() as conn:
+        last_run_time = await get_last_run_time(conn)
+        if datetime.now(timezone.utc) - last_run_time < timedelta(seconds=CMS_SYNC_INTERVAL):
+            return False
+        logger.info(f"Last CMS sync: {last_run_time}; starting CMS data sync task")
+        await asyncio.to_thread(run_task_in_background, sync_cms_data_task, last_run_time)
+        await update_last_run_time(conn)
+    return True
+
+async def main(once=False):
     logger.info("Starting main process")
     
-    driver = None
     try:
         async with get_db_pool() as pool:
             async with pool.acquire() as conn:
@@ -298,42 +449,52 @@ async def main():
                 except Exception as e:
                     logger.error(f"Error populating hospital pages: {e}")
 
-                last_run_time = await get_last_run_time(conn)
-                logger.info(f"Last successful run: {last_run_time}")
-
-                # Run CMS data sync task
-                logger.info("Starting CMS data sync task")
-                await asyncio.to_thread(run_task_in_background, sync_cms_data_task, last_run_time)
-
-                # Fetch all database hospitals for later matching
-                database_hospitals = await conn.fetch("""
-                    SELECT id, facility_id, facility_name, address, city, state, zip_code, latitude, longitude
-                    FROM hospitals
-                """)
-                logger.info(f"Fetched {len(database_hospitals)} hospitals from database for matching")
-
-                # Initialize WebDriver
-                logger.info("Initializing WebDriver")
-                chrome_options = Options()
-                chrome_options.add_argument("--headless")
-                chrome_options.add_argument("--no-sandbox")
-                chrome_options.add_argument("--disable-dev-shm-usage")
-                chrome_options.add_argument("--window-size=1920,1080")
-                driver = webdriver.Chrome(options=chrome_options)
-                logger.info("WebDriver initialized successfully")
-
-                # Fetch hospital pages data
-                logger.info("Fetching hospital pages data")
-                rows = await conn.fetch("SELECT url, hospital_name, hospital_num FROM hospital_pages")
-                logger.info(f"Fetched {len(rows)} hospital pages")
-
-                # Process hospital pages concurrently
-                tasks = [process_hospital_page(row['url'], row['hospital_name'], row['hospital_num'], driver, database_hospitals, pool) for row in rows]
-                await asyncio.gather(*tasks)
-
-                logger.info("Updating last run time")
-                await update_last_run_time(conn)
+                if once:
+                    # Treat every page as due right now
+                    await conn.execute("UPDATE hospital_pages SET next_due_at = NOW()")
+
+            await run_cms_sync_if_due(pool)
+
+            # Hospitals for matching, reloaded periodically rather than on every scrape
+            hospitals = {'rows': await load_database_hospitals(pool), 'loaded_at': time.monotonic()}
+            # A batch can be a single page, so the full refit is queued at most once per interval
+            forecasts = {'queued_at': None}
+
+            # Networks listed here skip the screenshot unless their extractor fails
+            extractors = load_extractors()
+
+            async def scrape(page, driver):
+                return await process_hospital_page(
+                    page['url'], page['hospital_name'], page['hospital_num'], driver, hospitals['rows'], pool,
+                    extractors.get(page['hospital_name'])
+                )
+
+            async def after_batch(pages):
+                stats = extraction_cache.stats()
+                logger.info(f"Extraction cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']})")
+
+                # Refit forecasts with the observations recorded since the last refit
+                if forecasts['queued_at'] is None or time.monotonic() - forecasts['queued_at'] >= FORECAST_REFRESH_INTERVAL:
+                    logger.info("Starting wait time forecast task")
+                    await asyncio.to_thread(run_task_in_background, refresh_wait_time_forecasts_task)
+                    forecasts['queued_at'] = time.monotonic()
+
+                await run_cms_sync_if_due(pool)
+                # Picks up CMS changes once the background sync has finished
+                if time.monotonic() - hospitals['loaded_at'] > HOSPITALS_RELOAD_INTERVAL:
+                    hospitals['rows'] = await load_database_hospitals(pool)
+                    hospitals['loaded_at'] = time.monotonic()
+
+            # Each page is scraped on its own adaptive schedule, one isolated browser per worker
+            async with BrowserPool() as browsers:
+                scheduler = ScrapeScheduler(pool, browsers, scrape, on_batch_done=after_batch)
+                if once:
+                    while await scheduler.run_once():
+                        pass
+                else:
+                    await scheduler.run_forever()
 
+            async with pool.acquire() as conn:
                 logger.info("Verifying data insertion")
                 hospital_count = await conn.fetchval("SELECT COUNT(*) FROM hospitals")
                 wait_time_count = await conn.fetchval("SELECT COUNT(*) FROM wait_times")
@@ -347,11 +508,11 @@ async def main():
         raise
 
     finally:
-        if driver:
-            driver.quit()
-            logger.info("Closed WebDriver")
+        await geocoder.close()
 
     logger.info("Main process completed")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Scrape ER wait times on an adaptive per-network schedule")
+    arg_parser.add_argument('--once', action='store_true', help="scrape every network once and exit")
+    asyncio.run(main(once=arg_parser.parse_args().once))
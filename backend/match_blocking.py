@@ -0,0 +1,110 @@
+import re
+from collections import defaultdict
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Words too common in facility names to narrow anything down
+NAME_STOPWORDS = {
+    'hospital', 'hospitals', 'medical', 'center', 'centre', 'health', 'healthcare', 'regional',
+    'memorial', 'community', 'general', 'emergency', 'er', 'the', 'of', 'and', 'at', 'in',
+    'inc', 'llc', 'system', 'campus', 'st', 'saint', 'county', 'university', 'clinic',
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STATE_ZIP_RE = re.compile(r"\b([A-Za-z]{2})\s+(\d{5})(?:-\d{4})?\b")
+ZIP_RE = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+
+
+def name_tokens(name):
+    return {token for token in TOKEN_RE.findall(name.lower()) if token not in NAME_STOPWORDS and len(token) > 1}
+
+
+def parse_state_zip(address):
+    """Pull the two-letter state and five-digit ZIP out of a free-text US address."""
+    match = STATE_ZIP_RE.search(address)
+    if match:
+        return match.group(1).upper(), match.group(2)
+    zips = ZIP_RE.findall(address)
+    return None, (zips[-1] if zips else None)
+
+
+class MatchBlocker:
+    """
+    Candidate generation for matching scraped hospitals to CMS hospitals.
+
+    Instead of scoring every extracted hospital against every database
+    hospital, candidates are drawn from a few cheap blocks: an inverted index
+    of facility name tokens, the ZIP3 prefix and state of the extracted
+    address, and a geographic radius around the extracted coordinates.
+    Distances to all hospitals are computed in one vectorized pass.
+    """
+
+    def __init__(self, database_hospitals, geo_radius_miles=50, max_token_frequency=100):
+        self.source = database_hospitals
+        self.geo_radius_miles = geo_radius_miles
+        self.size = len(database_hospitals)
+
+        self.names = []
+        self.addresses = []
+        self.token_index = defaultdict(list)
+        self.zip3_index = defaultdict(list)
+        self.state_index = defaultdict(list)
+        latitudes = np.full(self.size, np.nan)
+        longitudes = np.full(self.size, np.nan)
+
+        for i, db_hospital in enumerate(database_hospitals):
+            db_name = (db_hospital['facility_name'] or '').lower()
+            self.names.append(db_name)
+            self.addresses.append(f"{db_hospital['address']}, {db_hospital['city']}, {db_hospital['state']} {db_hospital['zip_code']}".lower())
+            for token in name_tokens(db_name):
+                self.token_index[token].append(i)
+            zip_code = (db_hospital['zip_code'] or '').strip()
+            if len(zip_code) >= 3:
+                self.zip3_index[zip_code[:3]].append(i)
+            if db_hospital['state']:
+                self.state_index[db_hospital['state'].upper()].append(i)
+            if db_hospital['latitude'] is not None and db_hospital['longitude'] is not None:
+                latitudes[i] = db_hospital['latitude']
+                longitudes[i] = db_hospital['longitude']
+
+        # Tokens shared by a large share of hospitals behave like stopwords
+        for token in [token for token, ids in self.token_index.items() if len(ids) > max_token_frequency]:
+            del self.token_index[token]
+
+        self.latitudes = np.radians(latitudes)
+        self.longitudes = np.radians(longitudes)
+
+    def distances_miles(self, coords):
+        """Haversine distance in miles from ``coords`` to every hospital (NaN where unknown)."""
+        lat, lon = np.radians(coords[0]), np.radians(coords[1])
+        a = (np.sin((self.latitudes - lat) / 2) ** 2
+             + np.cos(lat) * np.cos(self.latitudes) * np.sin((self.longitudes - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    def candidates(self, extracted_name, extracted_address, coords=None):
+        """Return ``(candidate_indices, distances_miles)`` for one extracted hospital."""
+        state, zip_code = parse_state_zip(extracted_address)
+
+        candidates = set()
+        token_hits = set()
+        for token in name_tokens(extracted_name):
+            token_hits.update(self.token_index.get(token, ()))
+        if state and token_hits:
+            token_hits &= set(self.state_index.get(state, ()))
+        candidates |= token_hits
+        if zip_code:
+            candidates.update(self.zip3_index.get(zip_code[:3], ()))
+
+        distances = None
+        if coords:
+            distances = self.distances_miles(coords)
+            candidates.update(np.flatnonzero(distances <= self.geo_radius_miles).tolist())
+
+        if not candidates:
+            candidates = set(self.state_index.get(state, ())) if state else set(range(self.size))
+
+        indices = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+        if distances is None:
+            return indices, np.full(len(indices), np.nan)
+        return indices, distances[indices]
@@ -0,0 +1,126 @@
+import hashlib
+import re
+import cv2
+import numpy as np
+from helpers.config import EXTRACTION_CACHE_MAX_DISTANCE, EXTRACTION_CACHE_MAX_AGE
+from logger_setup import logger
+
+# Visible text of the page, including same-origin iframes where many wait-time widgets live
+PAGE_TEXT_SCRIPT = """
+    const texts = [document.body ? document.body.innerText : ''];
+    for (const frame of document.querySelectorAll('iframe')) {
+        try {
+            texts.push(frame.contentDocument.body.innerText);
+        } catch (e) {
+            // Cross-origin frames are only covered by the image hash
+        }
+    }
+    return texts.join('\\n');
+"""
+
+
+def text_fingerprint(text):
+    """SHA-256 of the page text with whitespace collapsed, so reflows don't count as changes."""
+    normalized = re.sub(r'\s+', ' ', text or '').strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def image_fingerprint(image, hash_size=16):
+    """
+    Difference hash (dHash) of a BGR screenshot as a hex string.
+
+    The image is shrunk to ``hash_size + 1`` by ``hash_size`` grey pixels and
+    each bit records whether a pixel is brighter than its right neighbour, so
+    the hash survives re-encoding and anti-aliasing but flips when text or
+    layout changes.
+    """
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(grey, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two image fingerprints."""
+    if a is None or b is None or len(a) != len(b):
+        return None
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+class ExtractionCache:
+    """
+    Reuse the last vision-model extraction for a network when its page hasn't changed.
+
+    A page counts as unchanged when its text fingerprint is identical and its
+    screenshot fingerprint is within ``max_distance`` bits of the cached one
+    (text alone misses canvas and cross-origin widgets; the image hash alone is
+    too coarse to see a single digit change). Cached extractions older than
+    ``max_age`` seconds are always refreshed. Hits and misses are counted here
+    for the current process and in page_extractions across runs.
+    """
+
+    def __init__(self, max_distance=EXTRACTION_CACHE_MAX_DISTANCE, max_age=EXTRACTION_CACHE_MAX_AGE):
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    async def lookup(self, conn, network_name, text_hash, image_hash):
+        """Return the cached extraction for an unchanged page, or None."""
+        row = await conn.fetchrow("""
+            SELECT text_hash, image_hash, extracted_data, EXTRACT(EPOCH FROM NOW() - extracted_at) AS age
+            FROM page_extractions
+            WHERE network_name = $1
+        """, network_name)
+
+        reason = None
+        if row is None:
+            reason = "no cached extraction"
+        elif row['age'] > self.max_age:
+            reason = f"cached extraction is {row['age']:.0f}s old"
+        elif row['text_hash'] != text_hash:
+            reason = "page text changed"
+        else:
+            distance = hamming_distance(row['image_hash'], image_hash)
+            if distance is None or distance > self.max_distance:
+                reason = f"screenshot changed ({distance} bits)"
+
+        if reason is None:
+            self.hits += 1
+            await conn.execute(
+                "UPDATE page_extractions SET hits = hits + 1, last_checked_at = NOW() WHERE network_name = $1",
+                network_name
+            )
+            logger.info(f"Page for {network_name} unchanged; reusing cached extraction")
+            return row['extracted_data']
+
+        self.misses += 1
+        # Counted here rather than in store() so extractions that fail still count; a
+        # network without a row yet gets its first miss when store() inserts it
+        if row is not None:
+            await conn.execute(
+                "UPDATE page_extractions SET misses = misses + 1, last_checked_at = NOW() WHERE network_name = $1",
+                network_name
+            )
+        logger.info(f"Extracting {network_name} with the vision model: {reason}")
+        return None
+
+    async def store(self, conn, network_name, text_hash, image_hash, extracted_data):
+        await conn.execute("""
+            INSERT INTO page_extractions (network_name, text_hash, image_hash, extracted_data, extracted_at, last_checked_at, misses)
+            VALUES ($1, $2, $3, $4, NOW(), NOW(), 1)
+            ON CONFLICT (network_name) DO UPDATE SET
+                text_hash = EXCLUDED.text_hash,
+                image_hash = EXCLUDED.image_hash,
+                extracted_data = EXCLUDED.extracted_data,
+                extracted_at = EXCLUDED.extracted_at,
+                last_checked_at = EXCLUDED.last_checked_at
+        """, network_name, text_hash, image_hash, extracted_data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None
+        }
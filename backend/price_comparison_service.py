@@ -1,28 +1,18 @@
-import psycopg2
-from helpers.config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from db import db_pool
 
 def get_price_comparison(zip_code, treatment):
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = conn.cursor()
+        with db_pool.cursor() as cursor:
+            # This is a placeholder query. You'll need to adjust it based on your actual database schema
+            cursor.execute("""
+                SELECT facility_name, price
+                FROM treatment_prices
+                WHERE zip_code = %s AND treatment_name ILIKE %s
+                ORDER BY price ASC
+                LIMIT 5
+            """, (zip_code, f"%{treatment}%"))
 
-        # This is a placeholder query. You'll need to adjust it based on your actual database schema
-        cursor.execute("""
-            SELECT facility_name, price
-            FROM treatment_prices
-            WHERE zip_code = %s AND treatment_name ILIKE %s
-            ORDER BY price ASC
-            LIMIT 5
-        """, (zip_code, f"%{treatment}%"))
-
-        results = cursor.fetchall()
-        conn.close()
+            results = cursor.fetchall()
 
         return [{"facilityName": row[0], "price": row[1]} for row in results]
     except Exception as e:
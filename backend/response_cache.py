@@ -0,0 +1,152 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from spatial_index import haversine_km, KM_PER_DEGREE
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'created_at', 'hospital_ids', 'region', 'wait_sensitive'])
+
+
+class CircleRegion(namedtuple('CircleRegion', ['lat', 'lon', 'radius_km'])):
+    def contains(self, lat, lon):
+        return haversine_km(self.lat, self.lon, lat, lon) <= self.radius_km
+
+
+class BoxRegion(namedtuple('BoxRegion', ['south', 'west', 'north', 'east'])):
+    def contains(self, lat, lon):
+        if not self.south <= lat <= self.north:
+            return False
+        if self.west <= self.east:
+            return self.west <= lon <= self.east
+        return lon >= self.west or lon <= self.east
+
+
+def quantize(value, precision):
+    return round(float(value), precision)
+
+
+def quantize_radius(radius_km, precision):
+    """
+    Round a query radius up to whole kilometres, padded by how far
+    quantizing the centre to ``precision`` can move it, so the padded
+    circle around the rounded centre still covers the requested one.
+    """
+    radius_km = float(radius_km)
+    if radius_km <= 0:
+        return 0.0
+    max_centre_shift_km = 0.5 * 10 ** -precision * KM_PER_DEGREE * math.sqrt(2)
+    return float(math.ceil(radius_km + max_centre_shift_km))
+
+
+def quantize_bbox(bbox, precision):
+    """Snap a ``(south, west, north, east)`` box outward to the grid, so it never shrinks."""
+    scale = 10 ** precision
+    south, west, north, east = bbox
+    return (
+        max(-90.0, round(math.floor(south * scale) / scale, precision)),
+        max(-180.0, round(math.floor(west * scale) / scale, precision)),
+        min(90.0, round(math.ceil(north * scale) / scale, precision)),
+        min(180.0, round(math.ceil(east * scale) / scale, precision))
+    )
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of serialized /api/hospitals responses.
+
+    Each entry remembers the hospitals it contains and the circle or box it
+    was queried for, so a change to a hospital only evicts the entries that
+    listed it or whose region contains its location. Entries without a
+    region (plain name listings) are evicted when CMS data changes, or on
+    any wait time change if they filter or sort by wait time.
+    """
+
+    def __init__(self, max_entries=2048, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_hospital = {}
+        self._metrics = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_etag(body):
+        # Unquoted, as werkzeug's set_etag and If-None-Match parsing expect
+        return hashlib.sha1(body).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._metrics['misses'] += 1
+                return None
+            if time.monotonic() - entry.created_at > self.ttl:
+                self._remove_locked(key)
+                self._metrics['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._metrics['hits'] += 1
+            return entry
+
+    def set(self, key, body, hospital_ids, region=None, wait_sensitive=False):
+        """Store a response body; ``region`` is a CircleRegion or BoxRegion for geo queries."""
+        entry = CacheEntry(body, self.make_etag(body), time.monotonic(), frozenset(hospital_ids), region, wait_sensitive)
+        with self._lock:
+            self._remove_locked(key)
+            self._entries[key] = entry
+            for hospital_id in entry.hospital_ids:
+                self._keys_by_hospital.setdefault(hospital_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove_locked(oldest_key)
+                self._metrics['evictions'] += 1
+        return entry
+
+    def _remove_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for hospital_id in entry.hospital_ids:
+            keys = self._keys_by_hospital.get(hospital_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_hospital[hospital_id]
+
+    def invalidate(self, hospital_ids, locations, kind=None):
+        """
+        Evict entries affected by a change; ``hospital_ids=None`` clears everything.
+
+        ``locations`` are the old and new ``(lat, lon)`` of the changed hospitals.
+        """
+        with self._lock:
+            if hospital_ids is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._keys_by_hospital.clear()
+                self._metrics['invalidations'] += count
+                return count
+
+            stale_keys = set()
+            for hospital_id in hospital_ids:
+                stale_keys.update(self._keys_by_hospital.get(hospital_id, ()))
+
+            for key, entry in self._entries.items():
+                if key in stale_keys:
+                    continue
+                if entry.region is None:
+                    if kind != 'wait_time' or entry.wait_sensitive:
+                        stale_keys.add(key)
+                    continue
+                if any(entry.region.contains(location_lat, location_lon) for location_lat, location_lon in locations):
+                    stale_keys.add(key)
+
+            for key in stale_keys:
+                self._remove_locked(key)
+            self._metrics['invalidations'] += len(stale_keys)
+            return len(stale_keys)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics, entries=len(self._entries), max_entries=self.max_entries, ttl=self.ttl)
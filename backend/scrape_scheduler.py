@@ -0,0 +1,147 @@
+import asyncio
+import random
+import time
+from helpers.config import (
+    SCRAPE_MIN_INTERVAL, SCRAPE_MAX_INTERVAL, SCRAPE_MAX_BACKOFF, SCRAPE_JITTER, SCRAPE_CHANGE_RATE_ALPHA,
+    SCRAPE_LEASE_SECONDS, SCRAPE_BATCH_SIZE, SCRAPE_IDLE_SLEEP
+)
+from logger_setup import logger
+
+
+def jittered(seconds, jitter=SCRAPE_JITTER):
+    """Spread deadlines by +/- ``jitter`` so pages scheduled together drift apart."""
+    return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+
+def next_interval_after_success(change_rate, changed, alpha=SCRAPE_CHANGE_RATE_ALPHA):
+    """
+    Update a page's change rate and derive its refresh interval.
+
+    ``change_rate`` is an exponentially weighted fraction of scrapes that
+    changed at least one wait time. The interval is roughly the expected
+    time between changes, ``SCRAPE_MIN_INTERVAL / change_rate``, clamped to
+    ``[SCRAPE_MIN_INTERVAL, SCRAPE_MAX_INTERVAL]``.
+    """
+    change_rate = (1 - alpha) * change_rate + alpha * (1.0 if changed else 0.0)
+    interval = SCRAPE_MIN_INTERVAL / max(change_rate, SCRAPE_MIN_INTERVAL / SCRAPE_MAX_INTERVAL)
+    return change_rate, int(min(SCRAPE_MAX_INTERVAL, max(SCRAPE_MIN_INTERVAL, interval)))
+
+
+def failure_backoff(consecutive_failures):
+    """Exponential backoff after ``consecutive_failures`` failed scrapes in a row."""
+    return min(SCRAPE_MAX_BACKOFF, SCRAPE_MIN_INTERVAL * 2 ** consecutive_failures)
+
+
+class ScrapeScheduler:
+    """
+    Long-running scheduler for hospital_pages.
+
+    Pages are claimed when their ``next_due_at`` passes (with ``SKIP LOCKED``
+    and a lease, so several schedulers can share the table), scraped through
+    the browser pool, and rescheduled from the outcome: pages whose waits
+    keep changing come back sooner, static ones later, failures back off
+    exponentially. ``scrape_page(page, driver)`` returns the number of
+    hospitals whose wait changed, or None when the scrape failed.
+    """
+
+    def __init__(self, pool, browsers, scrape_page, batch_size=SCRAPE_BATCH_SIZE, on_batch_done=None):
+        self.pool = pool
+        self.browsers = browsers
+        self.scrape_page = scrape_page
+        self.batch_size = batch_size
+        self.on_batch_done = on_batch_done
+        self._stopped = asyncio.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def claim_due_pages(self):
+        async with self.pool.acquire() as conn:
+            return await conn.fetch("""
+                UPDATE hospital_pages
+                SET next_due_at = NOW() + make_interval(secs => $2),
+                    last_attempt_at = NOW()
+                WHERE id IN (
+                    SELECT id FROM hospital_pages
+                    WHERE next_due_at <= NOW()
+                    ORDER BY next_due_at
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, url, hospital_name, hospital_num, refresh_interval_seconds, consecutive_failures, change_rate
+            """, self.batch_size, SCRAPE_LEASE_SECONDS)
+
+    async def record_outcome(self, page, changed_count):
+        if changed_count is None:
+            failures = page['consecutive_failures'] + 1
+            delay = jittered(failure_backoff(failures))
+            query = """
+                UPDATE hospital_pages
+                SET consecutive_failures = $2,
+                    next_due_at = NOW() + make_interval(secs => $3)
+                WHERE id = $1
+            """
+            params = (page['id'], failures, delay)
+            logger.warning(f"Scrape of {page['hospital_name']} failed {failures} time(s) in a row; retrying in {delay:.0f}s")
+        else:
+            change_rate, interval = next_interval_after_success(page['change_rate'], changed_count > 0)
+            delay = jittered(interval)
+            query = """
+                UPDATE hospital_pages
+                SET consecutive_failures = 0,
+                    last_success_at = NOW(),
+                    change_rate = $2,
+                    refresh_interval_seconds = $3,
+                    next_due_at = NOW() + make_interval(secs => $4)
+                WHERE id = $1
+            """
+            params = (page['id'], change_rate, interval, delay)
+            logger.info(f"Next scrape of {page['hospital_name']} in {delay:.0f}s (change rate {change_rate:.2f})")
+
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, *params)
+
+    async def seconds_until_next_due(self):
+        async with self.pool.acquire() as conn:
+            seconds = await conn.fetchval(
+                "SELECT EXTRACT(EPOCH FROM MIN(next_due_at) - NOW()) FROM hospital_pages"
+            )
+        if seconds is None:
+            return SCRAPE_IDLE_SLEEP
+        return min(SCRAPE_IDLE_SLEEP, max(0.0, float(seconds)))
+
+    async def _scrape_and_record(self, page, driver):
+        changed_count = None
+        try:
+            changed_count = await self.scrape_page(page, driver)
+        finally:
+            await self.record_outcome(page, changed_count)
+
+    async def run_once(self):
+        """Scrape every page that is currently due; returns how many were claimed."""
+        pages = await self.claim_due_pages()
+        if not pages:
+            return 0
+        start_time = time.monotonic()
+        await self.browsers.run([(page['url'], page) for page in pages], self._scrape_and_record)
+        logger.info(f"Scraped {len(pages)} due pages in {time.monotonic() - start_time:.1f} seconds")
+        if self.on_batch_done is not None:
+            await self.on_batch_done(pages)
+        return len(pages)
+
+    async def run_forever(self):
+        logger.info("Starting scrape scheduler")
+        while not self._stopped.is_set():
+            try:
+                # Keep draining while pages are due; otherwise sleep until the next deadline
+                if await self.run_once():
+                    continue
+                delay = await self.seconds_until_next_due()
+            except Exception as e:
+                logger.error(f"Scrape scheduler error: {e}", exc_info=True)
+                delay = SCRAPE_IDLE_SLEEP
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        logger.info("Scrape scheduler stopped")
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from helpers.config import SCRAPER_BROWSERS, SCRAPER_PER_HOST_LIMIT, SCRAPER_PAGE_TIMEOUT, SCRAPER_SETTLE_TIMEOUT
+from logger_setup import logger
+
+
+def create_driver():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(SCRAPER_PAGE_TIMEOUT)
+    return driver
+
+
+def wait_until_ready(driver, timeout, settle_timeout=SCRAPER_SETTLE_TIMEOUT, poll_interval=0.25):
+    """
+    Block until the page has loaded and stopped growing.
+
+    Waits for ``document.readyState == 'complete'``, then until the document
+    height is unchanged for two consecutive polls, which covers wait-time
+    widgets that render after load. Gives up on settling (but not on load)
+    after ``settle_timeout`` seconds.
+    """
+    WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+
+    deadline = time.monotonic() + settle_timeout
+    last_height = None
+    stable_polls = 0
+    while time.monotonic() < deadline:
+        height = driver.execute_script("return document.body.scrollHeight")
+        stable_polls = stable_polls + 1 if height == last_height else 0
+        if stable_polls >= 2:
+            return
+        last_height = height
+        time.sleep(poll_interval)
+    logger.debug(f"Page did not settle within {settle_timeout} seconds: {driver.current_url}")
+
+
+def scroll_to(driver, y):
+    """Scroll to ``y`` and return once the browser has painted the new position."""
+    return driver.execute_async_script("""
+        const [y, done] = arguments;
+        window.scrollTo(0, y);
+        requestAnimationFrame(() => requestAnimationFrame(() => done(window.scrollY)));
+    """, y)
+
+
+def interleave_by_host(urls_and_jobs):
+    """Order ``(url, job)`` pairs round-robin across hosts so one slow host doesn't block the queue."""
+    by_host = OrderedDict()
+    for url, job in urls_and_jobs:
+        by_host.setdefault(urlparse(url).netloc, []).append((url, job))
+    ordered = []
+    while by_host:
+        for host in list(by_host):
+            ordered.append(by_host[host].pop(0))
+            if not by_host[host]:
+                del by_host[host]
+    return ordered
+
+
+class BrowserPool:
+    """
+    Pool of isolated headless browsers draining a job queue.
+
+    Each worker owns one WebDriver, so pages never share a tab; at most
+    ``per_host_limit`` jobs hit the same host at once. Drivers that die are
+    replaced before the worker takes its next job.
+    """
+
+    def __init__(self, size=SCRAPER_BROWSERS, per_host_limit=SCRAPER_PER_HOST_LIMIT, driver_factory=create_driver):
+        self.size = size
+        self.per_host_limit = per_host_limit
+        self.driver_factory = driver_factory
+        self._drivers = []
+        self._idle_drivers = []
+        self._host_semaphores = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        drivers, self._drivers, self._idle_drivers = self._drivers, [], []
+        for driver in drivers:
+            await asyncio.to_thread(self._quit, driver)
+        if drivers:
+            logger.info(f"Closed {len(drivers)} WebDrivers")
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except WebDriverException as e:
+            logger.warning(f"Error closing WebDriver: {e}")
+
+    @staticmethod
+    def _is_alive(driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except WebDriverException:
+            return False
+
+    async def _new_driver(self):
+        driver = await asyncio.to_thread(self.driver_factory)
+        self._drivers.append(driver)
+        return driver
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_semaphores[host]
+
+    async def _worker(self, worker_id, queue, handler):
+        # Browsers outlive a single run() so a long-running scheduler reuses them
+        driver = self._idle_drivers.pop() if self._idle_drivers else None
+        while True:
+            try:
+                url, job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                if driver is not None:
+                    self._idle_drivers.append(driver)
+                return
+            try:
+                if driver is None:
+                    driver = await self._new_driver()
+                    logger.info(f"Browser worker {worker_id} started a WebDriver")
+                async with self._host_semaphore(url):
+                    await handler(job, driver)
+            except Exception as e:
+                logger.error(f"Browser worker {worker_id} failed on {url}: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+            if driver is not None and not await asyncio.to_thread(self._is_alive, driver):
+                logger.warning(f"Browser worker {worker_id} lost its WebDriver; replacing it")
+                self._drivers.remove(driver)
+                await asyncio.to_thread(self._quit, driver)
+                driver = None
+
+    async def run(self, jobs, handler):
+        """
+        Run ``await handler(job, driver)`` for every ``(url, job)`` pair.
+
+        Jobs are interleaved by host and processed by up to ``size`` browsers
+        in parallel; returns when the queue is drained.
+        """
+        start_time = time.monotonic()
+        queue = asyncio.Queue()
+        ordered = interleave_by_host(jobs)
+        for item in ordered:
+            queue.put_nowait(item)
+
+        workers = min(self.size, len(ordered))
+        await asyncio.gather(*(self._worker(worker_id, queue, handler) for worker_id in range(workers)))
+        logger.info(f"Scraped {len(ordered)} pages with {workers} browsers in {time.monotonic() - start_time:.1f} seconds")
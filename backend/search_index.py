@@ -0,0 +1,108 @@
+import bisect
+import re
+import time
+from collections import defaultdict
+import numpy as np
+from helpers.config import SEARCH_MIN_SCORE
+from logger_setup import logger
+
+# Address, city and ZIP matches count for a bit less than name matches
+SECONDARY_FIELD_WEIGHT = 0.8
+NAME_PREFIX_BONUS = 0.5
+WORD_PREFIX_BONUS = 0.25
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', (text or '').lower()).split())
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing."""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    """
+    Typo-tolerant in-memory search over hospital name, address, city and ZIP.
+
+    Each field group keeps an inverted index from trigram to document
+    positions. A query scores every document by the share of its trigrams
+    found in the name (or, discounted, in the address/city/ZIP), so a
+    misspelling only costs the few trigrams around it, plus a bonus when
+    the name or one of its words starts with the query. Counting is a
+    ``bincount`` over the query's posting lists and prefixes are bisected
+    in sorted name and word lists, so nothing loops over documents in Python.
+    """
+
+    def __init__(self, min_score=SEARCH_MIN_SCORE):
+        self.min_score = min_score
+        self.version = None
+        self._state = None
+
+    def build(self, records, version=None):
+        start_time = time.time()
+        records = list(records)
+        postings = {'name': defaultdict(list), 'other': defaultdict(list)}
+        names = []
+        for position, record in enumerate(records):
+            names.append(normalize(record.get('facility_name')))
+            other = ' '.join(str(record.get(field) or '') for field in ('address', 'city', 'zip_code'))
+            for gram in trigrams(record.get('facility_name')):
+                postings['name'][gram].append(position)
+            for gram in trigrams(other):
+                postings['other'][gram].append(position)
+
+        names_sorted = sorted((name, position) for position, name in enumerate(names))
+        words_sorted = sorted({(word, position) for position, name in enumerate(names) for word in name.split()})
+        state = {
+            'records': records,
+            'names': names,
+            'name_prefixes': ([name for name, _ in names_sorted], np.array([p for _, p in names_sorted], dtype=np.int32)),
+            'word_prefixes': ([word for word, _ in words_sorted], np.array([p for _, p in words_sorted], dtype=np.int32)),
+            'postings': {
+                field: {gram: np.array(positions, dtype=np.int32) for gram, positions in grams.items()}
+                for field, grams in postings.items()
+            }
+        }
+        # Swapped in one assignment so readers see either the old or the new index
+        self._state, self.version = state, version
+        logger.info(f"Built search index over {len(records)} hospitals in {time.time() - start_time:.3f} seconds")
+
+    def _coverage(self, postings, query_grams, size):
+        lists = [postings[gram] for gram in query_grams if gram in postings]
+        if not lists:
+            return np.zeros(size)
+        return np.bincount(np.concatenate(lists), minlength=size) / len(query_grams)
+
+    @staticmethod
+    def _with_prefix(prefixes, prefix):
+        keys, positions = prefixes
+        return positions[bisect.bisect_left(keys, prefix):bisect.bisect_left(keys, prefix + '\uffff')]
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` ``(score, record)`` pairs, best first."""
+        state = self._state
+        query = normalize(query)
+        if state is None or not query or not state['records']:
+            return []
+        size = len(state['records'])
+        query_grams = trigrams(query)
+
+        scores = np.maximum(
+            self._coverage(state['postings']['name'], query_grams, size),
+            SECONDARY_FIELD_WEIGHT * self._coverage(state['postings']['other'], query_grams, size)
+        )
+        bonus = np.zeros(size)
+        bonus[self._with_prefix(state['word_prefixes'], query.split()[-1])] = WORD_PREFIX_BONUS
+        bonus[self._with_prefix(state['name_prefixes'], query)] = NAME_PREFIX_BONUS
+        scores = np.where(scores > 0, scores + bonus, 0)
+
+        candidates = np.flatnonzero(scores >= self.min_score)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = sorted(candidates.tolist(), key=lambda position: (-scores[position], state['names'][position]))
+        return [(round(float(scores[position]), 3), state['records'][position]) for position in ranked]
@@ -0,0 +1,236 @@
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def ring_min_distance_km(lat, ring, cell_size):
+    """Lower bound on the distance from a point to any grid cell ``ring`` cells away from its own."""
+    gap = max(0, ring - 1) * cell_size
+    max_lat = min(90.0, abs(lat) + (ring + 1) * cell_size)
+    lat_bound = gap * KM_PER_DEGREE
+    lon_bound = 2 * EARTH_RADIUS_KM * math.asin(
+        min(1.0, math.cos(math.radians(max_lat)) * math.sin(math.radians(min(180.0, gap)) / 2))
+    )
+    return min(lat_bound, lon_bound)
+
+
+def _lon_ranges(west, east):
+    """Split a longitude interval into ranges that don't cross the antimeridian."""
+    if east - west >= 360:
+        return [(-180.0, 180.0)]
+    west = (west + 180) % 360 - 180
+    east = (east + 180) % 360 - 180
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+class SpatialIndex:
+    """
+    In-memory grid index over hospital coordinates.
+
+    Hospitals are bucketed into fixed-size latitude/longitude cells so radius
+    and bounding-box lookups only touch the cells overlapping the query.
+    Records without coordinates are kept (for lookups by id) but never bucketed.
+    ``version`` increases on every change so derived structures know when to rebuild.
+    """
+
+    def __init__(self, cell_size=0.25):
+        self.cell_size = cell_size
+        self.built_at = None
+        self.version = 0
+        self._lock = threading.RLock()
+        self._records = {}
+        self._cells = defaultdict(dict)
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def __len__(self):
+        return len(self._records)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    @staticmethod
+    def _has_coordinates(record):
+        return record.get('latitude') is not None and record.get('longitude') is not None
+
+    def build(self, records):
+        new_records = {}
+        new_cells = defaultdict(dict)
+        for record in records:
+            record = dict(record)
+            new_records[record['id']] = record
+            if self._has_coordinates(record):
+                new_cells[self._cell(record['latitude'], record['longitude'])][record['id']] = record
+
+        with self._lock:
+            self._records = new_records
+            self._cells = new_cells
+            self.built_at = time.monotonic()
+            self.version += 1
+
+    def get(self, hospital_id):
+        return self._records.get(hospital_id)
+
+    def snapshot(self):
+        """Return ``(version, records)`` taken atomically."""
+        with self._lock:
+            return self.version, list(self._records.values())
+
+    def upsert(self, record):
+        with self._lock:
+            self._remove_locked(record['id'])
+            record = dict(record)
+            self._records[record['id']] = record
+            if self._has_coordinates(record):
+                self._cells[self._cell(record['latitude'], record['longitude'])][record['id']] = record
+            self.version += 1
+
+    def remove(self, hospital_id):
+        with self._lock:
+            self._remove_locked(hospital_id)
+
+    def _remove_locked(self, hospital_id):
+        record = self._records.pop(hospital_id, None)
+        if record is not None:
+            self.version += 1
+        if record is not None and self._has_coordinates(record):
+            cell = self._cell(record['latitude'], record['longitude'])
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.pop(hospital_id, None)
+                if not bucket:
+                    del self._cells[cell]
+
+    def _iter_cells(self, south, west, north, east):
+        south = max(south, -90.0)
+        north = min(north, 90.0)
+        if south > north:
+            return
+        row_min, row_max = math.floor(south / self.cell_size), math.floor(north / self.cell_size)
+        cells = self._cells
+        for range_west, range_east in _lon_ranges(west, east):
+            col_min, col_max = math.floor(range_west / self.cell_size), math.floor(range_east / self.cell_size)
+            span = (row_max - row_min + 1) * (col_max - col_min + 1)
+            if span > len(cells):
+                # Wide query: cheaper to walk the occupied cells than the whole range
+                for (row, col), bucket in list(cells.items()):
+                    if row_min <= row <= row_max and col_min <= col <= col_max:
+                        yield bucket
+            else:
+                for row in range(row_min, row_max + 1):
+                    for col in range(col_min, col_max + 1):
+                        bucket = cells.get((row, col))
+                        if bucket:
+                            yield bucket
+
+    def query_bbox(self, south, west, north, east):
+        """Return records inside the box; ``west > east`` means the box crosses the antimeridian."""
+        if west > east:
+            east += 360
+        lon_ranges = _lon_ranges(west, east)
+        results = []
+        for bucket in self._iter_cells(south, west, north, east):
+            for record in list(bucket.values()):
+                lat, lon = record['latitude'], record['longitude']
+                if south <= lat <= north and any(w <= lon <= e for w, e in lon_ranges):
+                    results.append(record)
+        return results
+
+    def query_radius(self, lat, lon, radius_km):
+        """Return ``(distance_km, record)`` pairs within ``radius_km`` of the point."""
+        dlat = radius_km / KM_PER_DEGREE
+        max_lat = min(90.0, abs(lat) + dlat)
+        cos_lat = math.cos(math.radians(max_lat))
+        dlon = 360.0 if cos_lat < 1e-6 else min(360.0, radius_km / (KM_PER_DEGREE * cos_lat))
+
+        results = []
+        for bucket in self._iter_cells(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+            for record in list(bucket.values()):
+                distance = haversine_km(lat, lon, record['latitude'], record['longitude'])
+                if distance <= radius_km:
+                    results.append((distance, record))
+        return results
+
+    def nearest(self, lat, lon, k, score=None, lower_bound=None, predicate=None):
+        """
+        Return the ``k`` best ``(score, distance_km, record)`` triples around a point.
+
+        Cells are visited in rings of growing Chebyshev distance from the point's
+        cell, and the search stops once no unvisited cell can beat the current
+        k-th best score. ``score(distance_km, record)`` defaults to the distance;
+        ``lower_bound(distance_km)`` must never exceed the score of a record at
+        that distance.
+        """
+        score = score or (lambda distance, record: distance)
+        lower_bound = lower_bound or (lambda distance: distance)
+        if k <= 0:
+            return []
+
+        cells = self._cells
+        n_cols = round(360 / self.cell_size)
+        min_col = math.floor(-180 / self.cell_size)
+        center_row, center_col = self._cell(lat, lon)
+        best = []  # min-heap of (-score, -distance, id): the root is the worst of the k best so far
+        visited = set()
+
+        def consider(bucket):
+            for record in list(bucket.values()):
+                if predicate is not None and not predicate(record):
+                    continue
+                distance = haversine_km(lat, lon, record['latitude'], record['longitude'])
+                entry = (-score(distance, record), -distance, record['id'])
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+
+        ring = 0
+        while len(visited) < len(cells):
+            if len(best) == k and -best[0][0] <= lower_bound(ring_min_distance_km(lat, ring, self.cell_size)):
+                break
+            if (2 * ring + 1) ** 2 > len(cells):
+                # Far from the data: walking more rings would cost more than a scan of what's left
+                for cell, bucket in list(cells.items()):
+                    if cell not in visited:
+                        visited.add(cell)
+                        consider(bucket)
+                break
+
+            for row_offset in range(-ring, ring + 1):
+                row = center_row + row_offset
+                if row * self.cell_size > 90 or (row + 1) * self.cell_size < -90:
+                    continue
+                step = 1 if abs(row_offset) == ring else 2 * ring
+                for col_offset in range(-ring, ring + 1, max(step, 1)):
+                    col = (center_col + col_offset - min_col) % n_cols + min_col
+                    cell = (row, col)
+                    if cell in visited:
+                        continue
+                    bucket = cells.get(cell)
+                    if bucket is None:
+                        continue
+                    visited.add(cell)
+                    consider(bucket)
+            ring += 1
+
+        results = [(-neg_score, -neg_distance, self._records[hospital_id]) for neg_score, neg_distance, hospital_id in best]
+        results.sort(key=lambda result: (result[0], result[1]))
+        return results
@@ -1,27 +1,32 @@
 from hospital_data_service import hospital_data_service
 from contextlib import contextmanager
-import psycopg2
-from helpers.config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from db import db_pool
 from logger_setup import logger
+from wait_time_forecast import refresh_wait_time_forecasts
 
 @contextmanager
 def get_db_cursor():
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-    )
-    try:
-        yield conn.cursor()
-        conn.commit()
-    finally:
-        conn.close()
+    # The CMS sync runs long COPY/merge statements, so it opts out of the API statement timeout
+    with db_pool.cursor(statement_timeout_ms=0) as cursor:
+        yield cursor
 
 def sync_cms_data_task(last_run_time):
     logger.info("Starting CMS data sync task")
     try:
         service = hospital_data_service
         with get_db_cursor() as cursor:
-            service.sync_cms_data(cursor, last_run_time)
-        logger.info("CMS data sync task completed successfully")
+            summary = service.sync_cms_data(cursor, last_run_time)
+        logger.info(f"CMS data sync task completed successfully: {summary}")
     except Exception as e:
         logger.error(f"Error in CMS data sync task: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def refresh_wait_time_forecasts_task():
+    logger.info("Starting wait time forecast task")
+    try:
+        with get_db_cursor() as cursor:
+            refresh_wait_time_forecasts(cursor)
+        logger.info("Wait time forecast task completed successfully")
+    except Exception as e:
+        logger.error(f"Error in wait time forecast task: {str(e)}")
+        raise
@@ -0,0 +1,91 @@
+"""
+Change feed consistency against a real database.
+
+Needs a scratch Postgres database with helpers/init.sql applied, named in
+TEST_DB_NAME (other connection settings come from the usual DB_* variables).
+The tests insert and delete rows in it.
+"""
+import os
+import uuid
+from contextlib import contextmanager
+import pytest
+
+if not os.getenv('TEST_DB_NAME'):
+    pytest.skip("TEST_DB_NAME is not set", allow_module_level=True)
+os.environ['DB_NAME'] = os.environ['TEST_DB_NAME']
+
+from db import db_pool
+from hospital_data_service import hospital_data_service
+
+
+class CommitAfterFirstStatement:
+    """Connection proxy whose cursors run ``on_first_execute`` right after the first statement."""
+
+    def __init__(self, conn, on_first_execute):
+        self._conn = conn
+        self._on_first_execute = on_first_execute
+
+    @contextmanager
+    def cursor(self):
+        with self._conn.cursor() as cursor:
+            yield self._Cursor(cursor, self)
+
+    class _Cursor:
+        def __init__(self, cursor, proxy):
+            self._cursor = cursor
+            self._proxy = proxy
+
+        def execute(self, *args):
+            self._cursor.execute(*args)
+            if self._proxy._on_first_execute is not None:
+                callback, self._proxy._on_first_execute = self._proxy._on_first_execute, None
+                callback()
+
+        def __getattr__(self, name):
+            return getattr(self._cursor, name)
+
+
+def insert_hospital(cursor, name):
+    cursor.execute("""
+        INSERT INTO hospitals (facility_id, facility_name, latitude, longitude)
+        VALUES (%s, %s, 40.0, -75.0)
+        RETURNING id, facility_id
+    """, (f"test-{uuid.uuid4().hex[:12]}", name))
+    return cursor.fetchone()
+
+
+@pytest.fixture
+def hospitals():
+    with db_pool.cursor() as cursor:
+        kept = insert_hospital(cursor, 'Change Feed Kept Hospital')
+        removed = insert_hospital(cursor, 'Change Feed Removed Hospital')
+    yield kept, removed
+    with db_pool.cursor() as cursor:
+        cursor.execute("DELETE FROM hospitals WHERE id = ANY(%s)", ([kept[0], removed[0]],))
+        cursor.execute("DELETE FROM hospital_tombstones WHERE hospital_id = ANY(%s)", ([kept[0], removed[0]],))
+
+
+def test_sync_committed_during_read_is_not_skipped(hospitals, monkeypatch):
+    (kept_id, _), (removed_id, removed_facility_id) = hospitals
+    since = hospital_data_service.get_hospital_changes()['version']
+
+    def commit_cms_sync():
+        # Same order as sync_cms_data: upserts first, so the tombstones get the higher versions
+        with db_pool.cursor() as cursor:
+            hospital_data_service.update_wait_times(cursor, kept_id, '25 minutes')
+            hospital_data_service.delete_hospitals(cursor, [removed_facility_id])
+
+    @contextmanager
+    def reader_connection():
+        with db_pool.connection() as conn:
+            yield CommitAfterFirstStatement(conn, commit_cms_sync)
+
+    monkeypatch.setattr(hospital_data_service, 'get_db_connection', reader_connection)
+    first = hospital_data_service.get_hospital_changes(since)
+    monkeypatch.undo()
+    second = hospital_data_service.get_hospital_changes(first['version'])
+
+    changed_ids = {hospital['id'] for hospital in first['changed'] + second['changed']}
+    deleted_ids = set(first['deleted'] + second['deleted'])
+    assert kept_id in changed_ids
+    assert removed_id in deleted_ids
@@ -0,0 +1,60 @@
+import random
+from clustering import ClusterHierarchy
+
+WORLD = (-90.0, -180.0, 90.0, 180.0)
+
+
+def make_records(count, seed=11):
+    rng = random.Random(seed)
+    return [
+        {
+            'id': i + 1,
+            'latitude': rng.uniform(25, 49),
+            'longitude': rng.uniform(-125, -67),
+            'wait_time': rng.choice([None, rng.randint(0, 240)])
+        }
+        for i in range(count)
+    ]
+
+
+def test_cluster_counts_sum_to_input_at_every_zoom():
+    records = make_records(2000)
+    records.append({'id': 9999, 'latitude': None, 'longitude': None, 'wait_time': 10})
+    hierarchy = ClusterHierarchy(min_zoom=3, max_zoom=12, radius_px=60)
+    hierarchy.build(records, version=1)
+
+    for zoom in range(3, 13):
+        clusters = hierarchy.query(WORLD, zoom)
+        assert sum(cluster['count'] for cluster in clusters) == 2000
+    assert len(hierarchy.query(WORLD, 3)) < len(hierarchy.query(WORLD, 12))
+
+
+def test_cluster_waits_summarize_members():
+    records = [
+        {'id': 1, 'latitude': 40.0, 'longitude': -75.0, 'wait_time': 30},
+        {'id': 2, 'latitude': 40.0001, 'longitude': -75.0001, 'wait_time': 90},
+        {'id': 3, 'latitude': 40.0002, 'longitude': -75.0002, 'wait_time': None},
+        {'id': 4, 'latitude': 10.0, 'longitude': 10.0, 'wait_time': None}
+    ]
+    hierarchy = ClusterHierarchy(min_zoom=3, max_zoom=12, radius_px=60)
+    hierarchy.build(records, version=1)
+
+    clusters = sorted(hierarchy.query(WORLD, 12), key=lambda cluster: -cluster['count'])
+    assert [cluster['count'] for cluster in clusters] == [3, 1]
+    assert clusters[0]['min_wait'] == 30
+    assert clusters[0]['avg_wait'] == 60
+    assert clusters[1]['hospital_id'] == 4
+    assert clusters[1]['min_wait'] is None
+
+
+def test_query_crossing_antimeridian():
+    records = [
+        {'id': 1, 'latitude': 0.0, 'longitude': 179.5, 'wait_time': 5},
+        {'id': 2, 'latitude': 0.0, 'longitude': -179.5, 'wait_time': 5},
+        {'id': 3, 'latitude': 0.0, 'longitude': 0.0, 'wait_time': 5}
+    ]
+    hierarchy = ClusterHierarchy(min_zoom=3, max_zoom=12, radius_px=60)
+    hierarchy.build(records, version=1)
+
+    clusters = hierarchy.query((-1.0, 179.0, 1.0, -179.0), 12)
+    assert sorted(cluster['hospital_id'] for cluster in clusters) == [1, 2]
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from geocoding import Geocoder, GeocodeCache, GeocodingError, StubGeocodingProvider, TokenBucket, NOT_FOUND
+
+
+class FlakyProvider(StubGeocodingProvider):
+    """Stub provider that fails on the queries in ``failing``."""
+
+    def __init__(self, results=None, failing=()):
+        super().__init__(results)
+        self.failing = set(failing)
+
+    async def geocode(self, session, query):
+        if query in self.failing:
+            self.calls.append(query)
+            raise GeocodingError(f"Provider unavailable for {query}")
+        return await super().geocode(session, query)
+
+
+def make_geocoder(tmp_path, provider, negative_ttl=3600):
+    cache = GeocodeCache(path=str(tmp_path / 'geocodes.sqlite3'), negative_ttl=negative_ttl, legacy_json_path=None)
+    return Geocoder(provider, cache=cache, max_retries=1)
+
+
+def test_results_are_cached_across_instances(tmp_path):
+    provider = StubGeocodingProvider({'1 Main St, Springfield': (40.1, -75.2)})
+    geocoder = make_geocoder(tmp_path, provider)
+
+    first = geocoder.run_sync(geocoder.geocode('1 Main St, Springfield'))
+    second = geocoder.run_sync(geocoder.geocode('  1 MAIN ST,   springfield '))
+    assert (first.latitude, first.longitude) == (40.1, -75.2)
+    assert second == first
+    assert len(provider.calls) == 1
+
+    # A new process reads the same SQLite file
+    reopened = make_geocoder(tmp_path, StubGeocodingProvider())
+    assert reopened.run_sync(reopened.geocode('1 Main St, Springfield')) == first
+    assert reopened.provider.calls == []
+
+
+def test_misses_expire_after_negative_ttl(tmp_path):
+    provider = StubGeocodingProvider()
+    geocoder = make_geocoder(tmp_path, provider)
+
+    assert geocoder.run_sync(geocoder.geocode('Nowhere')) is None
+    assert geocoder.run_sync(geocoder.geocode('Nowhere')) is None
+    assert len(provider.calls) == 1
+    assert geocoder.cache.get('nowhere') is NOT_FOUND
+
+    geocoder.cache.negative_ttl = 0
+    assert geocoder.cache.get('nowhere') is None
+    assert geocoder.run_sync(geocoder.geocode('Nowhere')) is None
+    assert len(provider.calls) == 2
+
+
+def test_provider_errors_are_not_cached(tmp_path):
+    provider = FlakyProvider({'Springfield': (40.0, -75.0)}, failing={'1 Main St, Springfield'})
+    geocoder = make_geocoder(tmp_path, provider)
+
+    result = geocoder.run_sync(geocoder.geocode_first(['1 Main St, Springfield', 'Springfield'], cache_key='1mainst'))
+    assert (result.latitude, result.longitude) == (40.0, -75.0)
+    # The fallback answered, but the precise query might still match once the provider recovers
+    assert geocoder.cache.get('1mainst') is None
+    assert geocoder.cache.get('1 main st, springfield') is None
+
+    provider.failing.clear()
+    geocoder.run_sync(geocoder.geocode_first(['1 Main St, Springfield', 'Springfield'], cache_key='1mainst'))
+    assert geocoder.cache.get('1mainst') is not None
+
+
+def test_concurrent_lookups_share_one_request(tmp_path):
+    provider = StubGeocodingProvider({'Springfield': (40.0, -75.0)})
+    geocoder = make_geocoder(tmp_path, provider)
+
+    async def lookups():
+        return await asyncio.gather(*(geocoder.geocode('Springfield') for _ in range(5)))
+
+    results = geocoder.run_sync(lookups())
+    assert len(set(results)) == 1
+    assert len(provider.calls) == 1
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def acquire(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(acquire(6))
+    # The first token is available immediately, the other five arrive 20 ms apart
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_geocoder_requests_are_rate_limited(tmp_path):
+    provider = StubGeocodingProvider({f'Town {i}': (40.0 + i, -75.0) for i in range(6)})
+    cache = GeocodeCache(path=str(tmp_path / 'geocodes.sqlite3'), legacy_json_path=None)
+    geocoder = Geocoder(provider, cache=cache, rate_limit=50)
+    geocoder.rate_limiter = TokenBucket(rate=50, capacity=1)
+
+    start = time.monotonic()
+    results = geocoder.run_sync(geocoder.geocode_many([([f'Town {i}'], None) for i in range(6)]))
+    assert [result.latitude for result in results] == [40.0 + i for i in range(6)]
+    assert time.monotonic() - start >= 5 / 50 * 0.9
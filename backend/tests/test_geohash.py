@@ -0,0 +1,38 @@
+import random
+import pytest
+import geohash
+
+
+def test_encode_known_value_and_prefixes():
+    # Reference value from the original geohash description
+    assert geohash.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geohash.encode(57.64911, 10.40744, 5) == 'u4pru'
+
+
+@pytest.mark.parametrize('precision', [4, 5, 6])
+@pytest.mark.parametrize('bbox', [(39.5, -75.5, 40.5, -74.5), (-3.0, 178.5, 3.0, -178.5), (60.0, -10.0, 61.0, 10.0)])
+def test_cover_contains_every_point_in_box(bbox, precision):
+    south, west, north, east = bbox
+    cells = geohash.cover(south, west, north, east, precision)
+    assert len(cells) == geohash.cover_count(south, west, north, east, precision)
+
+    rng = random.Random(precision)
+    width = (east - west) % 360
+    for _ in range(500):
+        lon = (west + rng.uniform(0, width) + 180) % 360 - 180
+        assert geohash.encode(rng.uniform(south, north), lon, precision) in cells
+    for corner in ((south, west), (south, east), (north, west), (north, east)):
+        assert geohash.encode(*corner, precision) in cells
+
+
+def test_cover_does_not_reach_far_outside_box():
+    lat_step, lon_step = geohash.cell_size(5)
+    cells = geohash.cover(40.0, -75.0, 40.2, -74.8, 5)
+    assert len(cells) <= (0.2 / lat_step + 2) * (0.2 / lon_step + 2)
+    assert geohash.encode(40.0, -73.0, 5) not in cells
+
+
+def test_viewport_cells_respects_cell_budget():
+    cells = geohash.viewport_cells(30.0, -100.0, 45.0, -70.0, 2, 6, 32)
+    assert cells is not None and len(cells) <= 32
+    assert geohash.viewport_cells(-80.0, -180.0, 80.0, 180.0, 4, 6, 32) is None
@@ -0,0 +1,68 @@
+import random
+import pytest
+from hospital_data_service import HospitalDataService, decode_cursor, encode_cursor, listing_sort_key
+
+
+def make_records(count, seed=3):
+    rng = random.Random(seed)
+    names = ['Mercy', 'General', 'Regional', 'Memorial', 'Community']
+    return [
+        {
+            'id': i + 1,
+            # Repeated names and waits so ties are broken by id
+            'facility_name': f"{rng.choice(names)} Hospital",
+            'address': f"{i} Main St",
+            'wait_time': rng.choice([None, rng.randint(0, 60)])
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize('sort_value, sort', [('Mercy Hospital', 'name'), (15, 'wait')])
+def test_cursor_round_trip(sort_value, sort):
+    assert decode_cursor(encode_cursor(sort_value, 42), sort) == (sort_value, 42)
+
+
+@pytest.mark.parametrize('cursor, sort', [('not a cursor', 'name'), (encode_cursor('Mercy', 1), 'wait'), (encode_cursor(5, '1'), 'wait')])
+def test_invalid_cursors_are_rejected(cursor, sort):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, sort)
+
+
+def walk_pages(service, records, sort, per_page, max_wait=None):
+    seen = []
+    after = None
+    while True:
+        result, _ = service._page_from_index(list(records), 1, per_page, None, after, 'none', max_wait, sort, ('test', None))
+        seen.extend(hospital['id'] for hospital in result['hospitals'])
+        if not result['has_more']:
+            assert result['next_cursor'] is None
+            return seen
+        after = decode_cursor(result['next_cursor'], sort)
+
+
+@pytest.mark.parametrize('sort', ['name', 'wait'])
+def test_keyset_pages_cover_every_record_once_in_order(sort):
+    service = HospitalDataService()
+    records = make_records(103)
+
+    seen = walk_pages(service, records, sort, per_page=10)
+    expected = [record['id'] for record in sorted(records, key=lambda record: listing_sort_key(record, sort))]
+    assert seen == expected
+
+
+def test_keyset_pages_apply_filters():
+    service = HospitalDataService()
+    records = make_records(103)
+
+    seen = walk_pages(service, records, 'wait', per_page=7, max_wait=30)
+    assert sorted(seen) == sorted(r['id'] for r in records if r['wait_time'] is not None and r['wait_time'] <= 30)
+
+
+def test_offset_page_reports_total_count():
+    service = HospitalDataService()
+    result, debug_info = service._page_from_index(make_records(25), 3, 10, None, None, 'exact', None, 'name', ('test', None))
+    assert len(result['hospitals']) == 5
+    assert result['total_count'] == 25 and result['total_pages'] == 3
+    assert result['has_more'] is False
+    assert debug_info['params'][-1] == 20
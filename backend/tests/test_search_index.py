@@ -0,0 +1,49 @@
+from search_index import SearchIndex, normalize, trigrams
+
+RECORDS = [
+    {'id': 1, 'facility_name': "St. Mary's Medical Center", 'address': '100 Oak Ave', 'city': 'Springfield', 'zip_code': '62701'},
+    {'id': 2, 'facility_name': 'Springfield General Hospital', 'address': '5 Main St', 'city': 'Springfield', 'zip_code': '62702'},
+    {'id': 3, 'facility_name': 'Mercy Hospital', 'address': '12 Elm Rd', 'city': 'Riverside', 'zip_code': '92501'},
+    {'id': 4, 'facility_name': 'Memorial Regional Medical Center', 'address': '9 Pine St', 'city': 'Hollywood', 'zip_code': '33021'}
+]
+
+
+def build_index():
+    index = SearchIndex(min_score=0.3)
+    index.build(RECORDS, version=1)
+    return index
+
+
+def ids(results):
+    return [record['id'] for _, record in results]
+
+
+def test_normalize_and_trigrams():
+    assert normalize("  St. Mary's  ") == 'st mary s'
+    assert trigrams('Ab') == {'  a', ' ab', 'ab '}
+
+
+def test_exact_name_ranks_first():
+    assert ids(build_index().search('Mercy Hospital'))[0] == 3
+
+
+def test_misspelling_still_matches():
+    assert ids(build_index().search('Mercey Hospitl'))[0] == 3
+
+
+def test_prefix_as_you_type():
+    assert ids(build_index().search('memor'))[0] == 4
+
+
+def test_address_and_zip_fields_match():
+    index = build_index()
+    assert ids(index.search('Elm Rd'))[0] == 3
+    assert 4 in ids(index.search('33021'))
+
+
+def test_limit_and_empty_queries():
+    index = build_index()
+    assert len(index.search('medical center', limit=1)) == 1
+    assert index.search('') == []
+    assert index.search('zzzzqqqq') == []
+    assert SearchIndex().search('mercy') == []
@@ -0,0 +1,91 @@
+import random
+import pytest
+from spatial_index import SpatialIndex, haversine_km
+
+
+def make_records(count, seed=7):
+    rng = random.Random(seed)
+    records = [
+        {'id': i, 'latitude': rng.uniform(-60, 60), 'longitude': rng.uniform(-180, 180)}
+        for i in range(count)
+    ]
+    # Dense clusters near the antimeridian and around one city
+    records += [
+        {'id': count + i, 'latitude': rng.uniform(-5, 5), 'longitude': rng.choice([-1, 1]) * rng.uniform(175, 180)}
+        for i in range(200)
+    ]
+    records += [
+        {'id': count + 200 + i, 'latitude': 40 + rng.uniform(-1, 1), 'longitude': -75 + rng.uniform(-1, 1)}
+        for i in range(500)
+    ]
+    records.append({'id': -1, 'latitude': None, 'longitude': None})
+    return records
+
+
+@pytest.fixture(scope='module')
+def records():
+    return make_records(3000)
+
+
+@pytest.fixture(scope='module')
+def index(records):
+    index = SpatialIndex(cell_size=0.25)
+    index.build(records)
+    return index
+
+
+def located(records):
+    return [record for record in records if record['latitude'] is not None]
+
+
+@pytest.mark.parametrize('lat, lon, radius_km', [
+    (40.0, -75.0, 25), (40.0, -75.0, 150), (0.0, 179.9, 300), (0.0, -179.5, 80), (-30.0, 20.0, 2000)
+])
+def test_radius_matches_brute_force(index, records, lat, lon, radius_km):
+    expected = {
+        record['id'] for record in located(records)
+        if haversine_km(lat, lon, record['latitude'], record['longitude']) <= radius_km
+    }
+    assert {record['id'] for _, record in index.query_radius(lat, lon, radius_km)} == expected
+
+
+@pytest.mark.parametrize('bbox', [
+    (39.5, -75.5, 40.5, -74.5), (-10.0, -30.0, 10.0, 30.0), (-5.0, 178.0, 5.0, -178.0), (-60.0, 170.0, 60.0, -170.0)
+])
+def test_bbox_matches_brute_force(index, records, bbox):
+    south, west, north, east = bbox
+
+    def inside(record):
+        lon = record['longitude']
+        in_lon = west <= lon <= east if west <= east else lon >= west or lon <= east
+        return south <= record['latitude'] <= north and in_lon
+
+    expected = {record['id'] for record in located(records) if inside(record)}
+    assert expected
+    assert {record['id'] for record in index.query_bbox(*bbox)} == expected
+
+
+@pytest.mark.parametrize('lat, lon', [(40.0, -75.0), (0.0, 179.95), (55.0, 10.0)])
+def test_nearest_matches_brute_force(index, records, lat, lon):
+    expected = sorted(haversine_km(lat, lon, record['latitude'], record['longitude']) for record in located(records))[:10]
+    result = index.nearest(lat, lon, 10)
+    assert [distance for _, distance, _ in result] == pytest.approx(expected)
+
+
+def test_upsert_and_remove_move_records_between_cells(records):
+    index = SpatialIndex(cell_size=0.25)
+    index.build(records)
+    version = index.version
+
+    index.upsert({'id': 0, 'latitude': 10.0, 'longitude': 10.0})
+    assert index.version > version
+    assert [record['id'] for record in index.query_bbox(9.9, 9.9, 10.1, 10.1)] == [0]
+
+    index.upsert({'id': 0, 'latitude': -10.0, 'longitude': -10.0})
+    assert index.query_bbox(9.9, 9.9, 10.1, 10.1) == []
+
+    index.remove(0)
+    assert index.get(0) is None
+    assert index.query_bbox(-10.1, -10.1, -9.9, -9.9) == []
+    # Records without coordinates are kept for lookups by id but never bucketed
+    assert index.get(-1) is not None
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from wait_time_forecast import fit_forecasts, week_slot
+
+# A Sunday, so day_of_week 0 / hour h is week slot h
+NOW = datetime(2024, 6, 2, 12, 0)
+
+
+def flat_profile(hospital_id, minutes, samples=20):
+    return [(hospital_id, day, hour, samples, samples * minutes) for day in range(7) for hour in range(24)]
+
+
+def test_week_slot_uses_sunday_as_day_zero():
+    slots = week_slot(np.array([NOW, NOW + timedelta(days=1, hours=3)], dtype='datetime64[s]'))
+    assert slots.tolist() == [12, 24 + 15]
+
+
+def test_forecast_follows_profile_without_recent_observations():
+    ids, hours, predicted, lower, upper = fit_forecasts([1], flat_profile(1, 45), [], NOW, horizon_hours=6)
+    assert ids.tolist() == [1] * 6
+    assert hours[0] == np.datetime64('2024-06-02T13', 'h')
+    assert predicted == pytest.approx([45] * 6)
+    assert (lower <= predicted).all() and (predicted <= upper).all()
+
+
+def test_recent_level_decays_back_to_profile():
+    observations = [(1, NOW - timedelta(minutes=10 * i), 105) for i in range(6)]
+    _, _, predicted, _, _ = fit_forecasts([1], flat_profile(1, 45), observations, NOW, horizon_hours=24, damping=0.8)
+    assert predicted[0] > 80
+    assert np.all(np.diff(predicted) < 0)
+    assert predicted[-1] == pytest.approx(45, abs=1)
+
+
+def test_hospitals_without_history_are_skipped():
+    observations = [(2, NOW - timedelta(hours=1), 30), (99, NOW - timedelta(hours=1), 500)]
+    ids, _, predicted, _, _ = fit_forecasts([3, 1, 2], flat_profile(1, 20), observations, NOW, horizon_hours=2)
+    assert ids.tolist() == [1, 1, 2, 2]
+    # Hospital 2 has no profile yet, so its recent observations stand in for one
+    assert predicted[2:] == pytest.approx([30, 30])
+
+
+def test_no_hospitals():
+    ids, hours, predicted, lower, upper = fit_forecasts([], [], [], NOW)
+    assert len(ids) == len(hours) == len(predicted) == 0
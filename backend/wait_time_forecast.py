@@ -0,0 +1,166 @@
+import io
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from helpers.config import (
+    FORECAST_HORIZON_HOURS, FORECAST_HISTORY_DAYS, FORECAST_HALF_LIFE_HOURS, FORECAST_DAMPING, FORECAST_PROFILE_PRIOR
+)
+from logger_setup import logger
+from wait_time_history import HOURS_PER_WEEK
+
+# z-score of the 10th/90th percentile, for an 80% interval
+INTERVAL_Z = 1.2816
+
+# Advisory lock key held by a forecast refresh until it commits
+FORECAST_REFRESH_LOCK = 0x66636173
+
+
+def week_slot(moments):
+    """(day of week * 24 + hour) in UTC, with 0 = Sunday as in wait_time_profiles."""
+    # 1970-01-01 was a Thursday (slot 4 * 24); numpy datetimes are naive UTC
+    hours = moments.astype('datetime64[h]').astype(np.int64)
+    return (hours + 4 * 24) % HOURS_PER_WEEK
+
+
+def fit_forecasts(hospital_ids, profiles, observations, now, horizon_hours=FORECAST_HORIZON_HOURS,
+                  half_life_hours=FORECAST_HALF_LIFE_HOURS, damping=FORECAST_DAMPING, prior=FORECAST_PROFILE_PRIOR):
+    """
+    Forecast hourly waits for every hospital at once.
+
+    The model is a seasonal profile plus a damped level:
+
+    * the seasonal profile is each hospital's mean wait per (day of week,
+      hour), shrunk toward its overall mean by ``prior`` pseudo-samples so
+      sparse slots don't swing wildly;
+    * the level is an exponentially weighted mean of recent residuals
+      (observation minus profile), which decays by ``damping`` per hour ahead
+      so forecasts fall back to the profile as the horizon grows.
+
+    ``profiles`` are ``(hospital_id, day_of_week, hour, sample_count,
+    total_minutes)`` rows and ``observations`` ``(hospital_id, observed_at,
+    wait_minutes)`` rows. Returns ``(hospital_ids, target_hours, predicted,
+    lower, upper)`` with one row per hospital per hour ahead, hospitals in
+    ascending id order.
+    """
+    hospital_ids = np.unique(np.asarray(hospital_ids, dtype=np.int64))
+    n_hospitals = len(hospital_ids)
+    if n_hospitals == 0:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[h]'), np.empty(0), np.empty(0), np.empty(0))
+
+    def positions(ids):
+        # Index into hospital_ids, or -1 for hospitals that aren't being forecast
+        index = np.clip(np.searchsorted(hospital_ids, ids), 0, n_hospitals - 1)
+        return np.where(hospital_ids[index] == ids, index, -1)
+
+    counts = np.zeros((n_hospitals, HOURS_PER_WEEK))
+    totals = np.zeros((n_hospitals, HOURS_PER_WEEK))
+    if len(profiles):
+        profile_rows = np.asarray(profiles, dtype=np.float64)
+        rows = positions(profile_rows[:, 0].astype(np.int64))
+        keep = rows >= 0
+        slots = (profile_rows[keep, 1] * 24 + profile_rows[keep, 2]).astype(np.int64)
+        np.add.at(counts, (rows[keep], slots), profile_rows[keep, 3])
+        np.add.at(totals, (rows[keep], slots), profile_rows[keep, 4])
+
+    obs_rows = np.empty(0, dtype=np.int64)
+    obs_times = np.empty(0, dtype='datetime64[s]')
+    obs_values = np.empty(0)
+    if len(observations):
+        obs_ids, obs_times, obs_values = zip(*observations)
+        obs_rows = positions(np.array(obs_ids, dtype=np.int64))
+        keep = obs_rows >= 0
+        obs_rows = obs_rows[keep]
+        obs_times = np.array(obs_times, dtype='datetime64[s]')[keep]
+        obs_values = np.array(obs_values, dtype=float)[keep]
+    observation_counts = np.bincount(obs_rows, minlength=n_hospitals)
+
+    # Hospitals without a profile yet fall back to the mean of their recent observations
+    profile_counts = counts.sum(axis=1)
+    overall_mean = np.where(
+        profile_counts > 0,
+        totals.sum(axis=1) / np.maximum(profile_counts, 1),
+        np.bincount(obs_rows, weights=obs_values, minlength=n_hospitals) / np.maximum(observation_counts, 1)
+    )
+    seasonal = (totals + prior * overall_mean[:, None]) / (counts + prior)
+
+    level = np.zeros(n_hospitals)
+    spread = np.zeros(n_hospitals)
+    if len(obs_rows):
+        residuals = obs_values - seasonal[obs_rows, week_slot(obs_times)]
+        age_hours = (np.datetime64(now, 's') - obs_times).astype(np.float64) / 3600
+        weights = 0.5 ** (np.maximum(age_hours, 0) / half_life_hours)
+
+        weight_sums = np.bincount(obs_rows, weights=weights, minlength=n_hospitals)
+        has_weight = weight_sums > 0
+        level[has_weight] = (np.bincount(obs_rows, weights=weights * residuals, minlength=n_hospitals)[has_weight]
+                             / weight_sums[has_weight])
+        variance = np.bincount(obs_rows, weights=weights * (residuals - level[obs_rows]) ** 2, minlength=n_hospitals)
+        spread[has_weight] = np.sqrt(variance[has_weight] / weight_sums[has_weight])
+
+    steps = np.arange(1, horizon_hours + 1)
+    target_hours = np.datetime64(now, 'h') + steps
+    predicted = seasonal[:, week_slot(target_hours)] + level[:, None] * damping ** steps[None, :]
+    # Uncertainty grows as the forecast leans more on the profile than on recent observations
+    interval = INTERVAL_Z * spread[:, None] * np.sqrt(steps)[None, :]
+
+    predicted = np.clip(predicted, 0, None)
+    lower = np.clip(predicted - interval, 0, None)
+    upper = predicted + interval
+
+    # Hospitals with no history at all get no forecast
+    known = (profile_counts > 0) | (observation_counts > 0)
+    return (
+        np.repeat(hospital_ids[known], horizon_hours),
+        np.tile(target_hours, int(known.sum())),
+        predicted[known].ravel(),
+        lower[known].ravel(),
+        upper[known].ravel()
+    )
+
+
+def refresh_wait_time_forecasts(cursor, now=None):
+    """Refit forecasts for every hospital with history and replace the wait_time_forecasts table."""
+    start_time = time.time()
+    now = now or datetime.now(timezone.utc)
+    # numpy datetimes are naive, so work in naive UTC
+    now_utc = now.astimezone(timezone.utc).replace(tzinfo=None)
+
+    # Overlapping refreshes would each DELETE only the rows they can see and then collide on the
+    # primary key in COPY, so a second refresh waits here until the first has committed
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (FORECAST_REFRESH_LOCK,))
+
+    cursor.execute("""
+        SELECT hospital_id, day_of_week, hour, sample_count, total_minutes
+        FROM wait_time_profiles
+    """)
+    profiles = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT hospital_id, timestamp AT TIME ZONE 'UTC', wait_time
+        FROM wait_times
+        WHERE timestamp >= %s
+    """, (now - timedelta(days=FORECAST_HISTORY_DAYS),))
+    observations = cursor.fetchall()
+
+    hospital_ids = sorted({row[0] for row in profiles} | {row[0] for row in observations})
+    ids, target_hours, predicted, lower, upper = fit_forecasts(hospital_ids, profiles, observations, now_utc)
+
+    buffer = io.StringIO()
+    for row in zip(ids.tolist(), target_hours.astype(str).tolist(), predicted.tolist(), lower.tolist(), upper.tolist()):
+        hospital_id, target_hour, predicted_minutes, lower_minutes, upper_minutes = row
+        buffer.write(f"{hospital_id}\t{target_hour}:00:00+00\t{predicted_minutes:.1f}\t{lower_minutes:.1f}\t{upper_minutes:.1f}\n")
+    buffer.seek(0)
+
+    # Readers keep seeing the previous forecasts until this transaction commits
+    cursor.execute("DELETE FROM wait_time_forecasts")
+    cursor.copy_expert(
+        "COPY wait_time_forecasts (hospital_id, target_hour, predicted_minutes, lower_minutes, upper_minutes) FROM STDIN",
+        buffer
+    )
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"Refreshed wait time forecasts for {len(set(ids.tolist()))} hospitals "
+        f"({len(ids)} rows, {len(observations)} observations) in {elapsed:.2f} seconds"
+    )
+    return len(ids)
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+# wait_time_profiles buckets are (UTC day of week, hour); 0 = Sunday, as in Postgres EXTRACT(DOW)
+HOURS_PER_WEEK = 7 * 24
+
+
+def _observation_arrays(observations):
+    rows = [(hospital_id, wait_minutes, observed_at or datetime.now(timezone.utc))
+            for hospital_id, wait_minutes, observed_at in observations if wait_minutes is not None]
+    if not rows:
+        return None
+    hospital_ids, wait_minutes, observed_at = zip(*rows)
+    return list(hospital_ids), list(wait_minutes), list(observed_at)
+
+
+def record_wait_time_observations(cursor, observations):
+    """
+    Append ``(hospital_id, wait_minutes, observed_at)`` observations to
+    wait_times and update wait_time_profiles in a single round trip.
+    Observations without minutes are skipped.
+    """
+    arrays = _observation_arrays(observations)
+    if arrays is None:
+        return 0
+    cursor.execute(
+        "SELECT record_wait_time_observations(%s::integer[], %s::integer[], %s::timestamptz[])", arrays
+    )
+    return cursor.fetchone()[0]
+
+
+async def record_wait_time_observations_async(conn, observations):
+    """asyncpg counterpart of record_wait_time_observations."""
+    arrays = _observation_arrays(observations)
+    if arrays is None:
+        return 0
+    return await conn.fetchval(
+        "SELECT record_wait_time_observations($1::integer[], $2::integer[], $3::timestamptz[])", *arrays
+    )
+
+
+def build_wait_profile(rows, utc_offset_minutes=0):
+    """
+    Turn wait_time_profiles rows ``(day_of_week, hour, sample_count,
+    total_minutes, min_minutes, max_minutes)`` into local-time buckets.
+
+    The offset is applied in whole hours, so half-hour time zones land on the
+    nearest hour.
+    """
+    shift = round(utc_offset_minutes / 60)
+    buckets = []
+    for day_of_week, hour, sample_count, total_minutes, min_minutes, max_minutes in rows:
+        local_slot = (day_of_week * 24 + hour + shift) % HOURS_PER_WEEK
+        buckets.append({
+            'day_of_week': local_slot // 24,
+            'hour': local_slot % 24,
+            'samples': sample_count,
+            'average_minutes': round(total_minutes / sample_count, 1),
+            'min_minutes': min_minutes,
+            'max_minutes': max_minutes
+        })
+    buckets.sort(key=lambda bucket: (bucket['day_of_week'], bucket['hour']))
+    return buckets
@@ -1,7 +1,10 @@
-from flask_socketio import SocketIO
-import asyncio
+from flask_socketio import SocketIO, join_room, leave_room
+import threading
+from collections import Counter, defaultdict
 from flask import request
-from hospital_data_service import hospital_data_service
+from helpers.config import GEOHASH_MIN_PRECISION, GEOHASH_MAX_PRECISION, VIEWPORT_MAX_CELLS, INITIAL_DATA_LIMIT, CHANGE_FEED_PAGE_SIZE
+from hospital_data_service import hospital_data_service, parse_bbox, KM_PER_MILE
+from geohash import encode, viewport_cells
 from logger_setup import logger
 import urllib3
 
@@ -24,6 +27,48 @@ class SocketIOWrapper:
     def is_initialized(cls):
         return cls._instance is not None
 
+class ViewportSubscriptions:
+    """
+    Which geohash cell rooms each client has joined.
+
+    A client covers its viewport with cells of a single precision (the finest
+    that needs at most VIEWPORT_MAX_CELLS), so it never sits in two rooms
+    for the same hospital. The subscriber counts let updates skip cells
+    nobody is watching.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cells_by_client = {}
+        self._subscribers = Counter()
+
+    def replace(self, sid, cells):
+        """Set a client's cells; returns ``(cells to leave, cells to join)``."""
+        with self._lock:
+            previous = self._cells_by_client.pop(sid, set())
+            if cells:
+                self._cells_by_client[sid] = set(cells)
+            for cell in previous - set(cells):
+                self._subscribers[cell] -= 1
+                if self._subscribers[cell] <= 0:
+                    del self._subscribers[cell]
+            for cell in set(cells) - previous:
+                self._subscribers[cell] += 1
+            return previous - set(cells), set(cells) - previous
+
+    def watched(self, cells):
+        with self._lock:
+            return [cell for cell in cells if self._subscribers.get(cell)]
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._cells_by_client), 'cells': len(self._subscribers)}
+
+viewport_subscriptions = ViewportSubscriptions()
+
+def cell_room(cell):
+    return f"geo:{cell}"
+
 def init_socketio(app):
     socketio = SocketIOWrapper.initialize(app)
     
@@ -33,39 +78,111 @@ def init_socketio(app):
 
     @socketio.on('disconnect')
     def handle_disconnect():
+        # Socket.IO drops the rooms itself; only the subscriber counts need updating
+        viewport_subscriptions.replace(request.sid, ())
         logger.info('Client disconnected')
 
+    def send_initial_data(sid, **query):
+        # Runs as a background task so the lookup (and a possible index rebuild) doesn't hold up the socket
+        try:
+            result, _ = hospital_data_service.get_hospitals_paginated(page=1, per_page=INITIAL_DATA_LIMIT, count='none', **query)
+            socketio.emit('initial_data', result, to=sid)
+        except Exception as e:
+            logger.error(f"Failed to send initial data to {sid}: {e}")
+
+    @socketio.on('subscribe_viewport')
+    def handle_subscribe_viewport(data):
+        """
+        Join the geohash cell rooms covering ``data['bbox']``
+        (``south,west,north,east``) and leave the previous ones. Sends the
+        viewport's hospitals as ``initial_data`` unless ``initial_data`` is false.
+        """
+        sid = request.sid
+        try:
+            bbox = parse_bbox(data['bbox'])
+        except (KeyError, TypeError, ValueError) as e:
+            socketio.emit('subscription_error', {'error': f"Invalid viewport: {e}"}, to=sid)
+            return
+        cells = viewport_cells(*bbox, GEOHASH_MIN_PRECISION, GEOHASH_MAX_PRECISION, VIEWPORT_MAX_CELLS)
+        if cells is None:
+            socketio.emit('subscription_error', {'error': "Viewport too large; zoom in to receive live updates"}, to=sid)
+            cells = set()
+
+        left, joined = viewport_subscriptions.replace(sid, cells)
+        for cell in left:
+            leave_room(cell_room(cell))
+        for cell in joined:
+            join_room(cell_room(cell))
+        logger.debug(f"Client {sid} watching {len(cells)} cells (+{len(joined)} -{len(left)})")
+
+        if cells and data.get('initial_data', True):
+            socketio.start_background_task(send_initial_data, sid, bbox=bbox)
+
+    @socketio.on('unsubscribe_viewport')
+    def handle_unsubscribe_viewport(data=None):
+        left, _ = viewport_subscriptions.replace(request.sid, ())
+        for cell in left:
+            leave_room(cell_room(cell))
+
     @socketio.on('request_initial_data')
     def handle_initial_data_request(data):
+        # Older clients: a centre and a radius in miles, answered to the requester only
         logger.info('Received request for initial data')
-        hospitals = hospital_data_service.get_hospitals_paginated(
-            page=1, 
-            per_page=50, 
-            lat=data.get('lat'), 
-            lon=data.get('lon'), 
-            radius=data.get('radius', 50)
+        socketio.start_background_task(
+            send_initial_data, request.sid,
+            lat=data.get('lat'), lon=data.get('lon'), radius=data.get('radius', 50) * KM_PER_MILE
         )
-        socketio.emit('initial_data', hospitals[0])
+
+    def send_hospital_changes(sid, since):
+        try:
+            socketio.emit('hospital_sync', hospital_data_service.get_hospital_changes(since, CHANGE_FEED_PAGE_SIZE), to=sid)
+        except Exception as e:
+            logger.error(f"Failed to send hospital changes to {sid}: {e}")
+
+    @socketio.on('sync_hospitals')
+    def handle_sync_hospitals(data=None):
+        """
+        Send the hospitals changed or deleted since ``data['since']`` as
+        ``hospital_sync``. A reconnecting client catches up from its last
+        version instead of reloading everything; without ``since`` it gets
+        the current version to start from.
+        """
+        since = (data or {}).get('since')
+        if since is not None and not isinstance(since, int):
+            socketio.emit('subscription_error', {'error': f"Invalid sync version: {since!r}"}, to=request.sid)
+            return
+        socketio.start_background_task(send_hospital_changes, request.sid, since)
 
     logger.info("SocketIO initialized successfully")
     return socketio
 
-async def broadcast_wait_time_update(hospital_id, new_wait_time, is_live):
+def emit_wait_time_updates(updates):
+    """
+    Send a batch of ``{'hospital_id', 'new_wait_time', 'is_live', 'latitude',
+    'longitude'}`` updates to the clients watching each hospital's cell,
+    as one ``wait_time_updates`` event per watched cell.
+    """
+    if not updates:
+        return
     if not SocketIOWrapper.is_initialized():
         logger.info("SocketIO not initialized. Skipping real-time broadcast.")
         return
 
+    # A hospital's cell at every subscribable precision is a prefix of its finest geohash
+    updates_by_cell = defaultdict(list)
+    for update in updates:
+        if update.get('latitude') is None or update.get('longitude') is None:
+            continue
+        finest = encode(float(update['latitude']), float(update['longitude']), GEOHASH_MAX_PRECISION)
+        for precision in range(GEOHASH_MIN_PRECISION, GEOHASH_MAX_PRECISION + 1):
+            updates_by_cell[finest[:precision]].append(update)
+
+    socketio = SocketIOWrapper.get_instance()
+    watched = viewport_subscriptions.watched(updates_by_cell)
     try:
-        socketio = SocketIOWrapper.get_instance()
-        def emit_update():
-            socketio.emit('wait_time_update', {
-                'hospital_id': hospital_id,
-                'new_wait_time': new_wait_time,
-                'is_live': is_live
-            }, broadcast=True)
-
-        await asyncio.get_event_loop().run_in_executor(None, emit_update)
-        logger.info(f"Broadcasted wait time update for hospital {hospital_id}")
+        for cell in watched:
+            socketio.emit('wait_time_updates', {'updates': updates_by_cell[cell]}, to=cell_room(cell))
+        logger.info(f"Sent {len(updates)} wait time updates to {len(watched)} watched cells")
     except Exception as e:
-        logger.error(f"Failed to broadcast wait time update: {e}")
-        logger.info("Continuing execution without broadcasting.")
\ No newline at end of file
+        logger.error(f"Failed to send wait time updates: {e}")
+        logger.info("Continuing execution without broadcasting.")
@@ -3,14 +3,20 @@ const API_URL = '/api';
 
 // Map functionality
 let map, userMarker, markers = [];
+let clusterMarkers = [];
 let currentInfoWindow = null;
 
-let currentPage = 1;
+let nextCursor = null;
 let isLoading = false;
 let hasMoreData = true;
 let socket;
+// Last hospital change version seen; a reconnect catches up from here
+let syncVersion = null;
 let userLocation = null;
 
+// At this zoom and below the map shows server-side clusters instead of individual hospitals
+const CLUSTER_MAX_ZOOM = 10;
+
 function initializeMap() {
   console.log("Initializing map");
   try {
@@ -25,17 +31,17 @@ function initializeMap() {
     showError("Failed to initialize the map. Please try refreshing the page.");
   }
 
-  google.maps.event.addListener(map, 'idle', fetchHospitals);
+  google.maps.event.addListener(map, 'idle', onMapIdle);
   google.maps.event.addListener(map, 'zoom_changed', resetPagination);
   google.maps.event.addListener(map, 'bounds_changed', function() {
-    if (map.getZoom() > 10 && !isLoading && hasMoreData) {
+    if (map.getZoom() > CLUSTER_MAX_ZOOM && !isLoading && hasMoreData) {
       fetchHospitals();
     }
   });
 }
 
 function resetPagination() {
-  currentPage = 1;
+  nextCursor = null;
   clearMarkers();
   hasMoreData = true;
 }
@@ -88,7 +94,8 @@ function initializeWebSocket() {
 
     socket.on('connect', () => {
         console.log('Connected to WebSocket');
-        requestInitialData();
+        subscribeViewport(true);
+        socket.emit('sync_hospitals', { since: syncVersion });
     });
 
     socket.on('disconnect', () => {
@@ -100,23 +107,68 @@ function initializeWebSocket() {
         addMarkersToMap(data.hospitals);
     });
 
-    socket.on('wait_time_update', (data) => {
-        console.log('Received wait time update:', data);
-        updateMarkerWaitTime(data.hospital_id, data.new_wait_time);
+    socket.on('subscription_error', (data) => {
+        console.warn('Live updates unavailable:', data.error);
+    });
+
+    // Changes missed while disconnected (or just the current version on first connect)
+    socket.on('hospital_sync', (data) => {
+        if (data.since !== null) {
+            console.log(`Syncing ${data.changed.length} changed and ${data.deleted.length} deleted hospitals`);
+            removeMarkers(data.deleted);
+            // Changed hospitals may be new or have moved, so their markers are replaced, not patched
+            removeMarkers(data.changed.map((hospital) => hospital.id));
+            const bounds = map && map.getBounds();
+            if (bounds && map.getZoom() > CLUSTER_MAX_ZOOM) {
+                addMarkersToMap(data.changed.filter((hospital) =>
+                    hospital.latitude !== null && hospital.longitude !== null &&
+                    bounds.contains({ lat: parseFloat(hospital.latitude), lng: parseFloat(hospital.longitude) })
+                ));
+            }
+        }
+        syncVersion = data.version;
+        if (data.has_more) {
+            socket.emit('sync_hospitals', { since: syncVersion });
+        }
+    });
+
+    socket.on('wait_time_updates', (data) => {
+        console.log(`Received ${data.updates.length} wait time updates`);
+        data.updates.forEach((update) => {
+            updateMarkerWaitTime(update.hospital_id, update.new_wait_time, update.is_live);
+        });
     });
 }
 
-function requestInitialData() {
-  const center = map.getCenter();
-  const bounds = map.getBounds();
+// Live updates arrive only for the geohash cells covering the visible map
+function subscribeViewport(withInitialData) {
+  const bounds = map && map.getBounds();
+  if (!socket || !socket.connected || !bounds) return;
+
+  if (map.getZoom() <= CLUSTER_MAX_ZOOM) {
+    // Clusters aren't updated live, so don't receive updates for a whole region
+    socket.emit('unsubscribe_viewport');
+    return;
+  }
+
   const ne = bounds.getNorthEast();
-  const radius =
-    google.maps.geometry.spherical.computeDistanceBetween(center, ne) / 1609.34; // Convert to miles
+  const sw = bounds.getSouthWest();
+  socket.emit('subscribe_viewport', {
+    bbox: [sw.lat(), sw.lng(), ne.lat(), ne.lng()].join(','),
+    initial_data: withInitialData
+  });
+}
 
-  socket.emit('request_initial_data', {
-    lat: center.lat(),
-    lon: center.lng(),
-    radius: radius
+function removeMarkers(hospitalIds) {
+  if (!hospitalIds.length) return;
+  const removed = new Set(hospitalIds);
+  markers = markers.filter((marker) => {
+    if (!removed.has(marker.hospitalId)) return true;
+    if (currentInfoWindow && currentInfoWindow.anchor === marker) {
+      currentInfoWindow.close();
+    }
+    marker.setMap(null);
+    return false;
   });
 }
 
@@ -159,6 +211,81 @@ function updateMarkerWaitTime(hospitalId, newWaitTime, isLive) {
     }
   }
 
+function onMapIdle() {
+  if (map.getZoom() <= CLUSTER_MAX_ZOOM) {
+    fetchClusters();
+  } else {
+    clearClusters();
+    fetchHospitals();
+  }
+  // The REST fetch already loads the markers, so only move the subscription
+  subscribeViewport(false);
+}
+
+function fetchClusters() {
+  const bounds = map.getBounds();
+  const ne = bounds.getNorthEast();
+  const sw = bounds.getSouthWest();
+  const bbox = [sw.lat(), sw.lng(), ne.lat(), ne.lng()].join(',');
+
+  fetch(`${API_URL}/hospitals/clusters?bbox=${bbox}&zoom=${map.getZoom()}`)
+    .then(response => response.json())
+    .then((data) => {
+      console.log(`Received ${data.clusters.length} clusters covering ${data.total_count} hospitals`);
+      clearClusters();
+      data.clusters.forEach(addClusterMarker);
+    })
+    .catch((error) => {
+      console.error('Error fetching hospital clusters:', error);
+      showError('Failed to fetch hospital data. Please try again later.');
+    });
+}
+
+function createClusterIcon(cluster) {
+  // Colored by the shortest known wait in the cluster, sized by how many hospitals it holds
+  const color = getMarkerColor(cluster.min_wait, true, cluster.min_wait !== null);
+  const size = Math.min(64, 28 + Math.round(Math.log10(cluster.count) * 12));
+  const svg = `
+    <svg xmlns='http://www.w3.org/2000/svg' width='${size}' height='${size}' viewBox='0 0 ${size} ${size}'>
+      <circle cx='${size / 2}' cy='${size / 2}' r='${size / 2 - 2}' fill='${color}' fill-opacity='0.85' stroke='white' stroke-width='2'/>
+    </svg>`;
+
+  return {
+    url: 'data:image/svg+xml;charset=UTF-8,' + encodeURIComponent(svg),
+    scaledSize: new google.maps.Size(size, size),
+    anchor: new google.maps.Point(size / 2, size / 2),
+  };
+}
+
+function addClusterMarker(cluster) {
+  const marker = new google.maps.Marker({
+    position: { lat: cluster.lat, lng: cluster.lon },
+    map: map,
+    icon: createClusterIcon(cluster),
+    label: {
+      text: String(cluster.count),
+      color: 'white',
+      fontSize: '12px',
+      fontWeight: 'bold'
+    },
+    title: cluster.min_wait !== null
+      ? `${cluster.count} hospitals, shortest wait ${cluster.min_wait} minutes (average ${cluster.avg_wait})`
+      : `${cluster.count} hospitals`
+  });
+
+  marker.addListener('click', () => {
+    map.setCenter(marker.getPosition());
+    map.setZoom(Math.min(map.getZoom() + 2, CLUSTER_MAX_ZOOM + 1));
+  });
+
+  clusterMarkers.push(marker);
+}
+
+function clearClusters() {
+  clusterMarkers.forEach((marker) => marker.setMap(null));
+  clusterMarkers = [];
+}
+
   function fetchHospitals() {
     if (isLoading || !hasMoreData) return;
   
@@ -166,23 +293,26 @@ function updateMarkerWaitTime(hospitalId, newWaitTime, isLive) {
     showLoading();
   
     const bounds = map.getBounds();
-    const center = map.getCenter();
     const ne = bounds.getNorthEast();
+    const sw = bounds.getSouthWest();
   
-    // Calculate radius in miles
-    const radius = google.maps.geometry.spherical.computeDistanceBetween(center, ne) / 1609.34;
-  
-    const url = `${API_URL}/hospitals?lat=${center.lat()}&lon=${center.lng()}&radius=${radius}&page=${currentPage}&per_page=50`;
+    // Query exactly the visible box; compact responses send one array per column
+    const bbox = [sw.lat(), sw.lng(), ne.lat(), ne.lng()].join(',');
+    let url = `${API_URL}/hospitals?bbox=${bbox}&per_page=50&count=none&format=compact`;
+    if (nextCursor) {
+      url += `&cursor=${encodeURIComponent(nextCursor)}`;
+    }
     console.log('Fetching hospitals from:', url);
   
     fetch(url)
       .then(response => response.json())
       .then((data) => {
         console.log('Received hospital data:', data);
-        addMarkersToMap(data.hospitals);
-        updateNearestER(data.hospitals); // Call updateNearestER here
-        currentPage++;
-        hasMoreData = currentPage <= data.total_pages;
+        const hospitals = data.format === 'compact' ? expandColumns(data.hospitals) : data.hospitals;
+        addMarkersToMap(hospitals);
+        updateNearestER(hospitals); // Call updateNearestER here
+        nextCursor = data.next_cursor;
+        hasMoreData = data.has_more;
         isLoading = false;
         hideLoading();
       })
@@ -195,6 +325,21 @@ function updateMarkerWaitTime(hospitalId, newWaitTime, isLive) {
   }
   
 
+// Turn a compact {column: [values]} listing back into one object per hospital
+function expandColumns(columns) {
+  const names = Object.keys(columns);
+  const count = names.length ? columns[names[0]].length : 0;
+  const hospitals = [];
+  for (let i = 0; i < count; i++) {
+    const hospital = {};
+    names.forEach((name) => {
+      hospital[name] = columns[name][i];
+    });
+    hospitals.push(hospital);
+  }
+  return hospitals;
+}
+
 function createCustomMarkerIcon(color, hasData) {
   const svg = `
     <svg xmlns='http://www.w3.org/2000/svg' width='36' height='36' viewBox='0 0 36 36'>
@@ -210,6 +355,10 @@ function createCustomMarkerIcon(color, hasData) {
 }
 
 function getMarkerIcon(waitTime, isLive, hasData) {
+  return createCustomMarkerIcon(getMarkerColor(waitTime, isLive, hasData), hasData);
+}
+
+function getMarkerColor(waitTime, isLive, hasData) {
   let color;
   if (!hasData) {
     color = '#BDBDBD'; // Lighter gray for no data
@@ -228,12 +377,15 @@ function getMarkerIcon(waitTime, isLive, hasData) {
     }
   }
 
-  return createCustomMarkerIcon(color, hasData);
+  return color;
 }
 
 function addMarkersToMap(hospitals) {
   console.log('Adding markers for hospitals:', hospitals);
   hospitals.forEach((hospital) => {
+    if (markers.some((m) => m.hospitalId === hospital.id)) {
+      return;
+    }
     const lat = parseFloat(hospital.latitude);
     const lng = parseFloat(hospital.longitude);
 